@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Durable HITL Approval Store for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hour 7: HITL Interrupt Handling
+
+Persists approval requests in SQLite with indexes on status, urgency and
+workflow so pending lists stay fast as approval history grows.
+"""
+
+import json
+import time
+import heapq
+import asyncio
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Columns kept outside the JSON document so they can be indexed
+INDEXED_FIELDS = (
+    "thread_id", "workflow_id", "status", "urgency_level", "request_type",
+    "title", "created_at", "expires_at", "escalation_level"
+)
+
+PENDING_FIELDS = (
+    "approval_id", "workflow_id", "title", "urgency_level", "created_at",
+    "request_type", "expires_at", "escalation_level"
+)
+
+# Deadline policy per urgency level: seconds allowed at each escalation level,
+# how many escalations happen before the final action, and what that action is
+URGENCY_POLICIES: Dict[str, Dict[str, Any]] = {
+    "critical": {"timeout": 300, "max_escalations": 3, "final_action": "expire"},
+    "high": {"timeout": 900, "max_escalations": 2, "final_action": "expire"},
+    "medium": {"timeout": 3600, "max_escalations": 1, "final_action": "expire"},
+    "low": {"timeout": 86400, "max_escalations": 0, "final_action": "expire"}
+}
+
+# Final actions an approval can take when its last deadline passes
+FINAL_ACTIONS = {"expire", "auto_approve", "auto_reject"}
+
+# Longest per-request deadline override, in seconds
+MAX_AUTO_TIMEOUT = 366 * 86400
+
+class ApprovalStore:
+    """SQLite-backed store for approval requests"""
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            timeout=busy_timeout_ms / 1000
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_tables()
+
+    def _ensure_tables(self):
+        """Ensure approval tables and indexes exist"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS approval_requests (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    approval_id TEXT UNIQUE NOT NULL,
+                    thread_id TEXT,
+                    workflow_id TEXT,
+                    status TEXT NOT NULL,
+                    urgency_level TEXT,
+                    request_type TEXT,
+                    title TEXT,
+                    created_at TEXT,
+                    expires_at TEXT,
+                    escalation_level INTEGER DEFAULT 0,
+                    data TEXT NOT NULL
+                )
+            """)
+
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_approval_status
+                ON approval_requests(status, seq)
+            """)
+
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_approval_status_urgency
+                ON approval_requests(status, urgency_level, seq)
+            """)
+
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_approval_status_expiry
+                ON approval_requests(status, expires_at)
+            """)
+
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_approval_workflow
+                ON approval_requests(workflow_id, status, seq)
+            """)
+        logger.debug("Approval store tables ready")
+
+    def create(self, approval_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Persist a new approval request
+
+        Args:
+            approval_data: Approval document; must contain approval_id and status
+
+        Returns:
+            The stored approval document
+        """
+        columns = ("approval_id",) + INDEXED_FIELDS + ("data",)
+        values = [approval_data["approval_id"]]
+        values += [approval_data.get(field) for field in INDEXED_FIELDS]
+        values.append(json.dumps(approval_data, ensure_ascii=False, default=str))
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO approval_requests ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                values
+            )
+        return approval_data
+
+    def get(self, approval_id: str) -> Optional[Dict[str, Any]]:
+        """Load an approval request or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM approval_requests WHERE approval_id = ?",
+                (approval_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self,
+               approval_id: str,
+               changes: Dict[str, Any],
+               expected_status: Optional[str] = None,
+               expected_escalation_level: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Merge changes into an approval request
+
+        The expectations are checked again by the UPDATE itself, so the change
+        is a compare-and-set even when other processes share the database.
+
+        Args:
+            approval_id: Approval to update
+            changes: Fields to set
+            expected_status: Only apply if the current status matches
+            expected_escalation_level: Only apply if the escalation level matches
+
+        Returns:
+            The updated document, or None if missing or an expectation did not match
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT data FROM approval_requests WHERE approval_id = ?",
+                (approval_id,)
+            ).fetchone()
+            if not row:
+                return None
+
+            approval_data = json.loads(row[0])
+            if expected_status is not None and approval_data.get("status") != expected_status:
+                return None
+            if (expected_escalation_level is not None
+                    and approval_data.get("escalation_level", 0) != expected_escalation_level):
+                return None
+
+            conditions = ["approval_id = ?"]
+            guards: List[Any] = [approval_id]
+            if expected_status is not None:
+                conditions.append("status = ?")
+                guards.append(expected_status)
+            if expected_escalation_level is not None:
+                conditions.append("COALESCE(escalation_level, 0) = ?")
+                guards.append(expected_escalation_level)
+
+            approval_data.update(changes)
+            assignments = ", ".join(f"{field} = ?" for field in INDEXED_FIELDS)
+            cursor = self._conn.execute(
+                f"UPDATE approval_requests SET {assignments}, data = ? WHERE {' AND '.join(conditions)}",
+                [approval_data.get(field) for field in INDEXED_FIELDS] + [
+                    json.dumps(approval_data, ensure_ascii=False, default=str)
+                ] + guards
+            )
+            if cursor.rowcount == 0:
+                # Another process changed it between the read and the write
+                return None
+        return approval_data
+
+    def list_pending(self,
+                     limit: int = 100,
+                     cursor: Optional[str] = None,
+                     urgency_level: Optional[str] = None,
+                     workflow_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Page through pending approvals in creation order
+
+        Args:
+            limit: Maximum approvals to return
+            cursor: Cursor returned by the previous page
+            urgency_level: Only return this urgency level
+            workflow_id: Only return approvals for this workflow
+
+        Returns:
+            Tuple of (approval summaries, cursor for the next page or None)
+
+        Raises:
+            ValueError: If the cursor was not issued by this method
+        """
+        try:
+            after = int(cursor) if cursor else 0
+        except ValueError:
+            after = -1
+        if not 0 <= after < 2 ** 63:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+        conditions = ["status = 'pending'", "seq > ?"]
+        params: List[Any] = [after]
+        if urgency_level:
+            conditions.append("urgency_level = ?")
+            params.append(urgency_level)
+        if workflow_id:
+            conditions.append("workflow_id = ?")
+            params.append(workflow_id)
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT seq, {', '.join(PENDING_FIELDS)} FROM approval_requests "
+                f"WHERE {' AND '.join(conditions)} ORDER BY seq LIMIT ?",
+                params
+            ).fetchall()
+
+        page = rows[:limit]
+        next_cursor = str(page[-1][0]) if len(rows) > limit else None
+        return [dict(zip(PENDING_FIELDS, row[1:])) for row in page], next_cursor
+
+    def list_deadlines(self) -> List[Tuple[str, str, int]]:
+        """Deadlines of pending approvals as (approval_id, expires_at, escalation_level)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT approval_id, expires_at, escalation_level FROM approval_requests "
+                "WHERE status = 'pending' AND expires_at IS NOT NULL ORDER BY expires_at"
+            ).fetchall()
+
+    def close(self):
+        """Close the store connection"""
+        with self._lock:
+            self._conn.close()
+        logger.info(f"Approval store closed: {self.db_path}")
+
+
+class ApprovalDeadlineScheduler:
+    """
+    Expires, escalates or auto-resolves pending approvals when their deadline passes
+
+    Deadlines live in a min-heap, so each schedule or fire costs O(log n).
+    Entries made stale by a response or manual escalation are dropped when
+    they reach the top of the heap. Due deadlines fire on a worker thread,
+    so on_resolved is called there too.
+    """
+
+    def __init__(self,
+                 store: ApprovalStore,
+                 policies: Optional[Dict[str, Dict[str, Any]]] = None,
+                 on_resolved: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.store = store
+        self.policies = policies or URGENCY_POLICIES
+        self.on_resolved = on_resolved
+        self._heap: List[Tuple[float, str, int]] = []
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fired = 0
+
+    def policy_for(self, approval_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Resolve the deadline policy, honouring per-request metadata overrides
+
+        Raises:
+            ValueError: If metadata auto_timeout is not a whole number of seconds
+                between 1 and MAX_AUTO_TIMEOUT
+        """
+        policy = dict(self.policies.get(approval_data.get("urgency_level"), self.policies["medium"]))
+        metadata = approval_data.get("metadata") or {}
+        auto_timeout = metadata.get("auto_timeout")
+        if auto_timeout is not None:
+            try:
+                timeout = float(auto_timeout) if isinstance(auto_timeout, (int, float, str)) else None
+            except ValueError:
+                timeout = None
+            if (isinstance(auto_timeout, bool) or timeout is None or not timeout.is_integer()
+                    or not 0 < timeout <= MAX_AUTO_TIMEOUT):
+                raise ValueError(
+                    f"Invalid auto_timeout {auto_timeout!r}: expected whole seconds from 1 to {MAX_AUTO_TIMEOUT}"
+                )
+            policy["timeout"] = int(timeout)
+        if metadata.get("on_timeout") in FINAL_ACTIONS:
+            policy["final_action"] = metadata["on_timeout"]
+        return policy
+
+    def compute_expiry(self, approval_data: Dict[str, Any]) -> str:
+        """Deadline for the approval's current escalation level as an ISO timestamp"""
+        timeout = self.policy_for(approval_data)["timeout"]
+        return (datetime.now() + timedelta(seconds=timeout)).isoformat()
+
+    def schedule(self, approval_id: str, expires_at: str, escalation_level: int = 0):
+        """Add a deadline to the heap; safe to call from any thread"""
+        deadline = datetime.fromisoformat(expires_at).timestamp()
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, approval_id, escalation_level))
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def load_pending(self) -> int:
+        """Schedule every pending approval that has a deadline"""
+        deadlines = self.store.list_deadlines()
+        for approval_id, expires_at, escalation_level in deadlines:
+            self.schedule(approval_id, expires_at, escalation_level or 0)
+        logger.info(f"Approval scheduler loaded {len(deadlines)} deadlines")
+        return len(deadlines)
+
+    def process_due(self, now: Optional[float] = None) -> int:
+        """Fire every deadline that has passed; returns the number acted on"""
+        now = now if now is not None else time.time()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+
+        # Deadlines rescheduled by an escalation wait for the next pass
+        fired = 0
+        for _, approval_id, escalation_level in due:
+            if self._fire(approval_id, escalation_level):
+                fired += 1
+        self._fired += fired
+        return fired
+
+    def _fire(self, approval_id: str, escalation_level: int) -> bool:
+        approval_data = self.store.get(approval_id)
+        if (approval_data is None or approval_data.get("status") != "pending"
+                or approval_data.get("escalation_level", 0) != escalation_level):
+            return False
+
+        policy = self.policy_for(approval_data)
+        timestamp = datetime.now().isoformat()
+
+        if escalation_level < policy["max_escalations"]:
+            updated = self.store.update(approval_id, {
+                "escalation_level": escalation_level + 1,
+                "escalated_at": timestamp,
+                "escalated_by": "scheduler",
+                "expires_at": (datetime.now() + timedelta(seconds=policy["timeout"])).isoformat()
+            }, expected_status="pending", expected_escalation_level=escalation_level)
+            if updated:
+                logger.info(f"Auto-escalated approval {approval_id} to level {escalation_level + 1}")
+                self.schedule(approval_id, updated["expires_at"], escalation_level + 1)
+            return updated is not None
+
+        action = policy["final_action"]
+        if action == "expire":
+            changes = {"status": "expired", "expired_at": timestamp}
+        else:
+            approved = action == "auto_approve"
+            changes = {
+                "status": "approved" if approved else "rejected",
+                "approved_by": "system:timeout",
+                "approved_at": timestamp,
+                "comments": f"Resolved automatically after deadline ({action})",
+                "decision": approved
+            }
+
+        updated = self.store.update(approval_id, changes, expected_status="pending")
+        if updated is None:
+            return False
+
+        logger.info(f"Approval {approval_id} deadline passed: {action}")
+        if action != "expire" and self.on_resolved is not None:
+            try:
+                self.on_resolved(updated)
+            except Exception as e:
+                logger.error(f"Approval {approval_id} resolution callback failed: {e}")
+        return True
+
+    def _next_delay(self) -> Optional[float]:
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.time())
+
+    async def run(self):
+        """Sleep until the earliest deadline, fire it, repeat"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_delay())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # Firing reads and writes the store, so it runs off the event loop
+                await asyncio.to_thread(self.process_due)
+            except Exception as e:
+                logger.error(f"Approval scheduler error: {e}")
+
+    def start(self):
+        """Start the scheduler task on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.load_pending()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Cancel the scheduler task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Scheduled deadlines and actions taken"""
+        with self._lock:
+            next_deadline = self._heap[0][0] if self._heap else None
+            return {
+                "scheduled": len(self._heap),
+                "next_deadline": datetime.fromtimestamp(next_deadline).isoformat() if next_deadline else None,
+                "fired": self._fired,
+                "running": self._task is not None
+            }
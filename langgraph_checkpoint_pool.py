@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite Checkpointer Pool for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+
+Provides a small, fixed set of WAL-mode SqliteSaver instances that every graph
+shares, instead of opening a new connection per graph, and a compactor that
+prunes old checkpoints and returns the freed pages to the filesystem.
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from itertools import count
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class CheckpointerPool:
+    """Bounded pool of SqliteSaver instances over one checkpoint database"""
+
+    def __init__(self, db_path: str, pool_size: int = 4, busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self.pool_size = max(1, pool_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._lock = threading.Lock()
+        self._next = count()
+        self._closed = False
+        self._savers: List[SqliteSaver] = []
+
+        for _ in range(self.pool_size):
+            conn = self._connect()
+            saver = SqliteSaver(conn=conn)
+            saver.setup()
+            self._savers.append(saver)
+
+        logger.info(f"Checkpointer pool ready: {self.pool_size} connections to {self.db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection tuned for concurrent readers and a single writer"""
+        # SqliteSaver serialises access to its connection with its own lock
+        conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            timeout=self.busy_timeout_ms / 1000
+        )
+        # Must precede the WAL switch, which writes the header of a new database;
+        # existing databases keep their mode unless compaction converts them
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def acquire(self) -> SqliteSaver:
+        """
+        Get a checkpointer for a graph
+
+        Savers are handed out round-robin; they stay owned by the pool and
+        must not be closed by the caller.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Checkpointer pool is closed")
+            return self._savers[next(self._next) % self.pool_size]
+
+    def ping(self, timeout_ms: int = 1000) -> bool:
+        """
+        Check that the checkpoint database answers queries
+
+        Uses a short-lived connection of its own, so the check never queues
+        behind graph checkpoint writes on the pooled savers' locks.
+
+        Args:
+            timeout_ms: Longest the check waits for a database lock
+        """
+        if self._closed:
+            return False
+        try:
+            conn = sqlite3.connect(str(self.db_path), timeout=timeout_ms / 1000)
+            try:
+                conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            finally:
+                conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Checkpointer pool ping failed: {e}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool configuration and state"""
+        return {
+            "db_path": str(self.db_path),
+            "pool_size": self.pool_size,
+            "busy_timeout_ms": self.busy_timeout_ms,
+            "closed": self._closed
+        }
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        for saver in self._savers:
+            with saver.lock:
+                saver.conn.close()
+        logger.info(f"Checkpointer pool closed: {self.db_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class CheckpointCompactor:
+    """
+    Retention for the checkpoint tables
+
+    Keeps the newest checkpoints of every thread, deletes whole threads on
+    request, and vacuums incrementally where the database allows it.
+    SqliteSaver stores complete state in every checkpoint, so dropping older
+    ones only loses history, never the latest state. Work is done in short
+    per-thread transactions on a dedicated connection so graph runs are not
+    blocked for long.
+    """
+
+    def __init__(self, pool: CheckpointerPool, keep_last: int = 20, vacuum_pages: int = 0):
+        """
+        Args:
+            pool: Pool whose database is compacted
+            keep_last: Checkpoints kept per thread and namespace
+            vacuum_pages: Free pages released per incremental vacuum, 0 for all
+        """
+        self.pool = pool
+        self.keep_last = max(1, keep_last)
+        self.vacuum_pages = max(0, vacuum_pages)
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._bytes_reclaimed = 0
+        self._last_report: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _size(conn: sqlite3.Connection) -> Tuple[int, int]:
+        """Database size in bytes and free bytes"""
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return page_count * page_size, freelist * page_size
+
+    def prune_history(self, conn: sqlite3.Connection, keep_last: int) -> Dict[str, int]:
+        """Delete all but the newest keep_last checkpoints of every thread"""
+        threads = conn.execute(
+            "SELECT thread_id, checkpoint_ns FROM checkpoints "
+            "GROUP BY thread_id, checkpoint_ns HAVING COUNT(*) > ?",
+            (keep_last,)
+        ).fetchall()
+
+        checkpoints_deleted = writes_deleted = 0
+        for thread_id, checkpoint_ns in threads:
+            # Checkpoint IDs sort by creation time, as SqliteSaver relies on for "latest"
+            with conn:
+                cutoff = conn.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                    (thread_id, checkpoint_ns, keep_last - 1)
+                ).fetchone()
+                if cutoff is None:
+                    continue
+                writes_deleted += conn.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                    (thread_id, checkpoint_ns, cutoff[0])
+                ).rowcount
+                checkpoints_deleted += conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                    (thread_id, checkpoint_ns, cutoff[0])
+                ).rowcount
+
+        return {
+            "threads_trimmed": len(threads),
+            "checkpoints_deleted": checkpoints_deleted,
+            "writes_deleted": writes_deleted
+        }
+
+    def delete_threads(self, conn: sqlite3.Connection, thread_ids: Iterable[str]) -> Dict[str, int]:
+        """Delete every checkpoint and pending write of the given threads"""
+        thread_ids = list(thread_ids)
+        checkpoints_deleted = writes_deleted = 0
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(thread_ids), 500):
+            chunk = thread_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            with conn:
+                writes_deleted += conn.execute(
+                    f"DELETE FROM writes WHERE thread_id IN ({placeholders})", chunk
+                ).rowcount
+                checkpoints_deleted += conn.execute(
+                    f"DELETE FROM checkpoints WHERE thread_id IN ({placeholders})", chunk
+                ).rowcount
+
+        return {
+            "threads_purged": len(thread_ids),
+            "checkpoints_deleted": checkpoints_deleted,
+            "writes_deleted": writes_deleted
+        }
+
+    def vacuum(self, conn: sqlite3.Connection, convert: bool = False) -> str:
+        """
+        Release free pages with an incremental vacuum
+
+        A database created without incremental auto-vacuum is only converted
+        when convert is set: that takes a full VACUUM, which locks the database
+        for far longer than graph writers wait, so it is an explicit step.
+        Otherwise its free pages stay for reuse and the mode is "unavailable".
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if not convert:
+                return "unavailable"
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            mode = "full"
+        else:
+            conn.execute(f"PRAGMA incremental_vacuum({self.vacuum_pages})" if self.vacuum_pages
+                         else "PRAGMA incremental_vacuum")
+            mode = "incremental"
+        # Fold the WAL back in so the file itself shrinks
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return mode
+
+    def compact(self,
+                keep_last: Optional[int] = None,
+                purge_thread_ids: Iterable[str] = (),
+                vacuum: bool = True,
+                convert_auto_vacuum: bool = False) -> Dict[str, Any]:
+        """
+        Run one compaction pass
+
+        Args:
+            keep_last: Checkpoints kept per thread (defaults to the compactor's)
+            purge_thread_ids: Threads whose checkpoints are deleted entirely
+            vacuum: Whether to release freed pages to the filesystem
+            convert_auto_vacuum: Convert a database without incremental
+                auto-vacuum with a full VACUUM, locking it while that runs
+
+        Returns:
+            Report of rows deleted and bytes reclaimed
+        """
+        keep_last = max(1, keep_last or self.keep_last)
+        started = time.monotonic()
+
+        with self._lock:
+            conn = self.pool._connect()
+            try:
+                bytes_before, _ = self._size(conn)
+                purged = self.delete_threads(conn, purge_thread_ids)
+                pruned = self.prune_history(conn, keep_last)
+                vacuum_mode = self.vacuum(conn, convert_auto_vacuum) if vacuum else "skipped"
+                bytes_after, bytes_free = self._size(conn)
+            finally:
+                conn.close()
+
+            report = {
+                "keep_last": keep_last,
+                "threads_trimmed": pruned["threads_trimmed"],
+                "threads_purged": purged["threads_purged"],
+                "checkpoints_deleted": pruned["checkpoints_deleted"] + purged["checkpoints_deleted"],
+                "writes_deleted": pruned["writes_deleted"] + purged["writes_deleted"],
+                "vacuum": vacuum_mode,
+                "bytes_before": bytes_before,
+                "bytes_after": bytes_after,
+                "bytes_reclaimed": max(0, bytes_before - bytes_after),
+                "bytes_free": bytes_free,
+                "duration_ms": round((time.monotonic() - started) * 1000, 1)
+            }
+            self._runs += 1
+            self._bytes_reclaimed += report["bytes_reclaimed"]
+            self._last_report = report
+
+        logger.info(
+            f"Checkpoint compaction: {report['checkpoints_deleted']} checkpoints deleted, "
+            f"{report['bytes_reclaimed']} bytes reclaimed ({vacuum_mode} vacuum)"
+        )
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        """Compaction totals and the last report"""
+        return {
+            "keep_last": self.keep_last,
+            "runs": self._runs,
+            "bytes_reclaimed": self._bytes_reclaimed,
+            "last": self._last_report
+        }
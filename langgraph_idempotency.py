@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Idempotency Keys for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+
+Requests carrying an Idempotency-Key run once: a duplicate that arrives while
+the original is in flight waits for and shares its response, and a duplicate
+that arrives later gets the stored response until the key expires.
+"""
+
+import time
+import json
+import heapq
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+class IdempotencyInProgress(Exception):
+    """The key's original request is still running in another worker"""
+
+def request_fingerprint(scope: str, body: Any) -> str:
+    """Stable hash of an endpoint and its JSON-encodable request body"""
+    canonical = json.dumps({"scope": scope, "body": body}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class IdempotencyCache:
+    """
+    Single-flight execution and response replay keyed by idempotency key
+
+    Completed responses and in-flight markers live in the server state backend,
+    so replays work from any worker; waiting on an in-flight original is only
+    possible within the worker running it. Each worker remembers when the keys
+    it wrote expire, so purging touches only expired keys; keys left behind by
+    other workers expire on lookup or in sweep_expired().
+    """
+
+    NAMESPACE = "idempotency"
+
+    def __init__(self,
+                 backend,
+                 ttl_seconds: float = 86400,
+                 pending_ttl_seconds: float = 3600,
+                 purge_interval: float = 60):
+        """
+        Args:
+            backend: Server state backend holding keys and responses
+            ttl_seconds: How long a completed response is replayed
+            pending_ttl_seconds: How long an in-flight marker is honoured, so a
+                crashed worker does not block its keys forever
+            purge_interval: Minimum seconds between sweeps of expired keys
+        """
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self.purge_interval = purge_interval
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._last_purge = time.time()
+        # (expires_at, key) of keys written here, soonest first
+        self._expiries: List[Tuple[float, str]] = []
+        self._executed = 0
+        self._replayed = 0
+        self._attached = 0
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.backend.get(self.NAMESPACE, key)
+        if entry is not None and entry["expires_at"] <= time.time():
+            self.backend.delete(self.NAMESPACE, key)
+            return None
+        return entry
+
+    def _store(self, key: str, entry: Dict[str, Any], if_absent: bool = False) -> bool:
+        """Write an entry and remember when it expires"""
+        if if_absent:
+            if not self.backend.put_if_absent(self.NAMESPACE, key, entry):
+                return False
+        else:
+            self.backend.put(self.NAMESPACE, key, entry)
+        heapq.heappush(self._expiries, (entry["expires_at"], key))
+        return True
+
+    def purge_expired(self) -> int:
+        """Delete expired keys written by this worker; returns how many were removed"""
+        now = time.time()
+        purged = 0
+        while self._expiries and self._expiries[0][0] <= now:
+            _, key = heapq.heappop(self._expiries)
+            # The key may since have been completed, extended or deleted
+            entry = self.backend.get(self.NAMESPACE, key)
+            if entry is not None and entry["expires_at"] <= now:
+                self.backend.delete(self.NAMESPACE, key)
+                purged += 1
+        self._last_purge = now
+        if purged:
+            logger.debug(f"Purged {purged} expired idempotency keys")
+        return purged
+
+    def sweep_expired(self) -> int:
+        """
+        Delete every expired key, including those of other or crashed workers
+
+        Scans the whole namespace, so it belongs in maintenance jobs rather
+        than on the request path.
+        """
+        now = time.time()
+        expired = [key for key, entry in self._entries() if entry["expires_at"] <= now]
+        for key in expired:
+            self.backend.delete(self.NAMESPACE, key)
+        if expired:
+            logger.info(f"Swept {len(expired)} expired idempotency keys")
+        return len(expired)
+
+    def _entries(self):
+        cursor = None
+        while True:
+            page, cursor = self.backend.list_page(self.NAMESPACE, limit=500, cursor=cursor)
+            yield from page
+            if cursor is None:
+                return
+
+    async def run(self,
+                  key: str,
+                  fingerprint: str,
+                  execute: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Execute a request once per key
+
+        Args:
+            key: Idempotency key supplied by the client
+            fingerprint: Hash of the request; reusing a key for another request is an error
+            execute: Coroutine factory producing the JSON-encodable response
+
+        Returns:
+            Tuple of (response, whether it was replayed rather than executed)
+
+        Raises:
+            IdempotencyConflict: The key belongs to a different request
+            IdempotencyInProgress: The original request is running in another worker
+        """
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != fingerprint:
+                raise IdempotencyConflict(f"Idempotency key {key} was used for a different request")
+            self._attached += 1
+            # Shield so a waiter giving up does not cancel the original request
+            return await asyncio.shield(inflight[1]), True
+
+        marker = {
+            "state": "pending",
+            "fingerprint": fingerprint,
+            "expires_at": time.time() + self.pending_ttl_seconds
+        }
+        if not self._store(key, marker, if_absent=True):
+            entry = self._lookup(key)
+            if entry is not None:
+                if entry["fingerprint"] != fingerprint:
+                    raise IdempotencyConflict(f"Idempotency key {key} was used for a different request")
+                if entry["state"] == "completed":
+                    self._replayed += 1
+                    return entry["response"], True
+                raise IdempotencyInProgress(f"Request with idempotency key {key} is still in progress")
+
+            # The previous entry had expired and was dropped by the lookup
+            if not self._store(key, marker, if_absent=True):
+                raise IdempotencyInProgress(f"Request with idempotency key {key} is still in progress")
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved when no duplicate is waiting on them
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._inflight[key] = (fingerprint, future)
+        try:
+            response = await execute()
+        except BaseException as e:
+            # Failures are not stored, so the client can retry with the same key
+            self.backend.delete(self.NAMESPACE, key)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        else:
+            self._store(key, {
+                "state": "completed",
+                "fingerprint": fingerprint,
+                "response": response,
+                "expires_at": time.time() + self.ttl_seconds
+            })
+            self._executed += 1
+            future.set_result(response)
+            return response, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Key counts and how duplicates were served"""
+        return {
+            "keys": self.backend.count(self.NAMESPACE),
+            "in_flight": len(self._inflight),
+            "tracked_expiries": len(self._expiries),
+            "ttl_seconds": self.ttl_seconds,
+            "executed": self._executed,
+            "replayed": self._replayed,
+            "attached": self._attached
+        }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Negotiated Response Encoding for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+
+JSON responses are rendered with orjson when it is installed, or as MessagePack
+for clients that ask for it, and compressed with gzip or brotli above a size
+threshold when the client accepts it. Streaming responses are passed through
+untouched so Server-Sent Events and NDJSON keep flowing chunk by chunk.
+"""
+
+import gzip
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Optional fast encoders
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ormsgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    ormsgpack = None
+    try:
+        import msgpack
+        MSGPACK_AVAILABLE = True
+    except ImportError:
+        MSGPACK_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+# Media types worth compressing; anything else (images, SSE, NDJSON) is left alone
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "text/plain", "text/html")
+
+# Accept header of the request being handled, set by NegotiationMiddleware
+_accept: ContextVar[str] = ContextVar("langgraph_accept", default="")
+
+def _parse_header_list(value: str) -> Dict[str, float]:
+    """Parse an Accept or Accept-Encoding header into {token: q}"""
+    preferences = {}
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, raw = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        preferences[token] = quality
+    return preferences
+
+def wants_msgpack(accept: str) -> bool:
+    """Whether the Accept header prefers MessagePack over JSON"""
+    if not MSGPACK_AVAILABLE or not accept:
+        return False
+    preferences = _parse_header_list(accept)
+    msgpack_q = max((preferences.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    return msgpack_q > 0 and msgpack_q >= preferences.get("application/json", 0.0)
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best content coding the client accepts: br, then gzip, else None"""
+    preferences = _parse_header_list(accept_encoding)
+    wildcard = preferences.get("*", 0.0)
+    candidates = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        quality = preferences.get(coding, wildcard)
+        if quality > best_q:
+            best, best_q = coding, quality
+    return best
+
+def dumps_json(content: Any) -> bytes:
+    """Compact JSON bytes, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+def dumps_msgpack(content: Any) -> bytes:
+    """MessagePack bytes"""
+    if ormsgpack is not None:
+        return ormsgpack.packb(content, default=str, option=ormsgpack.OPT_NON_STR_KEYS)
+    return msgpack.packb(content, use_bin_type=True, default=str)
+
+def add_vary(headers: List[Tuple[bytes, bytes]], field: bytes) -> None:
+    """Add a field to the Vary header in a raw header list, in place"""
+    for index, (key, value) in enumerate(headers):
+        if key.lower() == b"vary":
+            if field.lower() not in [item.strip().lower() for item in value.split(b",")]:
+                headers[index] = (key, value + b", " + field)
+            return
+    headers.append((b"vary", field))
+
+class NegotiatedResponse(JSONResponse):
+    """
+    Default response class: orjson-rendered JSON, or MessagePack when the
+    request's Accept header prefers it
+    """
+
+    def render(self, content: Any) -> bytes:
+        if wants_msgpack(_accept.get()):
+            self.media_type = "application/msgpack"
+            return dumps_msgpack(content)
+        return dumps_json(content)
+
+    def init_headers(self, headers: Optional[Dict[str, str]] = None) -> None:
+        super().init_headers(headers)
+        if MSGPACK_AVAILABLE:
+            # The body depends on Accept, so shared caches must key on it
+            add_vary(self.raw_headers, b"Accept")
+
+class NegotiationMiddleware:
+    """
+    ASGI middleware that records the Accept header for NegotiatedResponse and
+    compresses complete responses above min_size with br or gzip
+    """
+
+    def __init__(self, app, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope["headers"]}
+        token = _accept.set(headers.get("accept", ""))
+        coding = choose_encoding(headers.get("accept-encoding", ""))
+        try:
+            if coding is None:
+                await self.app(scope, receive, send)
+            else:
+                await self.app(scope, receive, _CompressingSender(send, coding, self))
+        finally:
+            _accept.reset(token)
+
+    def compress(self, body: bytes, coding: str) -> bytes:
+        if coding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+class _CompressingSender:
+    """Wraps send to compress a single-message response body"""
+
+    def __init__(self, send, coding: str, middleware: NegotiationMiddleware):
+        self.send = send
+        self.coding = coding
+        self.middleware = middleware
+        self.start: Optional[Dict[str, Any]] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            # Hold the headers until the body shows whether compression applies
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.start is None:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        headers: List[Tuple[bytes, bytes]] = list(self.start.get("headers", []))
+        header_map = {key.lower(): value for key, value in headers}
+        content_type = header_map.get(b"content-type", b"").decode("latin-1")
+        streaming = message.get("more_body", False)
+
+        if (streaming
+                or b"content-encoding" in header_map
+                or len(body) < self.middleware.min_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)):
+            self.passthrough = True
+            await self.send(self.start)
+            await self.send(message)
+            return
+
+        compressed = self.middleware.compress(body, self.coding)
+        headers = [(key, value) for key, value in headers if key.lower() != b"content-length"]
+        headers += [
+            (b"content-encoding", self.coding.encode("latin-1")),
+            (b"content-length", str(len(compressed)).encode("latin-1"))
+        ]
+        add_vary(headers, b"Accept-Encoding")
+        await self.send({**self.start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": compressed})
+
+def encoding_capabilities() -> Dict[str, bool]:
+    """Which optional encoders are installed"""
+    return {
+        "orjson": ORJSON_AVAILABLE,
+        "msgpack": MSGPACK_AVAILABLE,
+        "brotli": BROTLI_AVAILABLE,
+        "gzip": True
+    }
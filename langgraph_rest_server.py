@@ -13,26 +13,39 @@ import json
 import uuid
 import asyncio
 import logging
-from datetime import datetime
-from typing import Dict, Any, List, Optional, TypedDict, Annotated
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, TypedDict, Annotated, Callable, Tuple
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 # LangGraph imports
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.types import Command, interrupt
 from langchain_core.messages import BaseMessage
 
 # Import state manager for advanced state handling
 from langgraph_state_manager import (
     LangGraphStateManager, StateType, StateMetadata,
-    create_state_manager, validate_powershell_state
+    create_state_manager, validate_powershell_state, validate_state_batch, load_state_schemas,
+    to_snapshot_time
+)
+from langgraph_checkpoint_pool import CheckpointerPool, CheckpointCompactor
+from langgraph_approval_store import ApprovalStore, ApprovalDeadlineScheduler
+from langgraph_thread_registry import ThreadRegistry
+from langgraph_server_state import GraphRegistry, WorkflowIndex, create_state_backend
+from langgraph_run_control import RunCancelled, RunHandle, RunTracker
+from langgraph_response_encoding import NegotiatedResponse, NegotiationMiddleware, encoding_capabilities
+from langgraph_idempotency import (
+    IdempotencyCache, IdempotencyConflict, IdempotencyInProgress, request_fingerprint
 )
 
 # Configure logging
@@ -48,17 +61,427 @@ logger = logging.getLogger(__name__)
 
 # Global variables for server state
 server_state = {
-    'graphs': {},
-    'checkpointers': {},
-    'active_threads': {},
-    'interrupt_queue': {},
+    'state_backend': None,
+    'graphs': None,
+    'workflow_index': None,
+    'checkpointer_pool': None,
+    'thread_registry': None,
+    'approval_store': None,
+    'approval_scheduler': None,
+    'resume_worker': None,
     'startup_time': None,
-    'state_manager': None
+    'state_manager': None,
+    'executor': None,
+    'run_tracker': None,
+    'idempotency': None,
+    'compactor': None,
+    'compaction_task': None
 }
 
 # SQLite database path
 DB_PATH = "langgraph_bridge.db"
 
+# Where graph bookkeeping lives: "memory" for one worker, "sqlite" to share it
+# between uvicorn workers serving the same database
+SERVER_WORKERS = int(os.environ.get("LANGGRAPH_WORKERS", 1))
+STATE_BACKEND = os.environ.get("LANGGRAPH_STATE_BACKEND", "sqlite" if SERVER_WORKERS > 1 else "memory")
+
+# Shared checkpointer connections and how long a writer waits for the lock
+CHECKPOINTER_POOL_SIZE = int(os.environ.get("LANGGRAPH_CHECKPOINTER_POOL_SIZE", 4))
+CHECKPOINTER_BUSY_TIMEOUT_MS = int(os.environ.get("LANGGRAPH_CHECKPOINTER_BUSY_TIMEOUT_MS", 5000))
+
+# Pooled connections held by the state snapshot store
+STATE_POOL_SIZE = int(os.environ.get("LANGGRAPH_STATE_POOL_SIZE", 4))
+
+# State versions between full keyframes; the rest are stored as deltas
+STATE_KEYFRAME_INTERVAL = int(os.environ.get("LANGGRAPH_STATE_KEYFRAME_INTERVAL", 10))
+
+# Codec for stored states (auto, zstd, zlib, none) and the smallest payload compressed
+STATE_COMPRESSION = os.environ.get("LANGGRAPH_STATE_COMPRESSION", "auto")
+STATE_COMPRESS_MIN_BYTES = int(os.environ.get("LANGGRAPH_STATE_COMPRESS_MIN_BYTES", 1024))
+
+# Keep running snapshot totals so /state/statistics does not scan the table
+STATE_STATS_TABLE = os.environ.get("LANGGRAPH_STATE_STATS_TABLE", "1").lower() not in ("0", "false", "no")
+
+# Queue state versions for a background writer that commits them in batches,
+# flushing once STATE_WRITE_BATCH_SIZE are waiting or after STATE_WRITE_DELAY_MS
+STATE_WRITE_BEHIND = os.environ.get("LANGGRAPH_STATE_WRITE_BEHIND", "0").lower() not in ("0", "false", "no")
+STATE_WRITE_BATCH_SIZE = int(os.environ.get("LANGGRAPH_STATE_WRITE_BATCH_SIZE", 256))
+STATE_WRITE_DELAY_MS = float(os.environ.get("LANGGRAPH_STATE_WRITE_DELAY_MS", 50))
+
+# Longest a durable write or a read waits on the write-behind queue
+STATE_WRITE_TIMEOUT = float(os.environ.get("LANGGRAPH_STATE_WRITE_TIMEOUT", 30))
+
+# Optional JSON file of custom state schemas keyed by state type
+STATE_SCHEMAS_PATH = os.environ.get("LANGGRAPH_STATE_SCHEMAS")
+
+# Largest batch accepted by /state/validate-batch
+STATE_VALIDATE_BATCH_MAX = int(os.environ.get("LANGGRAPH_STATE_VALIDATE_BATCH_MAX", 10000))
+
+# Largest page served by /approval/pending
+APPROVAL_PAGE_MAX = int(os.environ.get("LANGGRAPH_APPROVAL_PAGE_MAX", 500))
+
+# Thread records kept in memory; everything else, including results, stays on disk
+THREAD_CACHE_SIZE = int(os.environ.get("LANGGRAPH_THREAD_CACHE_SIZE", 1000))
+THREAD_CACHE_TTL = float(os.environ.get("LANGGRAPH_THREAD_CACHE_TTL", 3600))
+
+# Largest page served by /threads and /graphs
+LIST_PAGE_MAX = int(os.environ.get("LANGGRAPH_LIST_PAGE_MAX", 500))
+
+# Concurrent resumptions driven by approval decisions
+RESUME_WORKERS = int(os.environ.get("LANGGRAPH_RESUME_WORKERS", 8))
+
+# Worker threads available for synchronous graph execution
+EXECUTOR_MAX_WORKERS = int(os.environ.get(
+    "LANGGRAPH_EXECUTOR_WORKERS", min(32, (os.cpu_count() or 1) + 4)
+))
+
+# Run budgets: default seconds per run (0 for none), the ceiling any request
+# may ask for, and per-graph-type overrides as JSON, e.g. {"hitl": 60}
+RUN_TIMEOUT_SECONDS = float(os.environ.get("LANGGRAPH_RUN_TIMEOUT", 300))
+RUN_TIMEOUT_MAX = float(os.environ.get("LANGGRAPH_RUN_TIMEOUT_MAX", 3600))
+RUN_BUDGETS = json.loads(os.environ.get("LANGGRAPH_RUN_BUDGETS", "{}"))
+
+# Checkpoint retention: checkpoints kept per thread, how long finished threads
+# are kept (0 keeps them forever) and how often compaction runs (0 for on demand)
+CHECKPOINT_KEEP_LAST = int(os.environ.get("LANGGRAPH_CHECKPOINT_KEEP_LAST", 20))
+THREAD_RETENTION_SECONDS = float(os.environ.get("LANGGRAPH_THREAD_RETENTION", 7 * 86400))
+COMPACT_INTERVAL_SECONDS = float(os.environ.get("LANGGRAPH_COMPACT_INTERVAL", 0))
+
+# Thread statuses that retention may delete
+FINISHED_THREAD_STATUSES = ("completed", "failed", "cancelled", "timed_out")
+
+# How long responses to requests with an Idempotency-Key are replayed
+IDEMPOTENCY_TTL = float(os.environ.get("LANGGRAPH_IDEMPOTENCY_TTL", 86400))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("LANGGRAPH_COMPRESS_MIN_BYTES", 1024))
+
+# Stream modes accepted by /graphs/{graph_id}/stream
+STREAM_MODES = {"values", "updates", "debug", "messages", "custom", "checkpoints", "tasks"}
+
+# Chunks buffered per stream before the graph worker waits for the client
+STREAM_BUFFER_CHUNKS = int(os.environ.get("LANGGRAPH_STREAM_BUFFER", 64))
+
+# Batch execution limits
+BATCH_MAX_CONCURRENCY = int(os.environ.get("LANGGRAPH_BATCH_MAX_CONCURRENCY", EXECUTOR_MAX_WORKERS))
+BATCH_MAX_THREADS = int(os.environ.get("LANGGRAPH_BATCH_MAX_THREADS", 1000))
+
+class GraphExecutionPool:
+    """Bounded worker pool that keeps synchronous graph runs off the event loop"""
+    
+    def __init__(self, max_workers: int = EXECUTOR_MAX_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="langgraph-exec"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+    
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on the pool and await its result"""
+        with self._lock:
+            self._queued += 1
+        
+        def _task():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self._running -= 1
+                    self._failed += 1
+                raise
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+            return result
+        
+        future = self._executor.submit(_task)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+    
+    def _on_done(self, future):
+        # A task cancelled before it started never decremented the queue
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current pool utilisation and queue depth"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed
+            }
+    
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the worker threads"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+def get_checkpointer_pool() -> CheckpointerPool:
+    """Return the shared checkpointer pool, creating it on first use"""
+    if server_state['checkpointer_pool'] is None:
+        server_state['checkpointer_pool'] = CheckpointerPool(
+            DB_PATH, CHECKPOINTER_POOL_SIZE, CHECKPOINTER_BUSY_TIMEOUT_MS
+        )
+    return server_state['checkpointer_pool']
+
+def get_state_backend():
+    """Return the configured server state backend, creating it on first use"""
+    if server_state['state_backend'] is None:
+        server_state['state_backend'] = create_state_backend(
+            STATE_BACKEND, DB_PATH, CHECKPOINTER_BUSY_TIMEOUT_MS
+        )
+        logger.info(f"Server state backend: {STATE_BACKEND}")
+    return server_state['state_backend']
+
+def _bind_graph(definition: Dict[str, Any]) -> Dict[str, Any]:
+    """Bind a graph definition to a pooled checkpointer and its compiled template"""
+    checkpointer = get_checkpointer_pool().acquire()
+    return {
+        'graph': graph_templates.compile(definition['type'], checkpointer),
+        'checkpointer': checkpointer
+    }
+
+def get_graph_registry() -> GraphRegistry:
+    """Return the graph registry, creating it on first use"""
+    if server_state['graphs'] is None:
+        server_state['graphs'] = GraphRegistry(get_state_backend(), _bind_graph)
+    return server_state['graphs']
+
+def get_workflow_index() -> WorkflowIndex:
+    """Return the workflow-to-graph/thread index, creating it on first use"""
+    if server_state['workflow_index'] is None:
+        server_state['workflow_index'] = WorkflowIndex(get_state_backend())
+    return server_state['workflow_index']
+
+def get_thread_registry() -> ThreadRegistry:
+    """Return the bounded thread registry, creating it on first use"""
+    if server_state['thread_registry'] is None:
+        server_state['thread_registry'] = ThreadRegistry(
+            DB_PATH,
+            # Another worker may update any record, so only cache when state is local
+            max_entries=THREAD_CACHE_SIZE if not get_state_backend().shared else 0,
+            ttl_seconds=THREAD_CACHE_TTL,
+            encode=lambda value: json.dumps(jsonable_encoder(value), default=str),
+            busy_timeout_ms=CHECKPOINTER_BUSY_TIMEOUT_MS
+        )
+    return server_state['thread_registry']
+
+def get_approval_store() -> ApprovalStore:
+    """Return the durable approval store, creating it on first use"""
+    if server_state['approval_store'] is None:
+        server_state['approval_store'] = ApprovalStore(DB_PATH, CHECKPOINTER_BUSY_TIMEOUT_MS)
+    return server_state['approval_store']
+
+def get_approval_scheduler() -> ApprovalDeadlineScheduler:
+    """Return the approval deadline scheduler, creating it on first use"""
+    if server_state['approval_scheduler'] is None:
+        server_state['approval_scheduler'] = ApprovalDeadlineScheduler(
+            get_approval_store(),
+            on_resolved=_on_approval_resolved
+        )
+    return server_state['approval_scheduler']
+
+def _on_approval_resolved(approval_data: Dict[str, Any]):
+    """Resume the thread of an approval the deadline scheduler approved or rejected"""
+    logger.info(f"Approval {approval_data['approval_id']} resolved by deadline: {approval_data.get('decision')}")
+    get_resume_worker().submit(approval_data)
+
+class ApprovalResumeWorker:
+    """
+    Resumes interrupted LangGraph threads with approval decisions
+    
+    Decisions are queued by the approval endpoints and the deadline scheduler;
+    a fixed number of worker tasks drain the queue onto the execution pool.
+    """
+    
+    def __init__(self, concurrency: int = RESUME_WORKERS):
+        self.concurrency = max(1, concurrency)
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._in_flight = 0
+        self._resumed = 0
+        self._failed = 0
+    
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+    
+    async def stop(self):
+        """Cancel the worker tasks; queued decisions stay recorded as queued"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+    
+    def submit(self, approval_data: Dict[str, Any]) -> bool:
+        """
+        Queue the thread linked to a decided approval for resumption
+        
+        Blocks on the thread registry and approval store, so async callers run
+        it on a worker thread; the queue is handed the approval on its loop.
+        
+        Returns:
+            True if a waiting thread was found and queued
+        """
+        thread_id = approval_data.get('thread_id')
+        thread_info = get_thread_registry().get(thread_id) if thread_id else None
+        if not thread_info or thread_info.get('status') != 'interrupted':
+            return False
+        
+        if self._queue is None:
+            logger.warning(f"Resume worker not running, cannot resume thread {thread_id}")
+            return False
+        
+        approval_id = approval_data['approval_id']
+        get_approval_store().update(approval_id, {
+            'graph_id': approval_data.get('graph_id') or thread_info['graph_id'],
+            'resume_status': 'queued'
+        })
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, approval_id)
+        return True
+    
+    async def _work(self):
+        while True:
+            approval_id = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self._resume(approval_id)
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"Resume for approval {approval_id} failed: {e}")
+                await run_in_threadpool(get_approval_store().update, approval_id, {
+                    'resume_status': 'failed',
+                    'resume_error': str(e),
+                    'resumed_at': datetime.now().isoformat()
+                })
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+    
+    async def _resume(self, approval_id: str):
+        approval_store = get_approval_store()
+        approval_data = await run_in_threadpool(approval_store.get, approval_id)
+        graph_id = approval_data['graph_id']
+        thread_id = approval_data['thread_id']
+        
+        if graph_id not in get_graph_registry():
+            raise RuntimeError(f"Graph {graph_id} not found")
+        
+        thread_info = await run_in_threadpool(get_thread_registry().get, thread_id)
+        if not thread_info or thread_info.get('status') != 'interrupted':
+            await run_in_threadpool(approval_store.update, approval_id, {
+                'resume_status': 'skipped',
+                'resumed_at': datetime.now().isoformat()
+            })
+            return
+        
+        approved = bool(approval_data.get('decision'))
+        if not approved and thread_info.get('paused_by') == 'workflow_interrupt':
+            # A run paused for this approval has no interrupt to receive the rejection
+            await _save_thread(thread_id, {
+                'graph_id': graph_id,
+                'status': 'cancelled',
+                'last_update': datetime.now().isoformat(),
+                'reason': 'approval_rejected'
+            })
+            await run_in_threadpool(approval_store.update, approval_id, {
+                'resume_status': 'cancelled',
+                'resumed_at': datetime.now().isoformat()
+            })
+            return
+        
+        resume_value = {
+            "approved": approved,
+            "action": "approve" if approved else "reject",
+            "approved_by": approval_data.get('approved_by'),
+            "approval_timestamp": approval_data.get('approved_at'),
+            "comments": approval_data.get('comments'),
+            "approval_id": approval_id
+        }
+        
+        logger.info(f"Resuming thread {thread_id} of graph {graph_id} for approval {approval_id}")
+        graph_info = get_graph_registry()[graph_id]
+        outcome = await _resume_graph_thread(
+            graph_id, graph_info['graph'], thread_id, resume_value, _run_budget(graph_info['type'])
+        )
+        
+        self._resumed += 1
+        await run_in_threadpool(approval_store.update, approval_id, {
+            'resume_status': outcome['status'],
+            'resume_result': jsonable_encoder(outcome.get('result')),
+            'resumed_at': datetime.now().isoformat()
+        })
+    
+    async def join(self):
+        """Wait until every queued decision has been processed"""
+        if self._queue is not None:
+            await self._queue.join()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and resume counts"""
+        return {
+            "workers": self.concurrency,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._in_flight,
+            "resumed": self._resumed,
+            "failed": self._failed,
+            "running": bool(self._tasks)
+        }
+
+def get_resume_worker() -> ApprovalResumeWorker:
+    """Return the approval resume worker, creating it on first use"""
+    if server_state['resume_worker'] is None:
+        server_state['resume_worker'] = ApprovalResumeWorker(RESUME_WORKERS)
+    return server_state['resume_worker']
+
+def get_run_tracker() -> RunTracker:
+    """Return the tracker of in-flight runs, creating it on first use"""
+    if server_state['run_tracker'] is None:
+        server_state['run_tracker'] = RunTracker()
+    return server_state['run_tracker']
+
+def get_checkpoint_compactor() -> CheckpointCompactor:
+    """Return the checkpoint compactor, creating it on first use"""
+    if server_state['compactor'] is None:
+        server_state['compactor'] = CheckpointCompactor(get_checkpointer_pool(), keep_last=CHECKPOINT_KEEP_LAST)
+    return server_state['compactor']
+
+def get_idempotency_cache() -> IdempotencyCache:
+    """Return the idempotency key cache, creating it on first use"""
+    if server_state['idempotency'] is None:
+        server_state['idempotency'] = IdempotencyCache(
+            get_state_backend(),
+            ttl_seconds=IDEMPOTENCY_TTL,
+            # An in-flight marker outlives the longest run it can stand for
+            pending_ttl_seconds=RUN_TIMEOUT_MAX
+        )
+    return server_state['idempotency']
+
+def get_execution_pool() -> GraphExecutionPool:
+    """Return the server execution pool, creating it on first use"""
+    if server_state['executor'] is None:
+        server_state['executor'] = GraphExecutionPool(EXECUTOR_MAX_WORKERS)
+        logger.info(f"Graph execution pool started with {EXECUTOR_MAX_WORKERS} workers")
+    return server_state['executor']
+
 # Pydantic models for API requests/responses
 class GraphState(TypedDict):
     """Basic graph state structure"""
@@ -74,6 +497,7 @@ class CreateGraphRequest(BaseModel):
     graph_id: str = Field(..., description="Unique identifier for the graph")
     graph_type: str = Field(default="basic", description="Type of graph to create")
     config: Optional[Dict[str, Any]] = Field(default={}, description="Graph configuration")
+    workflow_id: Optional[str] = Field(default=None, description="Workflow this graph runs, for /workflow/{workflow_id} lookups")
 
 class ExecuteGraphRequest(BaseModel):
     """Request model for executing a graph"""
@@ -81,12 +505,32 @@ class ExecuteGraphRequest(BaseModel):
     initial_state: Optional[Dict[str, Any]] = Field(default={}, description="Initial state")
     thread_id: Optional[str] = Field(default=None, description="Thread ID for persistence")
     interrupt_points: Optional[List[str]] = Field(default=[], description="Nodes where interrupts are allowed")
+    timeout_seconds: Optional[float] = Field(default=None, gt=0, description="Run budget, overriding the graph type's")
+    workflow_id: Optional[str] = Field(default=None, description="Workflow this run belongs to (defaults to the graph's)")
+
+class StreamGraphRequest(ExecuteGraphRequest):
+    """Request model for streaming a graph run"""
+    stream_mode: str = Field(default="updates", description="LangGraph stream mode: values, updates, debug, messages, custom")
+
+class BatchThreadRequest(BaseModel):
+    """One thread of a batch execution"""
+    thread_id: Optional[str] = Field(default=None, description="Thread ID for persistence")
+    initial_state: Optional[Dict[str, Any]] = Field(default={}, description="Initial state")
+
+class ExecuteBatchRequest(BaseModel):
+    """Request model for executing many threads of one graph"""
+    graph_id: str = Field(..., description="Graph identifier to execute")
+    threads: List[BatchThreadRequest] = Field(..., description="Threads to run")
+    max_concurrency: Optional[int] = Field(default=None, description="Maximum threads running at once")
+    stream: bool = Field(default=False, description="Stream per-thread results as NDJSON")
+    timeout_seconds: Optional[float] = Field(default=None, gt=0, description="Run budget for each thread")
 
 class ResumeGraphRequest(BaseModel):
     """Request model for resuming an interrupted graph"""
     graph_id: str = Field(..., description="Graph identifier")
     thread_id: str = Field(..., description="Thread ID to resume")
     resume_value: Any = Field(..., description="Value to resume with")
+    timeout_seconds: Optional[float] = Field(default=None, gt=0, description="Run budget, overriding the graph type's")
 
 class InterruptResponse(BaseModel):
     """Response model for interrupt requests"""
@@ -104,6 +548,8 @@ class ApprovalRequest(BaseModel):
     urgency_level: str = Field(default="medium", description="Urgency level: low, medium, high, critical")
     request_type: str = Field(default="documentation", description="Type of approval request")
     metadata: Optional[Dict[str, Any]] = Field(default={}, description="Additional metadata")
+    graph_id: Optional[str] = Field(default=None, description="Graph of the interrupted thread to resume")
+    thread_id: Optional[str] = Field(default=None, description="Interrupted thread to resume on decision")
 
 class ApprovalResponse(BaseModel):
     """Response model for approval decisions"""
@@ -120,32 +566,114 @@ async def lifespan(app: FastAPI):
     logger.info("Starting LangGraph REST API Server for PowerShell Bridge")
     server_state['startup_time'] = datetime.now().isoformat()
     
-    # Initialize SQLite checkpointer
+    # Initialize shared SQLite checkpointer pool
     try:
-        with SqliteSaver.from_conn_string(f"file:{DB_PATH}") as checkpointer:
-            server_state['default_checkpointer'] = checkpointer
-            logger.info(f"Initialized SQLite checkpointer: {DB_PATH}")
+        get_checkpointer_pool()
+        logger.info(f"Initialized SQLite checkpointer pool: {DB_PATH}")
     except Exception as e:
-        logger.error(f"Failed to initialize SQLite checkpointer: {e}")
+        logger.error(f"Failed to initialize SQLite checkpointer pool: {e}")
     
     # Initialize state manager
     try:
-        server_state['state_manager'] = create_state_manager(DB_PATH)
+        server_state['state_manager'] = create_state_manager(
+            DB_PATH, STATE_POOL_SIZE, STATE_KEYFRAME_INTERVAL, STATE_COMPRESSION, STATE_COMPRESS_MIN_BYTES,
+            STATE_STATS_TABLE, STATE_WRITE_BEHIND, STATE_WRITE_BATCH_SIZE, STATE_WRITE_DELAY_MS,
+            STATE_WRITE_TIMEOUT
+        )
         logger.info("LangGraph State Manager initialized")
     except Exception as e:
         logger.error(f"Failed to initialize state manager: {e}")
     
+    # Load custom state schemas
+    if STATE_SCHEMAS_PATH:
+        try:
+            loaded = load_state_schemas(STATE_SCHEMAS_PATH)
+            logger.info(f"Loaded custom state schemas for: {loaded}")
+        except Exception as e:
+            logger.error(f"Failed to load state schemas from {STATE_SCHEMAS_PATH}: {e}")
+    
+    # Initialize durable approval store
+    try:
+        get_approval_store()
+        logger.info("Approval store initialized")
+    except Exception as e:
+        logger.error(f"Failed to initialize approval store: {e}")
+    
+    # Start resuming threads from approval decisions
+    get_resume_worker().start()
+    
+    # Start expiring and escalating approvals by deadline
+    try:
+        get_approval_scheduler().start()
+        logger.info("Approval deadline scheduler started")
+    except Exception as e:
+        logger.error(f"Failed to start approval scheduler: {e}")
+    
+    get_execution_pool()
+    
+    if COMPACT_INTERVAL_SECONDS > 0:
+        server_state['compaction_task'] = asyncio.create_task(_compaction_loop(COMPACT_INTERVAL_SECONDS))
+        logger.info(f"Checkpoint compaction scheduled every {COMPACT_INTERVAL_SECONDS}s")
+    
     yield
     
     logger.info("Shutting down LangGraph REST API Server")
+    
+    if server_state['compaction_task'] is not None:
+        server_state['compaction_task'].cancel()
+        server_state['compaction_task'] = None
+    if server_state['approval_scheduler'] is not None:
+        await server_state['approval_scheduler'].stop()
+        server_state['approval_scheduler'] = None
+    if server_state['resume_worker'] is not None:
+        await server_state['resume_worker'].stop()
+        server_state['resume_worker'] = None
+    
+    # Stop in-flight runs at their next chunk so the executor can drain
+    if server_state['run_tracker'] is not None:
+        server_state['run_tracker'].cancel_all("shutdown")
+    
+    if server_state['executor'] is not None:
+        server_state['executor'].shutdown(wait=True)
+        server_state['executor'] = None
+    
+    server_state['compactor'] = None
+    
+    # Graphs hold savers from the pool, so drop them before closing connections
+    if server_state['graphs'] is not None:
+        server_state['graphs'].release_handles()
+        server_state['graphs'] = None
+    graph_templates.clear_compiled()
+    if server_state['checkpointer_pool'] is not None:
+        server_state['checkpointer_pool'].close()
+        server_state['checkpointer_pool'] = None
+    if server_state['approval_store'] is not None:
+        server_state['approval_store'].close()
+        server_state['approval_store'] = None
+    if server_state['thread_registry'] is not None:
+        server_state['thread_registry'].close()
+        server_state['thread_registry'] = None
+    if server_state['state_manager'] is not None:
+        server_state['state_manager'].close()
+        server_state['state_manager'] = None
+    server_state['idempotency'] = None
+    server_state['workflow_index'] = None
+    if server_state['state_backend'] is not None:
+        server_state['state_backend'].close()
+        server_state['state_backend'] = None
 
 app = FastAPI(
     title="LangGraph PowerShell Bridge API",
     description="REST API for PowerShell-LangGraph integration",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson-rendered JSON, or MessagePack for clients that Accept it
+    default_response_class=NegotiatedResponse
 )
 
+# gzip/br for responses above the threshold when the client accepts it
+app.add_middleware(NegotiationMiddleware, min_size=COMPRESS_MIN_BYTES)
+
 # Node functions for different graph types
 def chatbot_node(state: GraphState):
     """Basic chatbot node for testing"""
@@ -463,6 +991,108 @@ def create_conditional_interrupt_graph() -> StateGraph:
     
     return graph_builder
 
+# Compiled graph templates
+
+class GraphTemplateRegistry:
+    """
+    Registry of graph types that compiles each type once per checkpointer
+    
+    Graph ids created through the API share the compiled graph for their type;
+    runs are isolated by thread_id in the shared checkpointer.
+    """
+    
+    def __init__(self):
+        self._builders: Dict[str, Callable[[], StateGraph]] = {}
+        self._budgets: Dict[str, float] = {}
+        self._compiled: Dict[Tuple[str, int], Any] = {}
+        self._lock = threading.Lock()
+    
+    def register(self,
+                 graph_type: str,
+                 builder: Callable[[], StateGraph],
+                 replace: bool = False,
+                 timeout_seconds: Optional[float] = None):
+        """Register a builder function for a graph type, optionally with a run budget"""
+        with self._lock:
+            if graph_type in self._builders and not replace:
+                raise ValueError(f"Graph type {graph_type} is already registered")
+            self._builders[graph_type] = builder
+            if timeout_seconds:
+                self._budgets[graph_type] = timeout_seconds
+            else:
+                self._budgets.pop(graph_type, None)
+            # Drop any graphs compiled from a previous builder
+            for key in [key for key in self._compiled if key[0] == graph_type]:
+                del self._compiled[key]
+        logger.info(f"Registered graph type: {graph_type}")
+    
+    def __contains__(self, graph_type: str) -> bool:
+        return graph_type in self._builders
+    
+    def types(self) -> List[str]:
+        """Registered graph type names"""
+        return sorted(self._builders)
+    
+    def budget_for(self, graph_type: str) -> Optional[float]:
+        """Run budget in seconds for a graph type, if it has one"""
+        return RUN_BUDGETS.get(graph_type) or self._budgets.get(graph_type)
+    
+    def compile(self, graph_type: str, checkpointer) -> Any:
+        """Get the compiled graph for a type bound to the given checkpointer"""
+        key = (graph_type, id(checkpointer))
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+        
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is None:
+                if graph_type not in self._builders:
+                    raise KeyError(f"Unknown graph type: {graph_type}")
+                compiled = self._builders[graph_type]().compile(checkpointer=checkpointer)
+                self._compiled[key] = compiled
+                logger.info(f"Compiled graph template: {graph_type}")
+        return compiled
+    
+    def clear_compiled(self):
+        """Forget compiled graphs, e.g. when the checkpointer pool is closed"""
+        with self._lock:
+            self._compiled.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Registered types and number of compiled templates"""
+        return {
+            "types": self.types(),
+            "compiled": len(self._compiled),
+            "budgets": {graph_type: self.budget_for(graph_type) for graph_type in self.types()
+                        if self.budget_for(graph_type)}
+        }
+
+graph_templates = GraphTemplateRegistry()
+graph_templates.register("basic", create_basic_graph)
+graph_templates.register("hitl", create_hitl_graph)
+graph_templates.register("simple_approval", create_simple_approval_graph)
+graph_templates.register("detailed_approval", create_detailed_approval_graph)
+graph_templates.register("state_review", create_state_review_graph)
+graph_templates.register("conditional_interrupt", create_conditional_interrupt_graph)
+
+def register_graph_type(graph_type: str,
+                        builder: Callable[[], StateGraph],
+                        replace: bool = False,
+                        timeout_seconds: Optional[float] = None):
+    """
+    Register an additional graph type for POST /graphs
+    
+    Call at startup, before the server begins accepting requests.
+    
+    Args:
+        graph_type: Name clients pass as graph_type
+        builder: Function returning an uncompiled StateGraph
+        replace: Whether to overwrite an existing registration
+        timeout_seconds: Run budget for graphs of this type (default LANGGRAPH_RUN_TIMEOUT)
+    """
+    graph_templates.register(graph_type, builder, replace=replace, timeout_seconds=timeout_seconds)
+
 # API Endpoints
 
 @app.get("/")
@@ -473,19 +1103,19 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "startup_time": server_state.get('startup_time'),
-        "active_graphs": len(server_state['graphs']),
-        "active_threads": len(server_state['active_threads'])
+        "active_graphs": len(get_graph_registry()),
+        "active_threads": await run_in_threadpool(len, get_thread_registry()),
+        "encodings": encoding_capabilities()
     }
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        # Test SQLite connection by trying to create and use a checkpointer
-        checkpointer_cm = SqliteSaver.from_conn_string(f"file:{DB_PATH}")
-        with checkpointer_cm as checkpointer:
-            # Just test that we can access the checkpointer
-            health_status = "healthy"
+        # Test the checkpoint database on a worker thread, so a slow disk or a
+        # held lock never stalls the event loop
+        healthy = await run_in_threadpool(get_checkpointer_pool().ping)
+        health_status = "healthy" if healthy else "unhealthy"
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         health_status = "unhealthy"
@@ -493,7 +1123,12 @@ async def health_check():
     return {
         "status": health_status,
         "timestamp": datetime.now().isoformat(),
-        "database": "connected" if health_status == "healthy" else "error"
+        "database": "connected" if health_status == "healthy" else "error",
+        "executor": get_execution_pool().stats(),
+        "runs": get_run_tracker().stats(),
+        "checkpointer_pool": get_checkpointer_pool().stats(),
+        "approval_scheduler": get_approval_scheduler().stats(),
+        "resume_worker": get_resume_worker().stats()
     }
 
 @app.post("/graphs")
@@ -502,253 +1137,759 @@ async def create_graph(request: CreateGraphRequest):
     try:
         logger.info(f"Creating graph: {request.graph_id} (type: {request.graph_type})")
         
-        # Check if graph already exists
-        if request.graph_id in server_state['graphs']:
-            raise HTTPException(status_code=400, detail=f"Graph {request.graph_id} already exists")
-        
-        # Create graph based on type
-        if request.graph_type == "basic":
-            graph_builder = create_basic_graph()
-        elif request.graph_type == "hitl":
-            graph_builder = create_hitl_graph()
-        elif request.graph_type == "simple_approval":
-            graph_builder = create_simple_approval_graph()
-        elif request.graph_type == "detailed_approval":
-            graph_builder = create_detailed_approval_graph()
-        elif request.graph_type == "state_review":
-            graph_builder = create_state_review_graph()
-        elif request.graph_type == "conditional_interrupt":
-            graph_builder = create_conditional_interrupt_graph()
-        else:
+        if request.graph_type not in graph_templates:
             raise HTTPException(status_code=400, detail=f"Unknown graph type: {request.graph_type}")
         
-        # Create a checkpointer for this graph
-        # Note: We don't use context manager here because we need the checkpointer to stay alive
-        import sqlite3
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        checkpointer = SqliteSaver(conn=conn)
-        compiled_graph = graph_builder.compile(checkpointer=checkpointer)
-        
-        # Store graph in server state
-        server_state['graphs'][request.graph_id] = {
-            'graph': compiled_graph,
-            'checkpointer': checkpointer,
+        # Bind to a pooled checkpointer and reuse the compiled template for this type
+        workflow_id = request.workflow_id or (request.config or {}).get('workflow_id')
+        definition = {
             'type': request.graph_type,
             'config': request.config,
+            'workflow_id': workflow_id,
             'created_at': datetime.now().isoformat()
         }
         
+        # Store graph in server state; the check and insert are atomic across workers
+        if not get_graph_registry().add(request.graph_id, {**definition, **_bind_graph(definition)}):
+            raise HTTPException(status_code=400, detail=f"Graph {request.graph_id} already exists")
+        
+        if workflow_id:
+            get_workflow_index().link(workflow_id, request.graph_id)
+        
         logger.info(f"Graph {request.graph_id} created successfully")
         return {
             "graph_id": request.graph_id,
             "type": request.graph_type,
+            "workflow_id": workflow_id,
             "status": "created",
             "timestamp": datetime.now().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating graph {request.graph_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/graphs/{graph_id}/execute")
-async def execute_graph(graph_id: str, request: ExecuteGraphRequest):
-    """Execute a graph with given initial state"""
+@app.get("/graphs/types")
+async def list_graph_types():
+    """List registered graph types"""
+    return {
+        "graph_types": graph_templates.types(),
+        "templates": graph_templates.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _build_initial_state(state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the graph input from the state supplied by the client"""
+    state = state or {}
+    return {
+        "messages": state.get("messages", []),
+        "counter": state.get("counter", 0),
+        "user_input": state.get("user_input"),
+        "approval_needed": False,
+        "approved": None,
+        "result": None
+    }
+
+def _run_budget(graph_type: str, requested: Optional[float] = None) -> Optional[float]:
+    """Seconds a run may take: the request's budget, else the graph type's, else the default"""
+    budget = requested or graph_templates.budget_for(graph_type) or RUN_TIMEOUT_SECONDS
+    return min(budget, RUN_TIMEOUT_MAX) if budget else None
+
+def _start_run(graph_id: str, thread_id: str, timeout_seconds: Optional[float]) -> RunHandle:
+    """Register a run for the thread and mark the thread as running"""
+    poll = None
+    if get_state_backend().shared:
+        # A cancel handled by another worker only reaches this run through the thread record
+        def poll() -> Optional[str]:
+            return (get_thread_registry().get(thread_id) or {}).get('cancel_requested')
+    
     try:
-        logger.info(f"Executing graph: {graph_id}")
-        
-        # Check if graph exists
-        if graph_id not in server_state['graphs']:
-            raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
-        
-        graph_info = server_state['graphs'][graph_id]
-        graph = graph_info['graph']
-        
-        # Generate thread ID if not provided
-        thread_id = request.thread_id or str(uuid.uuid4())
-        config = {"configurable": {"thread_id": thread_id}}
-        
-        # Prepare initial state
-        initial_state = {
-            "messages": request.initial_state.get("messages", []),
-            "counter": request.initial_state.get("counter", 0),
-            "user_input": request.initial_state.get("user_input"),
-            "approval_needed": False,
-            "approved": None,
-            "result": None
+        handle = get_run_tracker().start(thread_id, graph_id, timeout_seconds, poll)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    record = {
+        'graph_id': graph_id,
+        'status': 'running',
+        'last_update': datetime.now().isoformat(),
+        'timeout_seconds': timeout_seconds
+    }
+    if not get_state_backend().shared:
+        get_thread_registry()[thread_id] = record
+        return handle
+    
+    # The run tracker only sees this worker's runs; claim the shared record so
+    # two workers never run one thread. A record older than the longest budget
+    # is left over from a worker that died mid-run.
+    stale_before = (datetime.now() - timedelta(seconds=RUN_TIMEOUT_MAX)).isoformat()
+    if not get_thread_registry().claim(thread_id, record, stale_before):
+        get_run_tracker().finish(handle)
+        raise HTTPException(status_code=409, detail=f"Thread {thread_id} already has an active run on another worker")
+    return handle
+
+async def _save_thread(thread_id: str, info: Dict[str, Any]):
+    """Write a thread record on a worker thread; the registry writes through to SQLite"""
+    await run_in_threadpool(get_thread_registry().__setitem__, thread_id, info)
+
+async def _run_with_budget(handle: RunHandle, func, *args):
+    """
+    Run a blocking callable on the execution pool within the run's budget
+    
+    The callable must call handle.check() between chunks. If the budget runs out
+    or the run is cancelled first, RunCancelled is raised here straight away and
+    the worker thread stops at its next check. A pause waits for that check.
+    """
+    work = asyncio.ensure_future(get_execution_pool().run(func, *args))
+    stopped = handle.watch(asyncio.get_running_loop())
+    try:
+        await asyncio.wait({work, stopped}, timeout=handle.remaining(), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopped.cancel()
+    
+    if not work.done() and handle.reason == 'paused':
+        # A paused run resumes from its last checkpoint, so let the worker reach
+        # its next check and write that checkpoint before the pause is recorded
+        await asyncio.wait({work}, timeout=handle.remaining())
+    
+    if not work.done():
+        handle.cancel("timed_out")
+        # Drops the work if it is still queued; a running worker stops at its next check
+        work.cancel()
+        raise RunCancelled(handle.thread_id, handle.reason)
+    return work.result()
+
+def _record_stopped_run(graph_id: str, handle: RunHandle) -> Dict[str, Any]:
+    """Record a timed out, cancelled or paused run and build its response"""
+    if handle.reason == 'paused':
+        return _record_paused_run(graph_id, handle)
+    
+    status = 'timed_out' if handle.reason == 'timed_out' else 'cancelled'
+    get_thread_registry()[handle.thread_id] = {
+        'graph_id': graph_id,
+        'status': status,
+        'last_update': datetime.now().isoformat(),
+        'reason': handle.reason,
+        'timeout_seconds': handle.timeout_seconds
+    }
+    
+    logger.warning(f"Graph {graph_id} run for thread {handle.thread_id} stopped: {handle.reason}")
+    return {
+        "graph_id": graph_id,
+        "thread_id": handle.thread_id,
+        "status": status,
+        "message": f"Run stopped: {handle.reason}",
+        "timeout_seconds": handle.timeout_seconds,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _record_paused_run(graph_id: str, handle: RunHandle) -> Dict[str, Any]:
+    """
+    Record a run paused for a workflow approval as interrupted
+    
+    Its last checkpoint holds the pending nodes, so resuming the thread with the
+    approval decision continues from where the run stopped.
+    """
+    thread_registry = get_thread_registry()
+    approval_id = (thread_registry.get(handle.thread_id) or {}).get('pause_approval_id')
+    
+    snapshot = None
+    graph_info = get_graph_registry().get(graph_id)
+    if graph_info is not None:
+        try:
+            snapshot = graph_info['graph'].get_state({"configurable": {"thread_id": handle.thread_id}})
+        except Exception as snapshot_error:
+            logger.warning(f"Could not get state snapshot: {snapshot_error}")
+    next_nodes = list(snapshot.next) if snapshot is not None else []
+    
+    thread_registry[handle.thread_id] = {
+        'graph_id': graph_id,
+        'status': 'interrupted',
+        'last_update': datetime.now().isoformat(),
+        'paused_by': 'workflow_interrupt',
+        'pause_approval_id': approval_id,
+        'snapshot': {
+            'next': next_nodes,
+            'tasks': len(snapshot.tasks) if snapshot is not None and snapshot.tasks else 0
         }
+    }
+    
+    logger.info(f"Graph {graph_id} paused for approval {approval_id} on thread {handle.thread_id}")
+    return {
+        "graph_id": graph_id,
+        "thread_id": handle.thread_id,
+        "status": "interrupted",
+        "message": "Graph paused for approval",
+        "approval_id": approval_id,
+        "next_nodes": next_nodes,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _record_failed_run(graph_id: str, thread_id: str, error: Exception):
+    """Record a run that raised so the thread does not stay marked as running"""
+    get_thread_registry()[thread_id] = {
+        'graph_id': graph_id,
+        'status': 'failed',
+        'last_update': datetime.now().isoformat(),
+        'error': str(error)
+    }
+
+def _stream_graph_updates(graph,
+                          initial_state: Dict[str, Any],
+                          config: Dict[str, Any],
+                          handle: Optional[RunHandle] = None):
+    """
+    Drive a graph run to completion or interrupt on a worker thread
+    
+    Returns:
+        Tuple of (last update chunk, chunks processed, state snapshot or None)
+    """
+    result = None
+    chunks_processed = 0
+    
+    # Stream with updates mode to catch interrupts
+    for chunk in graph.stream(initial_state, config, stream_mode="updates"):
+        chunks_processed += 1
+        logger.debug(f"Processing chunk {chunks_processed}: {chunk}")
+        result = chunk
+        if handle is not None:
+            handle.check()
+    
+    # Get the current snapshot to check for interrupts
+    try:
+        snapshot = graph.get_state(config)
+    except Exception as snapshot_error:
+        logger.warning(f"Could not get state snapshot: {snapshot_error}")
+        snapshot = None
+    
+    return result, chunks_processed, snapshot
+
+async def _run_graph_thread(graph_id: str,
+                            graph,
+                            thread_id: str,
+                            initial_state: Dict[str, Any],
+                            config: Dict[str, Any],
+                            timeout_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run one thread of a graph on the execution pool and record its status
+    
+    Returns:
+        Execution response with status completed, interrupted, timed_out or cancelled
+    """
+    handle = await run_in_threadpool(_start_run, graph_id, thread_id, timeout_seconds)
+    try:
+        # Run the synchronous stream on the execution pool so the event loop stays free
+        logger.debug(f"Starting graph stream execution with config: {config}")
+        result, chunks_processed, snapshot = await _run_with_budget(
+            handle, _stream_graph_updates, graph, initial_state, config, handle
+        )
         
-        logger.info(f"Starting graph execution for thread {thread_id}")
+        logger.debug(f"Stream completed. Processed {chunks_processed} chunks.")
         
-        try:
-            # Use streaming execution with updates mode to detect interrupts
-            logger.debug(f"Starting graph stream execution with config: {config}")
-            result = None
-            final_state = None
-            chunks_processed = 0
-            interrupted = False
-            
-            # Stream with updates mode to catch interrupts
-            for chunk in graph.stream(initial_state, config, stream_mode="updates"):
-                chunks_processed += 1
-                logger.debug(f"Processing chunk {chunks_processed}: {chunk}")
-                final_state = chunk
-                result = chunk
-            
-            logger.debug(f"Stream completed. Processed {chunks_processed} chunks.")
-            
-            # Check if the graph was interrupted by examining the final state
-            # Get the current snapshot to check for interrupts
-            try:
-                snapshot = graph.get_state(config)
-                logger.debug(f"Final state snapshot: next={snapshot.next}, tasks={len(snapshot.tasks) if snapshot.tasks else 0}")
-                
-                # If there are pending tasks or next nodes, it might be interrupted
-                if snapshot.next or (snapshot.tasks and len(snapshot.tasks) > 0):
-                    logger.info(f"Graph {graph_id} appears to be interrupted - has pending tasks or next nodes")
-                    interrupted = True
-                    
-                    # Store interrupt information
-                    server_state['active_threads'][thread_id] = {
-                        'graph_id': graph_id,
-                        'status': 'interrupted',
-                        'last_update': datetime.now().isoformat(),
-                        'snapshot': {
-                            'next': snapshot.next,
-                            'tasks': len(snapshot.tasks) if snapshot.tasks else 0
-                        }
-                    }
-                    
-                    return {
-                        "graph_id": graph_id,
-                        "thread_id": thread_id,
-                        "status": "interrupted",
-                        "message": "Graph paused for human input",
-                        "next_nodes": snapshot.next,
-                        "pending_tasks": len(snapshot.tasks) if snapshot.tasks else 0,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    
-            except Exception as snapshot_error:
-                logger.warning(f"Could not get state snapshot: {snapshot_error}")
-            
-            # If we get here without interruption, execution completed
-            server_state['active_threads'][thread_id] = {
-                'graph_id': graph_id,
-                'status': 'completed',
-                'last_update': datetime.now().isoformat(),
-                'result': result
-            }
-            
-            logger.info(f"Graph {graph_id} execution completed for thread {thread_id}")
-            return {
-                "graph_id": graph_id,
-                "thread_id": thread_id,
-                "status": "completed",
-                "result": result,
-                "timestamp": datetime.now().isoformat()
-            }
+        # Check if the graph was interrupted by examining the final state snapshot
+        if snapshot is not None:
+            logger.debug(f"Final state snapshot: next={snapshot.next}, tasks={len(snapshot.tasks) if snapshot.tasks else 0}")
             
-        except Exception as exec_error:
-            # Check if this is an interrupt (expected for HITL graphs)
-            if "interrupt" in str(exec_error).lower():
-                logger.info(f"Graph {graph_id} interrupted for HITL - thread {thread_id}")
+            # If there are pending tasks or next nodes, it might be interrupted
+            if snapshot.next or (snapshot.tasks and len(snapshot.tasks) > 0):
+                logger.info(f"Graph {graph_id} appears to be interrupted - has pending tasks or next nodes")
                 
                 # Store interrupt information
-                server_state['active_threads'][thread_id] = {
+                await _save_thread(thread_id, {
                     'graph_id': graph_id,
                     'status': 'interrupted',
-                    'last_update': datetime.now().isoformat()
-                }
+                    'last_update': datetime.now().isoformat(),
+                    'snapshot': {
+                        'next': snapshot.next,
+                        'tasks': len(snapshot.tasks) if snapshot.tasks else 0
+                    }
+                })
                 
                 return {
                     "graph_id": graph_id,
                     "thread_id": thread_id,
                     "status": "interrupted",
                     "message": "Graph paused for human input",
+                    "next_nodes": snapshot.next,
+                    "pending_tasks": len(snapshot.tasks) if snapshot.tasks else 0,
                     "timestamp": datetime.now().isoformat()
                 }
-            else:
-                raise exec_error
-                
-    except Exception as e:
-        logger.error(f"Error executing graph {graph_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/graphs/{graph_id}/resume")
-async def resume_graph(graph_id: str, request: ResumeGraphRequest):
-    """Resume an interrupted graph execution"""
-    try:
-        logger.info(f"Resuming graph: {graph_id}, thread: {request.thread_id}")
-        
-        # Check if graph exists
-        if graph_id not in server_state['graphs']:
-            raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
-        
-        # Check if thread exists and is interrupted
-        if request.thread_id not in server_state['active_threads']:
-            raise HTTPException(status_code=404, detail=f"Thread {request.thread_id} not found")
-        
-        thread_info = server_state['active_threads'][request.thread_id]
-        if thread_info['status'] != 'interrupted':
-            raise HTTPException(status_code=400, detail=f"Thread {request.thread_id} is not interrupted")
-        
-        graph_info = server_state['graphs'][graph_id]
-        graph = graph_info['graph']
         
-        config = {"configurable": {"thread_id": request.thread_id}}
-        
-        # Resume with provided value
-        resume_command = Command(resume=request.resume_value)
-        result = graph.invoke(resume_command, config)
-        
-        # Update thread status
-        server_state['active_threads'][request.thread_id] = {
+        # If we get here without interruption, execution completed
+        await _save_thread(thread_id, {
             'graph_id': graph_id,
             'status': 'completed',
             'last_update': datetime.now().isoformat(),
             'result': result
-        }
+        })
         
-        logger.info(f"Graph {graph_id} resumed and completed for thread {request.thread_id}")
+        logger.info(f"Graph {graph_id} execution completed for thread {thread_id}")
         return {
             "graph_id": graph_id,
-            "thread_id": request.thread_id,
+            "thread_id": thread_id,
             "status": "completed",
             "result": result,
             "timestamp": datetime.now().isoformat()
         }
-        
-    except Exception as e:
-        logger.error(f"Error resuming graph {graph_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/graphs")
-async def list_graphs():
-    """List all available graphs"""
-    graphs_info = {}
-    for graph_id, info in server_state['graphs'].items():
-        graphs_info[graph_id] = {
-            'type': info['type'],
-            'created_at': info['created_at'],
-            'config': info['config']
-        }
     
-    return {
-        "graphs": graphs_info,
-        "total": len(graphs_info),
-        "timestamp": datetime.now().isoformat()
-    }
+    except RunCancelled:
+        return await run_in_threadpool(_record_stopped_run, graph_id, handle)
+    except Exception as exec_error:
+        # Check if this is an interrupt (expected for HITL graphs)
+        if "interrupt" in str(exec_error).lower():
+            logger.info(f"Graph {graph_id} interrupted for HITL - thread {thread_id}")
+            
+            # Store interrupt information
+            await _save_thread(thread_id, {
+                'graph_id': graph_id,
+                'status': 'interrupted',
+                'last_update': datetime.now().isoformat()
+            })
+            
+            return {
+                "graph_id": graph_id,
+                "thread_id": thread_id,
+                "status": "interrupted",
+                "message": "Graph paused for human input",
+                "timestamp": datetime.now().isoformat()
+            }
+        else:
+            await run_in_threadpool(_record_failed_run, graph_id, thread_id, exec_error)
+            raise exec_error
+    finally:
+        get_run_tracker().finish(handle)
 
-@app.get("/graphs/{graph_id}")
-async def get_graph(graph_id: str):
-    """Get information about a specific graph"""
-    try:
+async def _idempotent(idempotency_key: Optional[str],
+                      scope: str,
+                      request: BaseModel,
+                      run: Callable[[], Any],
+                      response: Response) -> Dict[str, Any]:
+    """
+    Run a request handler once per Idempotency-Key
+    
+    Without a key the handler simply runs. With one, a duplicate of an in-flight
+    request waits for the original's response, and a later duplicate gets the
+    stored response with an Idempotent-Replayed header.
+    """
+    if not idempotency_key:
+        return await run()
+    
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key exceeds {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    
+    async def run_encoded():
+        # Store exactly what the client receives so replays are byte-for-byte the same
+        return jsonable_encoder(await run())
+    
+    fingerprint = request_fingerprint(scope, jsonable_encoder(request))
+    try:
+        result, replayed = await get_idempotency_cache().run(idempotency_key, fingerprint, run_encoded)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if replayed:
+        logger.info(f"Replayed response for idempotency key {idempotency_key} ({scope})")
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+@app.post("/graphs/{graph_id}/execute")
+async def execute_graph(graph_id: str,
+                        request: ExecuteGraphRequest,
+                        response: Response,
+                        idempotency_key: Optional[str] = Header(default=None)):
+    """Execute a graph with given initial state; an Idempotency-Key header makes retries safe"""
+    try:
+        async def run():
+            logger.info(f"Executing graph: {graph_id}")
+            
+            # Check if graph exists
+            if graph_id not in get_graph_registry():
+                raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
+            
+            graph_info = get_graph_registry()[graph_id]
+            graph = graph_info['graph']
+            
+            # Generate thread ID if not provided
+            thread_id = request.thread_id or str(uuid.uuid4())
+            config = {"configurable": {"thread_id": thread_id}}
+            
+            # Prepare initial state
+            initial_state = _build_initial_state(request.initial_state)
+            timeout_seconds = _run_budget(graph_info['type'], request.timeout_seconds)
+            
+            workflow_id = request.workflow_id or graph_info.get('workflow_id')
+            if workflow_id:
+                get_workflow_index().link(workflow_id, graph_id, thread_id)
+            
+            logger.info(f"Starting graph execution for thread {thread_id}")
+            
+            return await _run_graph_thread(graph_id, graph, thread_id, initial_state, config, timeout_seconds)
+        
+        return await _idempotent(idempotency_key, f"POST /graphs/{graph_id}/execute", request, run, response)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing graph {graph_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/graphs/{graph_id}/execute-batch")
+async def execute_graph_batch(graph_id: str, request: ExecuteBatchRequest):
+    """Execute many threads of one graph with bounded concurrency"""
+    logger.info(f"Executing batch of {len(request.threads)} threads on graph: {graph_id}")
+    
+    if graph_id not in get_graph_registry():
+        raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
+    
+    if len(request.threads) > BATCH_MAX_THREADS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_THREADS} threads")
+    
+    thread_ids = [item.thread_id or str(uuid.uuid4()) for item in request.threads]
+    if len(set(thread_ids)) != len(thread_ids):
+        raise HTTPException(status_code=400, detail="Batch contains duplicate thread IDs")
+    
+    graph_info = get_graph_registry()[graph_id]
+    graph = graph_info['graph']
+    timeout_seconds = _run_budget(graph_info['type'], request.timeout_seconds)
+    concurrency = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run_item(index: int, thread_id: str, item: BatchThreadRequest) -> Dict[str, Any]:
+        async with semaphore:
+            config = {"configurable": {"thread_id": thread_id}}
+            try:
+                outcome = await _run_graph_thread(
+                    graph_id, graph, thread_id, _build_initial_state(item.initial_state), config, timeout_seconds
+                )
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                logger.error(f"Batch thread {thread_id} on graph {graph_id} failed: {detail}")
+                outcome = {
+                    "graph_id": graph_id,
+                    "thread_id": thread_id,
+                    "status": "failed",
+                    "error": detail,
+                    "timestamp": datetime.now().isoformat()
+                }
+            outcome["index"] = index
+            return outcome
+    
+    tasks = [
+        asyncio.ensure_future(run_item(index, thread_id, item))
+        for index, (thread_id, item) in enumerate(zip(thread_ids, request.threads))
+    ]
+    
+    if request.stream:
+        async def ndjson_results():
+            for finished in asyncio.as_completed(tasks):
+                outcome = await finished
+                yield json.dumps(jsonable_encoder(outcome), default=str) + "\n"
+        
+        return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+    
+    results = await asyncio.gather(*tasks)
+    summary = {"completed": 0, "interrupted": 0, "failed": 0, "timed_out": 0, "cancelled": 0}
+    for outcome in results:
+        summary[outcome["status"]] = summary.get(outcome["status"], 0) + 1
+    
+    logger.info(f"Batch on graph {graph_id} finished: {summary}")
+    return {
+        "graph_id": graph_id,
+        "results": results,
+        "summary": summary,
+        "total": len(results),
+        "max_concurrency": concurrency,
+        "timeout_seconds": timeout_seconds,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), default=str)}\n\n"
+
+@app.post("/graphs/{graph_id}/stream")
+async def stream_graph(graph_id: str, request: StreamGraphRequest):
+    """Execute a graph and push each chunk to the client as Server-Sent Events"""
+    logger.info(f"Streaming graph: {graph_id} (mode: {request.stream_mode})")
+    
+    if graph_id not in get_graph_registry():
+        raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
+    
+    if request.stream_mode not in STREAM_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream mode: {request.stream_mode}")
+    
+    graph_info = get_graph_registry()[graph_id]
+    graph = graph_info['graph']
+    thread_id = request.thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    initial_state = _build_initial_state(request.initial_state)
+    timeout_seconds = _run_budget(graph_info['type'], request.timeout_seconds)
+    
+    # Claim the thread before responding so a concurrent run is a 409, not an error event
+    handle = await run_in_threadpool(_start_run, graph_id, thread_id, timeout_seconds)
+    
+    workflow_id = request.workflow_id or graph_info.get('workflow_id')
+    if workflow_id:
+        get_workflow_index().link(workflow_id, graph_id, thread_id)
+    
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER_CHUNKS)
+    
+    def publish(chunk):
+        # Wait for room in the buffer, but never for a consumer that has stopped
+        pending = asyncio.run_coroutine_threadsafe(queue.put(chunk), loop)
+        while not handle.cancelled:
+            try:
+                return pending.result(timeout=0.1)
+            except FutureTimeoutError:
+                continue
+        pending.cancel()
+    
+    def produce():
+        # Runs on the execution pool; blocks when the client falls behind
+        handle.check()
+        for chunk in graph.stream(initial_state, config, stream_mode=request.stream_mode):
+            publish(chunk)
+            handle.check()
+        return graph.get_state(config)
+    
+    async def event_source():
+        producer = asyncio.ensure_future(get_execution_pool().run(produce))
+        # The producer may outlive the response when the budget runs out mid-node
+        producer.add_done_callback(lambda future: future.cancelled() or future.exception())
+        stopped = handle.watch(loop)
+        chunks_sent = 0
+        finished = False
+        try:
+            yield _format_sse("start", {
+                "graph_id": graph_id,
+                "thread_id": thread_id,
+                "stream_mode": request.stream_mode,
+                "timeout_seconds": timeout_seconds
+            })
+            
+            while not (producer.done() and queue.empty()):
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, producer, stopped},
+                    timeout=handle.remaining(),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not getter.done():
+                    getter.cancel()
+                    if not done:
+                        handle.cancel("timed_out")
+                    if handle.cancelled:
+                        raise RunCancelled(thread_id, handle.reason)
+                    continue
+                
+                chunk = getter.result()
+                chunks_sent += 1
+                if isinstance(chunk, dict) and "__interrupt__" in chunk:
+                    yield _format_sse("interrupt", {"thread_id": thread_id, "interrupts": chunk["__interrupt__"]})
+                else:
+                    yield _format_sse("chunk", {"thread_id": thread_id, "chunk": chunk})
+            
+            snapshot = producer.result()
+            interrupted = bool(snapshot and (snapshot.next or snapshot.tasks))
+            status = 'interrupted' if interrupted else 'completed'
+            
+            thread_info = {
+                'graph_id': graph_id,
+                'status': status,
+                'last_update': datetime.now().isoformat()
+            }
+            if interrupted:
+                thread_info['snapshot'] = {
+                    'next': snapshot.next,
+                    'tasks': len(snapshot.tasks) if snapshot.tasks else 0
+                }
+            await _save_thread(thread_id, thread_info)
+            
+            logger.info(f"Graph {graph_id} stream {status} for thread {thread_id} after {chunks_sent} chunks")
+            finished = True
+            yield _format_sse("end", {
+                "graph_id": graph_id,
+                "thread_id": thread_id,
+                "status": status,
+                "next_nodes": snapshot.next if interrupted else [],
+                "chunks": chunks_sent,
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        except RunCancelled:
+            stopped_run = await run_in_threadpool(_record_stopped_run, graph_id, handle)
+            finished = True
+            yield _format_sse("end", {**stopped_run, "next_nodes": [], "chunks": chunks_sent})
+        except Exception as e:
+            logger.error(f"Error streaming graph {graph_id}: {e}")
+            await run_in_threadpool(_record_failed_run, graph_id, thread_id, e)
+            finished = True
+            yield _format_sse("error", {"graph_id": graph_id, "thread_id": thread_id, "detail": str(e)})
+        finally:
+            # Stop the producer if the client disconnected mid-stream, and unblock it
+            if not finished and handle.cancel("client_disconnected"):
+                await run_in_threadpool(_record_stopped_run, graph_id, handle)
+            stopped.cancel()
+            get_run_tracker().finish(handle)
+            while not queue.empty():
+                queue.get_nowait()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _stream_resume(graph, resume_value: Any, config: Dict[str, Any], handle: Optional[RunHandle] = None):
+    """
+    Resume an interrupted thread on a worker thread and return (result, snapshot)
+    
+    Streams instead of invoking so the run can be stopped between chunks; the
+    result is the final state, as graph.invoke would return it.
+    """
+    result = None
+    for mode, payload in graph.stream(Command(resume=resume_value), config, stream_mode=["updates", "values"]):
+        if mode == "values":
+            result = payload
+        if handle is not None:
+            handle.check()
+    return result, graph.get_state(config)
+
+async def _resume_graph_thread(graph_id: str,
+                               graph,
+                               thread_id: str,
+                               resume_value: Any,
+                               timeout_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Resume an interrupted thread on the execution pool and record its status
+    
+    Returns:
+        Resume response with status completed, interrupted if the graph paused
+        again, or timed_out / cancelled
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    handle = await run_in_threadpool(_start_run, graph_id, thread_id, timeout_seconds)
+    try:
+        result, snapshot = await _run_with_budget(handle, _stream_resume, graph, resume_value, config, handle)
+    except RunCancelled:
+        return await run_in_threadpool(_record_stopped_run, graph_id, handle)
+    except Exception as e:
+        await run_in_threadpool(_record_failed_run, graph_id, thread_id, e)
+        raise
+    finally:
+        get_run_tracker().finish(handle)
+    
+    if snapshot is not None and (snapshot.next or snapshot.tasks):
+        await _save_thread(thread_id, {
+            'graph_id': graph_id,
+            'status': 'interrupted',
+            'last_update': datetime.now().isoformat(),
+            'snapshot': {
+                'next': snapshot.next,
+                'tasks': len(snapshot.tasks) if snapshot.tasks else 0
+            }
+        })
+        logger.info(f"Graph {graph_id} resumed and paused again for thread {thread_id}")
+        return {
+            "graph_id": graph_id,
+            "thread_id": thread_id,
+            "status": "interrupted",
+            "message": "Graph paused for human input",
+            "next_nodes": snapshot.next,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    # Update thread status
+    await _save_thread(thread_id, {
+        'graph_id': graph_id,
+        'status': 'completed',
+        'last_update': datetime.now().isoformat(),
+        'result': result
+    })
+    
+    logger.info(f"Graph {graph_id} resumed and completed for thread {thread_id}")
+    return {
+        "graph_id": graph_id,
+        "thread_id": thread_id,
+        "status": "completed",
+        "result": result,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/graphs/{graph_id}/resume")
+async def resume_graph(graph_id: str,
+                       request: ResumeGraphRequest,
+                       response: Response,
+                       idempotency_key: Optional[str] = Header(default=None)):
+    """Resume an interrupted graph execution; an Idempotency-Key header makes retries safe"""
+    try:
+        async def run():
+            logger.info(f"Resuming graph: {graph_id}, thread: {request.thread_id}")
+            
+            # Check if graph exists
+            if graph_id not in get_graph_registry():
+                raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
+            
+            # Check if thread exists and is interrupted
+            thread_info = await run_in_threadpool(get_thread_registry().get, request.thread_id)
+            if thread_info is None:
+                raise HTTPException(status_code=404, detail=f"Thread {request.thread_id} not found")
+            
+            if thread_info['status'] != 'interrupted':
+                raise HTTPException(status_code=400, detail=f"Thread {request.thread_id} is not interrupted")
+            
+            graph_info = get_graph_registry()[graph_id]
+            graph = graph_info['graph']
+            timeout_seconds = _run_budget(graph_info['type'], request.timeout_seconds)
+            
+            # Resume with provided value
+            return await _resume_graph_thread(graph_id, graph, request.thread_id, request.resume_value, timeout_seconds)
+        
+        return await _idempotent(idempotency_key, f"POST /graphs/{graph_id}/resume", request, run, response)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resuming graph {graph_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/graphs")
+async def list_graphs(limit: int = 100, cursor: Optional[str] = None):
+    """List available graphs, one page at a time"""
+    limit = max(1, min(limit, LIST_PAGE_MAX))
+    graph_registry = get_graph_registry()
+    page, next_cursor = graph_registry.list_page(limit=limit, cursor=cursor)
+    
+    graphs_info = {}
+    for graph_id, info in page:
+        graphs_info[graph_id] = {
+            'type': info['type'],
+            'created_at': info['created_at'],
+            'config': info['config']
+        }
+    
+    return {
+        "graphs": graphs_info,
+        "count": len(graphs_info),
+        "total": len(graph_registry),
+        "next_cursor": next_cursor,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/graphs/{graph_id}")
+async def get_graph(graph_id: str):
+    """Get information about a specific graph"""
+    try:
         logger.info(f"Getting information for graph: {graph_id}")
         
-        if graph_id not in server_state['graphs']:
+        if graph_id not in get_graph_registry():
             raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
         
-        info = server_state['graphs'][graph_id]
+        info = get_graph_registry()[graph_id]
         return {
             "graph_id": graph_id,
             "type": info['type'],
@@ -765,23 +1906,117 @@ async def get_graph(graph_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/threads")
-async def list_threads():
-    """List all active threads"""
+async def list_threads(limit: int = 100, cursor: Optional[str] = None, graph_id: Optional[str] = None):
+    """List threads, one page at a time; results are served by /threads/{thread_id}"""
+    limit = max(1, min(limit, LIST_PAGE_MAX))
+    thread_registry = get_thread_registry()
+    threads, next_cursor = await run_in_threadpool(
+        thread_registry.list_page, limit=limit, cursor=cursor, graph_id=graph_id
+    )
+    
     return {
-        "threads": server_state['active_threads'],
-        "total": len(server_state['active_threads']),
+        "threads": threads,
+        "count": len(threads),
+        "total": await run_in_threadpool(len, thread_registry),
+        "next_cursor": next_cursor,
         "timestamp": datetime.now().isoformat()
     }
 
 @app.get("/threads/{thread_id}")
 async def get_thread_status(thread_id: str):
     """Get status of a specific thread"""
-    if thread_id not in server_state['active_threads']:
+    thread_registry = get_thread_registry()
+    thread_info = await run_in_threadpool(thread_registry.get, thread_id)
+    if thread_info is None:
         raise HTTPException(status_code=404, detail=f"Thread {thread_id} not found")
     
+    info = dict(thread_info)
+    if info.pop('has_result', False):
+        info['result'] = await run_in_threadpool(thread_registry.get_result, thread_id)
+    
     return {
         "thread_id": thread_id,
-        "info": server_state['active_threads'][thread_id],
+        "info": info,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/metrics/executor")
+async def get_executor_metrics():
+    """Get graph execution pool utilisation and queue depth"""
+    return {
+        "executor": get_execution_pool().stats(),
+        "runs": get_run_tracker().stats(),
+        "idempotency": get_idempotency_cache().stats(),
+        "thread_registry": get_thread_registry().stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+class CompactRequest(BaseModel):
+    """Request model for checkpoint compaction"""
+    keep_last: Optional[int] = Field(default=None, ge=1, description="Checkpoints kept per thread")
+    max_age_seconds: Optional[float] = Field(default=None, ge=0, description="Delete finished threads idle this long; 0 keeps them")
+    vacuum: bool = Field(default=True, description="Release freed pages to the filesystem")
+    convert_auto_vacuum: bool = Field(
+        default=False,
+        description="Convert an older database to incremental vacuum with a full VACUUM, locking it meanwhile"
+    )
+
+def _compact_checkpoints(keep_last: Optional[int],
+                         max_age_seconds: float,
+                         vacuum: bool,
+                         convert_auto_vacuum: bool = False) -> Dict[str, Any]:
+    """Delete expired finished threads and old checkpoints, then vacuum; runs on a worker thread"""
+    thread_registry = get_thread_registry()
+    expired = []
+    if max_age_seconds > 0:
+        cutoff = (datetime.now() - timedelta(seconds=max_age_seconds)).isoformat()
+        expired = thread_registry.finished_before(cutoff, FINISHED_THREAD_STATUSES)
+    
+    report = get_checkpoint_compactor().compact(
+        keep_last=keep_last, purge_thread_ids=expired, vacuum=vacuum, convert_auto_vacuum=convert_auto_vacuum
+    )
+    report["thread_records_deleted"] = thread_registry.delete_many(expired)
+    for thread_id in expired:
+        get_workflow_index().unlink_thread(thread_id)
+    # Keys of crashed or other workers are only removed by a full sweep
+    report["idempotency_keys_purged"] = get_idempotency_cache().sweep_expired()
+    return report
+
+async def _compaction_loop(interval: float):
+    """Compact checkpoints on a fixed interval"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await get_execution_pool().run(_compact_checkpoints, None, THREAD_RETENTION_SECONDS, True)
+        except Exception as e:
+            logger.error(f"Scheduled checkpoint compaction failed: {e}")
+
+@app.post("/maintenance/compact")
+async def compact_checkpoints(request: Optional[CompactRequest] = None):
+    """Apply checkpoint retention and report the space reclaimed"""
+    request = request or CompactRequest()
+    max_age_seconds = THREAD_RETENTION_SECONDS if request.max_age_seconds is None else request.max_age_seconds
+    try:
+        report = await get_execution_pool().run(
+            _compact_checkpoints, request.keep_last, max_age_seconds, request.vacuum, request.convert_auto_vacuum
+        )
+    except Exception as e:
+        logger.error(f"Checkpoint compaction failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Compaction failed: {str(e)}")
+    
+    return {
+        **report,
+        "max_age_seconds": max_age_seconds,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/maintenance/compact")
+async def get_compaction_stats():
+    """Get compaction totals and the last report"""
+    return {
+        **get_checkpoint_compactor().stats(),
+        "interval_seconds": COMPACT_INTERVAL_SECONDS,
+        "thread_retention_seconds": THREAD_RETENTION_SECONDS,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -789,10 +2024,13 @@ async def get_thread_status(thread_id: str):
 @app.delete("/graphs/{graph_id}")
 async def delete_graph(graph_id: str):
     """Delete a graph"""
-    if graph_id not in server_state['graphs']:
+    if graph_id not in get_graph_registry():
         raise HTTPException(status_code=404, detail=f"Graph {graph_id} not found")
     
-    del server_state['graphs'][graph_id]
+    workflow_id = get_graph_registry()[graph_id].get('workflow_id')
+    del get_graph_registry()[graph_id]
+    if workflow_id:
+        get_workflow_index().unlink_graph(workflow_id, graph_id)
     logger.info(f"Deleted graph: {graph_id}")
     
     return {
@@ -809,6 +2047,7 @@ class StateProcessRequest(BaseModel):
     state_type: str = Field(..., description="Type of state (basic, hitl, multi_agent, complex)")
     graph_id: str = Field(..., description="Graph ID for context")
     thread_id: Optional[str] = Field(default=None, description="Thread ID for context")
+    durable: bool = Field(default=False, description="Commit the state before responding even in write-behind mode")
 
 class StateSyncRequest(BaseModel):
     """Request model for state synchronization"""
@@ -816,6 +2055,15 @@ class StateSyncRequest(BaseModel):
     thread_id: str = Field(..., description="Thread identifier")
     current_state: Dict[str, Any] = Field(..., description="Current state to synchronize")
 
+class StateValidateItem(BaseModel):
+    """One state in a batch validation request"""
+    state_data: Any = Field(..., description="State data from PowerShell")
+    state_type: str = Field(..., description="Type of state (basic, hitl, multi_agent, complex)")
+
+class StateValidateBatchRequest(BaseModel):
+    """Request model for validating many states at once"""
+    states: List[StateValidateItem] = Field(..., description="States to validate")
+
 @app.post("/state/validate")
 async def validate_state(request: StateProcessRequest):
     """Validate PowerShell state data"""
@@ -835,6 +2083,24 @@ async def validate_state(request: StateProcessRequest):
         logger.error(f"State validation error: {e}")
         raise HTTPException(status_code=400, detail=f"Validation failed: {str(e)}")
 
+@app.post("/state/validate-batch")
+async def validate_state_batch_endpoint(request: StateValidateBatchRequest):
+    """Validate many PowerShell states, reporting every error of each"""
+    if len(request.states) > STATE_VALIDATE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {STATE_VALIDATE_BATCH_MAX} states")
+    
+    results = validate_state_batch((item.state_data, item.state_type) for item in request.states)
+    valid = sum(1 for result in results if result["valid"])
+    logger.info(f"Validated state batch: {valid}/{len(results)} valid")
+    
+    return {
+        "results": results,
+        "total": len(results),
+        "valid": valid,
+        "invalid": len(results) - valid,
+        "validation_timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/state/process")
 async def process_powershell_state(request: StateProcessRequest):
     """Process state data from PowerShell"""
@@ -850,12 +2116,15 @@ async def process_powershell_state(request: StateProcessRequest):
         except ValueError:
             raise HTTPException(status_code=400, detail=f"Invalid state type: {request.state_type}")
         
-        # Process the PowerShell state
-        processed_state = server_state['state_manager'].process_powershell_state(
+        # Process the PowerShell state; off the event loop, as a durable write
+        # may wait for the write-behind queue
+        processed_state, metadata = await run_in_threadpool(
+            server_state['state_manager'].record_powershell_state,
             request.state_data, 
             state_type_enum, 
             request.graph_id,
-            request.thread_id
+            request.thread_id,
+            request.durable
         )
         
         return {
@@ -863,6 +2132,9 @@ async def process_powershell_state(request: StateProcessRequest):
             "graph_id": request.graph_id,
             "thread_id": request.thread_id,
             "state_type": request.state_type,
+            "durable": metadata is not None,
+            "state_id": metadata.state_id if metadata else None,
+            "version": metadata.version if metadata else None,
             "processing_timestamp": datetime.now().isoformat()
         }
         
@@ -880,7 +2152,8 @@ async def synchronize_state(request: StateSyncRequest):
             raise HTTPException(status_code=503, detail="State manager not initialized")
         
         # Synchronize with checkpoint
-        synchronized_state = server_state['state_manager'].synchronize_checkpoint(
+        synchronized_state = await run_in_threadpool(
+            server_state['state_manager'].synchronize_checkpoint,
             request.graph_id,
             request.thread_id, 
             request.current_state
@@ -906,7 +2179,9 @@ async def list_state_snapshots(graph_id: Optional[str] = None, thread_id: Option
         if not server_state['state_manager']:
             raise HTTPException(status_code=503, detail="State manager not initialized")
         
-        snapshots = server_state['state_manager'].checkpoint_manager.list_snapshots(graph_id, thread_id)
+        snapshots = await run_in_threadpool(
+            server_state['state_manager'].checkpoint_manager.list_snapshots, graph_id, thread_id
+        )
         
         return {
             "snapshots": snapshots,
@@ -931,7 +2206,9 @@ async def get_state_snapshot(snapshot_id: str):
         if not server_state['state_manager']:
             raise HTTPException(status_code=503, detail="State manager not initialized")
         
-        snapshot_data = server_state['state_manager'].checkpoint_manager.load_state_snapshot(snapshot_id)
+        snapshot_data = await run_in_threadpool(
+            server_state['state_manager'].checkpoint_manager.load_state_snapshot, snapshot_id
+        )
         
         if not snapshot_data:
             raise HTTPException(status_code=404, detail=f"Snapshot {snapshot_id} not found")
@@ -949,6 +2226,97 @@ async def get_state_snapshot(snapshot_id: str):
         logger.error(f"Failed to get snapshot: {e}")
         raise HTTPException(status_code=500, detail=f"Snapshot retrieval failed: {str(e)}")
 
+@app.get("/state/versions/{graph_id}/{thread_id}")
+async def get_state_version(graph_id: str, thread_id: str, version: Optional[int] = None):
+    """Get one version of a thread's state, rebuilt from its keyframe and deltas (latest by default)"""
+    try:
+        logger.info(f"Getting state version {version or 'latest'} of {graph_id}/{thread_id}")
+        
+        if not server_state['state_manager']:
+            raise HTTPException(status_code=503, detail="State manager not initialized")
+        
+        snapshot_data = await run_in_threadpool(
+            server_state['state_manager'].checkpoint_manager.load_state_version, graph_id, thread_id, version
+        )
+        
+        if not snapshot_data:
+            raise HTTPException(status_code=404, detail=f"No state version {version or 'latest'} for {graph_id}/{thread_id}")
+        
+        return {
+            "graph_id": graph_id,
+            "thread_id": thread_id,
+            "version": snapshot_data['metadata']['version'],
+            "state_data": snapshot_data['state'],
+            "metadata": snapshot_data['metadata'],
+            "retrieval_timestamp": datetime.now().isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get state version: {e}")
+        raise HTTPException(status_code=500, detail=f"State version retrieval failed: {str(e)}")
+
+@app.get("/state/at")
+async def get_state_at(graph_id: str, thread_id: str, ts: str):
+    """Get a thread's state as of a timestamp (ISO 8601, Unix seconds or /Date(ms)/)"""
+    try:
+        logger.info(f"Getting state of {graph_id}/{thread_id} as of {ts}")
+        
+        if not server_state['state_manager']:
+            raise HTTPException(status_code=503, detail="State manager not initialized")
+        
+        try:
+            snapshot_data = await run_in_threadpool(
+                server_state['state_manager'].checkpoint_manager.state_at, graph_id, thread_id, ts
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid timestamp: {ts}")
+        
+        if not snapshot_data:
+            raise HTTPException(status_code=404, detail=f"No state for {graph_id}/{thread_id} as of {ts}")
+        
+        return {
+            "graph_id": graph_id,
+            "thread_id": thread_id,
+            "as_of": ts,
+            "state_id": snapshot_data['state_id'],
+            "version": snapshot_data['version'],
+            "last_modified": snapshot_data['last_modified'],
+            "state_data": snapshot_data['state'],
+            "retrieval_timestamp": datetime.now().isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get state as of {ts}: {e}")
+        raise HTTPException(status_code=500, detail=f"Point-in-time retrieval failed: {str(e)}")
+
+@app.get("/state/history")
+async def get_state_history(graph_id: str, thread_id: str, since: Optional[str] = None, until: Optional[str] = None):
+    """Stream each version of a thread's state within a time range as NDJSON, oldest first"""
+    logger.info(f"Streaming state history of {graph_id}/{thread_id} from {since or 'start'} to {until or 'latest'}")
+    
+    if not server_state['state_manager']:
+        raise HTTPException(status_code=503, detail="State manager not initialized")
+    
+    for bound in (since, until):
+        if bound is not None:
+            try:
+                to_snapshot_time(bound)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid timestamp: {bound}")
+    
+    history = server_state['state_manager'].checkpoint_manager.iter_state_history(graph_id, thread_id, since, until)
+    
+    def ndjson_history():
+        # Runs in the threadpool, so rebuilding states does not block the event loop
+        for entry in history:
+            yield json.dumps({"graph_id": graph_id, "thread_id": thread_id, **entry}, default=str) + "\n"
+    
+    return StreamingResponse(ndjson_history(), media_type="application/x-ndjson")
+
 @app.get("/state/statistics")
 async def get_state_statistics():
     """Get state management statistics"""
@@ -958,7 +2326,7 @@ async def get_state_statistics():
         if not server_state['state_manager']:
             raise HTTPException(status_code=503, detail="State manager not initialized")
         
-        stats = server_state['state_manager'].get_state_statistics()
+        stats = await run_in_threadpool(server_state['state_manager'].get_state_statistics)
         
         return {
             "statistics": stats,
@@ -990,13 +2358,41 @@ async def prepare_state_for_powershell(state_data: Dict[str, Any], include_metad
         logger.error(f"Failed to prepare state for PowerShell: {e}")
         raise HTTPException(status_code=500, detail=f"PowerShell preparation failed: {str(e)}")
 
+@app.delete("/threads/{thread_id}/run")
+async def cancel_thread_run(thread_id: str):
+    """Cancel the in-flight run of a thread; it stops at its next chunk boundary"""
+    if get_run_tracker().cancel(thread_id):
+        logger.info(f"Cancelled run for thread {thread_id}")
+        return {
+            "thread_id": thread_id,
+            "status": "cancelling",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    thread_info = await run_in_threadpool(get_thread_registry().get, thread_id)
+    if thread_info is None:
+        raise HTTPException(status_code=404, detail=f"Thread {thread_id} not found")
+    
+    if thread_info.get('status') == 'running' and get_state_backend().shared:
+        # The run belongs to another worker, which polls its thread record
+        await _save_thread(thread_id, {**thread_info, 'cancel_requested': 'cancelled'})
+        logger.info(f"Requested cancellation of thread {thread_id} running on another worker")
+        return {
+            "thread_id": thread_id,
+            "status": "cancelling",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    raise HTTPException(status_code=409, detail=f"Thread {thread_id} has no active run")
+
 @app.delete("/threads/{thread_id}")
 async def delete_thread(thread_id: str):
-    """Delete a thread"""
-    if thread_id not in server_state['active_threads']:
+    """Delete a thread, cancelling its run if one is in flight"""
+    if not await run_in_threadpool(get_thread_registry().delete_many, [thread_id]):
         raise HTTPException(status_code=404, detail=f"Thread {thread_id} not found")
     
-    del server_state['active_threads'][thread_id]
+    get_run_tracker().cancel(thread_id)
+    get_workflow_index().unlink_thread(thread_id)
     logger.info(f"Deleted thread: {thread_id}")
     
     return {
@@ -1013,12 +2409,13 @@ async def create_approval_request(request: ApprovalRequest):
     try:
         # Generate unique approval ID
         approval_id = str(uuid.uuid4())
-        thread_id = str(uuid.uuid4())
+        thread_id = request.thread_id or str(uuid.uuid4())
         
         # Create approval request data
         approval_data = {
             "approval_id": approval_id,
             "thread_id": thread_id,
+            "graph_id": request.graph_id,
             "workflow_id": request.workflow_id,
             "title": request.title,
             "description": request.description,
@@ -1029,12 +2426,20 @@ async def create_approval_request(request: ApprovalRequest):
             "metadata": request.metadata,
             "status": "pending",
             "created_at": datetime.now().isoformat(),
-            "expires_at": None,  # Would be calculated based on urgency
+            "expires_at": None,
             "escalation_level": 0
         }
         
-        # Store in interrupt queue for processing
-        server_state['interrupt_queue'][approval_id] = approval_data
+        # Deadline for the first escalation level, from the urgency policy
+        approval_scheduler = get_approval_scheduler()
+        try:
+            approval_data["expires_at"] = approval_scheduler.compute_expiry(approval_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Persist for processing
+        await run_in_threadpool(get_approval_store().create, approval_data)
+        approval_scheduler.schedule(approval_id, approval_data["expires_at"])
         
         logger.info(f"Created approval request: {approval_id} for workflow: {request.workflow_id}")
         
@@ -1046,42 +2451,77 @@ async def create_approval_request(request: ApprovalRequest):
             "approval_data": approval_data
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to create approval request: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create approval request: {str(e)}")
 
+@app.get("/approval/pending")
+async def get_pending_approvals(limit: int = 100,
+                                cursor: Optional[str] = None,
+                                urgency_level: Optional[str] = None,
+                                workflow_id: Optional[str] = None):
+    """Get pending approval requests, one page at a time"""
+    try:
+        limit = max(1, min(limit, APPROVAL_PAGE_MAX))
+        pending, next_cursor = await run_in_threadpool(
+            get_approval_store().list_pending,
+            limit=limit,
+            cursor=cursor,
+            urgency_level=urgency_level,
+            workflow_id=workflow_id
+        )
+        
+        return {
+            "pending_approvals": pending,
+            "count": len(pending),
+            "next_cursor": next_cursor,
+            "filters": {
+                "urgency_level": urgency_level,
+                "workflow_id": workflow_id
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get pending approvals: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get pending approvals: {str(e)}")
+
 @app.post("/approval/{approval_id}/respond")
 async def respond_to_approval(approval_id: str, response: ApprovalResponse):
     """Process approval response and resume workflow"""
     try:
-        if approval_id not in server_state['interrupt_queue']:
+        approval_store = get_approval_store()
+        approval_data = await run_in_threadpool(approval_store.get, approval_id)
+        if approval_data is None:
             raise HTTPException(status_code=404, detail=f"Approval request {approval_id} not found")
         
-        approval_data = server_state['interrupt_queue'][approval_id]
         thread_id = approval_data.get('thread_id')
         
-        # Update approval status
-        approval_data.update({
+        # Update approval status, only while it is still pending: the deadline
+        # scheduler or a concurrent response may already have decided it
+        updated = await run_in_threadpool(approval_store.update, approval_id, {
             "status": "approved" if response.approved else "rejected",
             "approved_by": response.approved_by,
             "approved_at": response.timestamp,
             "comments": response.comments,
             "decision": response.approved
-        })
-        
-        # Resume workflow with approval decision
-        resume_data = {
-            "approved": response.approved,
-            "approved_by": response.approved_by,
-            "approval_timestamp": response.timestamp,
-            "comments": response.comments,
-            "approval_id": approval_id
-        }
-        
-        # If there's an active thread, resume it
-        if thread_id in server_state['active_threads']:
-            # This would integrate with actual LangGraph resumption
-            logger.info(f"Resuming workflow thread {thread_id} with approval decision: {response.approved}")
+        }, expected_status="pending")
+        if updated is None:
+            current = await run_in_threadpool(approval_store.get, approval_id) or approval_data
+            raise HTTPException(
+                status_code=409,
+                detail=f"Approval request {approval_id} is already {current.get('status')}"
+            )
+        approval_data = updated
+        
+        # Hand the decision to the resume worker if a thread is waiting on it
+        resume_queued = await run_in_threadpool(get_resume_worker().submit, approval_data)
+        if resume_queued:
+            logger.info(f"Queued resume of workflow thread {thread_id} with approval decision: {response.approved}")
         
         logger.info(f"Processed approval response for {approval_id}: {response.approved}")
         
@@ -1090,9 +2530,12 @@ async def respond_to_approval(approval_id: str, response: ApprovalResponse):
             "thread_id": thread_id,
             "status": "processed",
             "decision": response.approved,
+            "resume": "queued" if resume_queued else "not_applicable",
             "timestamp": datetime.now().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to process approval response: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process approval response: {str(e)}")
@@ -1101,66 +2544,61 @@ async def respond_to_approval(approval_id: str, response: ApprovalResponse):
 async def get_approval_status(approval_id: str):
     """Get the current status of an approval request"""
     try:
-        if approval_id not in server_state['interrupt_queue']:
+        approval_data = await run_in_threadpool(get_approval_store().get, approval_id)
+        if approval_data is None:
             raise HTTPException(status_code=404, detail=f"Approval request {approval_id} not found")
         
-        approval_data = server_state['interrupt_queue'][approval_id]
-        
         return {
             "approval_id": approval_id,
             "status": approval_data.get("status", "pending"),
             "workflow_id": approval_data.get("workflow_id"),
             "title": approval_data.get("title"),
             "created_at": approval_data.get("created_at"),
+            "expires_at": approval_data.get("expires_at"),
             "approved_by": approval_data.get("approved_by"),
             "approved_at": approval_data.get("approved_at"),
             "comments": approval_data.get("comments"),
-            "escalation_level": approval_data.get("escalation_level", 0)
+            "escalation_level": approval_data.get("escalation_level", 0),
+            "resume_status": approval_data.get("resume_status"),
+            "resume_result": approval_data.get("resume_result")
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to get approval status: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get approval status: {str(e)}")
 
-@app.get("/approval/pending")
-async def get_pending_approvals():
-    """Get all pending approval requests"""
-    try:
-        pending = []
-        for approval_id, data in server_state['interrupt_queue'].items():
-            if data.get("status") == "pending":
-                pending.append({
-                    "approval_id": approval_id,
-                    "workflow_id": data.get("workflow_id"),
-                    "title": data.get("title"),
-                    "urgency_level": data.get("urgency_level"),
-                    "created_at": data.get("created_at"),
-                    "request_type": data.get("request_type")
-                })
-        
-        return {
-            "pending_approvals": pending,
-            "count": len(pending),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-    except Exception as e:
-        logger.error(f"Failed to get pending approvals: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get pending approvals: {str(e)}")
-
 @app.post("/approval/{approval_id}/escalate")
 async def escalate_approval(approval_id: str):
     """Escalate an approval request to the next level"""
     try:
-        if approval_id not in server_state['interrupt_queue']:
+        approval_store = get_approval_store()
+        approval_data = await run_in_threadpool(approval_store.get, approval_id)
+        if approval_data is None:
             raise HTTPException(status_code=404, detail=f"Approval request {approval_id} not found")
         
-        approval_data = server_state['interrupt_queue'][approval_id]
         current_level = approval_data.get('escalation_level', 0)
-        
-        # Increment escalation level
-        approval_data['escalation_level'] = current_level + 1
-        approval_data['escalated_at'] = datetime.now().isoformat()
+        if approval_data.get('status') != 'pending':
+            raise HTTPException(
+                status_code=409,
+                detail=f"Approval request {approval_id} is already {approval_data.get('status')}"
+            )
+        
+        # Increment escalation level and restart the deadline for the new level,
+        # with the same guards as the scheduler's own escalation
+        approval_scheduler = get_approval_scheduler()
+        updated = await run_in_threadpool(approval_store.update, approval_id, {
+            'escalation_level': current_level + 1,
+            'escalated_at': datetime.now().isoformat(),
+            'expires_at': approval_scheduler.compute_expiry(approval_data)
+        }, expected_status='pending', expected_escalation_level=current_level)
+        if updated is None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Approval request {approval_id} was decided or escalated concurrently"
+            )
+        approval_scheduler.schedule(approval_id, updated['expires_at'], current_level + 1)
         
         logger.info(f"Escalated approval {approval_id} to level {current_level + 1}")
         
@@ -1171,54 +2609,85 @@ async def escalate_approval(approval_id: str):
             "timestamp": datetime.now().isoformat()
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to escalate approval: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to escalate approval: {str(e)}")
 
 @app.post("/workflow/{workflow_id}/interrupt")
 async def interrupt_workflow_for_approval(workflow_id: str, request: ApprovalRequest):
-    """Interrupt an active workflow and request approval"""
+    """
+    Interrupt an active workflow and request approval
+    
+    The workflow's graph and thread come from the workflow index. A running
+    thread is paused at its next node boundary and resumed with the approval
+    decision; an already interrupted thread is linked to the approval.
+    """
     try:
-        # Create approval request
-        approval_response = await create_approval_request(request)
-        approval_id = approval_response["approval_id"]
-        thread_id = approval_response["thread_id"]
-        
-        # Find active graph for this workflow
-        active_graph = None
-        for graph_id, graph_data in server_state['graphs'].items():
-            if graph_data.get('workflow_id') == workflow_id:
-                active_graph = graph_id
-                break
-        
-        if active_graph:
-            # Create interrupt data for LangGraph
-            interrupt_data = {
-                "interrupt_type": "approval_required",
-                "approval_id": approval_id,
-                "workflow_id": workflow_id,
-                "title": request.title,
-                "description": request.description,
-                "urgency_level": request.urgency_level,
-                "requires_action": True,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            logger.info(f"Interrupting workflow {workflow_id} for approval {approval_id}")
-            
-            return {
-                "workflow_id": workflow_id,
-                "approval_id": approval_id,
-                "thread_id": thread_id,
-                "status": "interrupted",
-                "interrupt_data": interrupt_data,
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
+        workflow_index = get_workflow_index()
+        entry = workflow_index.get(workflow_id)
+        if entry is not None and entry['graph_id'] not in get_graph_registry():
+            # The graph was deleted by another worker after the entry was written
+            workflow_index.unlink_graph(workflow_id, entry['graph_id'])
+            entry = None
+        
+        if entry is None:
             # No active graph found, just create the approval request
             logger.warning(f"No active graph found for workflow {workflow_id}, created approval request only")
-            return approval_response
+            return await create_approval_request(request)
+        
+        graph_id = entry['graph_id']
+        thread_id = entry.get('thread_id')
+        thread_info = await run_in_threadpool(get_thread_registry().get, thread_id) if thread_id else None
+        thread_status = thread_info.get('status') if thread_info else None
+        
+        # Link the approval to the thread so the decision resumes it
+        if thread_status in ('running', 'interrupted'):
+            request = request.model_copy(update={"graph_id": graph_id, "thread_id": thread_id})
+        else:
+            request = request.model_copy(update={"graph_id": graph_id})
+        approval_response = await create_approval_request(request)
+        approval_id = approval_response["approval_id"]
         
+        if thread_status == 'running':
+            handle = get_run_tracker().get(thread_id)
+            pause = {'pause_approval_id': approval_id}
+            if handle is None:
+                # Running on another worker, which polls its thread record
+                pause['cancel_requested'] = 'paused'
+            await _save_thread(thread_id, {**thread_info, **pause})
+            if handle is not None:
+                handle.cancel("paused")
+            thread_status = 'pausing'
+        
+        # Create interrupt data for LangGraph
+        interrupt_data = {
+            "interrupt_type": "approval_required",
+            "approval_id": approval_id,
+            "workflow_id": workflow_id,
+            "title": request.title,
+            "description": request.description,
+            "urgency_level": request.urgency_level,
+            "requires_action": True,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        logger.info(f"Interrupting workflow {workflow_id} (graph {graph_id}, thread {thread_id}: {thread_status}) for approval {approval_id}")
+        
+        return {
+            "workflow_id": workflow_id,
+            "approval_id": approval_id,
+            "graph_id": graph_id,
+            "thread_id": approval_response["thread_id"],
+            "thread_status": thread_status,
+            "status": "interrupted",
+            "interrupt_data": interrupt_data,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to interrupt workflow for approval: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to interrupt workflow: {str(e)}")
@@ -1229,7 +2698,22 @@ def main():
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "127.0.0.1")
     
-    logger.info(f"Starting LangGraph REST server on {host}:{port}")
+    logger.info(f"Starting LangGraph REST server on {host}:{port} with {SERVER_WORKERS} worker(s)")
+    
+    if SERVER_WORKERS > 1:
+        if STATE_BACKEND != "sqlite":
+            raise SystemExit("LANGGRAPH_WORKERS > 1 requires LANGGRAPH_STATE_BACKEND=sqlite")
+        
+        # Workers import the app themselves and share state through the database
+        os.environ["LANGGRAPH_STATE_BACKEND"] = STATE_BACKEND
+        uvicorn.run(
+            "langgraph_rest_server:app",
+            host=host,
+            port=port,
+            workers=SERVER_WORKERS,
+            log_level="info"
+        )
+        return
     
     uvicorn.run(
         app,
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Run Budgets and Cancellation for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+
+Every graph run gets a handle carrying its deadline and a cancel flag. The
+worker thread driving the graph checks the handle between chunks, so a run
+that times out or is cancelled stops at the next node boundary and gives its
+executor slot back.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class RunCancelled(Exception):
+    """Raised inside a run when its budget is spent or it was cancelled"""
+
+    def __init__(self, thread_id: str, reason: str):
+        super().__init__(f"Run for thread {thread_id} stopped: {reason}")
+        self.thread_id = thread_id
+        self.reason = reason
+
+class RunHandle:
+    """Deadline and cancel flag for one in-flight run"""
+
+    def __init__(self,
+                 thread_id: str,
+                 graph_id: str,
+                 timeout_seconds: Optional[float] = None,
+                 poll: Optional[Callable[[], Optional[str]]] = None,
+                 poll_interval: float = 1.0):
+        """
+        Args:
+            thread_id: Thread being run
+            graph_id: Graph the thread belongs to
+            timeout_seconds: Run budget, or None for no deadline
+            poll: Called between chunks (at most every poll_interval seconds);
+                returning a reason stops the run, e.g. on a request from another worker
+        """
+        self.thread_id = thread_id
+        self.graph_id = graph_id
+        self.timeout_seconds = timeout_seconds
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout_seconds if timeout_seconds else None
+        self.reason: Optional[str] = None
+        self._poll = poll
+        self._poll_interval = poll_interval
+        self._last_poll = self.started_at
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._watchers: List[asyncio.Future] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left in the budget, or None without a deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Stop the run at its next check; returns False if already stopped"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            watchers, self._watchers = self._watchers, []
+
+        for future in watchers:
+            future.get_loop().call_soon_threadsafe(_resolve, future)
+        logger.info(f"Run for thread {self.thread_id} stopping: {reason}")
+        return True
+
+    def check(self):
+        """Raise RunCancelled if the run should stop; called between chunks"""
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            self.cancel("timed_out")
+        elif self._poll is not None and now - self._last_poll >= self._poll_interval:
+            self._last_poll = now
+            reason = self._poll()
+            if reason:
+                self.cancel(reason if isinstance(reason, str) else "cancelled")
+
+        if self._event.is_set():
+            raise RunCancelled(self.thread_id, self.reason)
+
+    def watch(self, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+        """Future on the loop that resolves when the run is cancelled"""
+        future = loop.create_future()
+        with self._lock:
+            if not self._event.is_set():
+                self._watchers.append(future)
+                return future
+        future.set_result(None)
+        return future
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "thread_id": self.thread_id,
+            "graph_id": self.graph_id,
+            "timeout_seconds": self.timeout_seconds,
+            "elapsed_seconds": round(time.monotonic() - self.started_at, 3),
+            "cancelled": self.cancelled,
+            "reason": self.reason
+        }
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class RunTracker:
+    """In-flight runs of this process, keyed by thread ID"""
+
+    def __init__(self):
+        self._runs: Dict[str, RunHandle] = {}
+        self._lock = threading.Lock()
+        self._started = 0
+        self._finished = 0
+        self._stopped: Dict[str, int] = {}
+
+    def start(self,
+              thread_id: str,
+              graph_id: str,
+              timeout_seconds: Optional[float] = None,
+              poll: Optional[Callable[[], Optional[str]]] = None) -> RunHandle:
+        """Register a run; raises ValueError if the thread already has one"""
+        with self._lock:
+            if thread_id in self._runs:
+                raise ValueError(f"Thread {thread_id} already has an active run")
+            handle = RunHandle(thread_id, graph_id, timeout_seconds, poll)
+            self._runs[thread_id] = handle
+            self._started += 1
+        return handle
+
+    def get(self, thread_id: str) -> Optional[RunHandle]:
+        with self._lock:
+            return self._runs.get(thread_id)
+
+    def cancel(self, thread_id: str, reason: str = "cancelled") -> bool:
+        """Cancel a thread's run; returns False if it has none in this process"""
+        handle = self.get(thread_id)
+        return handle is not None and handle.cancel(reason)
+
+    def finish(self, handle: RunHandle):
+        """Forget a run once its outcome is recorded"""
+        with self._lock:
+            if self._runs.get(handle.thread_id) is handle:
+                del self._runs[handle.thread_id]
+                self._finished += 1
+                if handle.reason:
+                    self._stopped[handle.reason] = self._stopped.get(handle.reason, 0) + 1
+
+    def cancel_all(self, reason: str = "shutdown"):
+        """Cancel every in-flight run"""
+        with self._lock:
+            handles = list(self._runs.values())
+        for handle in handles:
+            handle.cancel(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        """Active runs and how finished runs stopped"""
+        with self._lock:
+            return {
+                "active": len(self._runs),
+                "started": self._started,
+                "finished": self._finished,
+                "stopped": dict(self._stopped)
+            }
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Pluggable Server State Backends for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+
+Server bookkeeping that must be visible to every uvicorn worker is kept in a
+state backend: in-process dictionaries for a single worker, or a shared SQLite
+table when several workers serve the same database.
+"""
+
+import json
+import bisect
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class InProcessStateBackend:
+    """
+    Namespaced key-value state held in this process only
+
+    Each namespace keeps a sorted key list beside its dict, so a page is a
+    bisect and a slice rather than a sort of the whole namespace.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def _insert_key(self, namespace: str, key: str):
+        bisect.insort(self._keys.setdefault(namespace, []), key)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._data.get(namespace, {}).get(key)
+
+    def put(self, namespace: str, key: str, value: Any):
+        with self._lock:
+            entries = self._data.setdefault(namespace, {})
+            if key not in entries:
+                self._insert_key(namespace, key)
+            entries[key] = value
+
+    def put_if_absent(self, namespace: str, key: str, value: Any) -> bool:
+        """Store value unless the key exists; returns True if stored"""
+        with self._lock:
+            entries = self._data.setdefault(namespace, {})
+            if key in entries:
+                return False
+            entries[key] = value
+            self._insert_key(namespace, key)
+            return True
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            entries = self._data.get(namespace, {})
+            if key not in entries:
+                return False
+            del entries[key]
+            keys = self._keys[namespace]
+            del keys[bisect.bisect_left(keys, key)]
+            return True
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return len(self._data.get(namespace, {}))
+
+    def list_page(self,
+                  namespace: str,
+                  limit: int = 100,
+                  cursor: Optional[str] = None) -> Tuple[List[Tuple[str, Any]], Optional[str]]:
+        """Entries ordered by key after the cursor, and the cursor for the next page"""
+        with self._lock:
+            keys = self._keys.get(namespace, [])
+            start = bisect.bisect_right(keys, cursor) if cursor else 0
+            page = [(key, self._data[namespace][key]) for key in keys[start:start + limit]]
+        return page, (page[-1][0] if len(keys) > start + limit else None)
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._data.pop(namespace, None)
+            self._keys.pop(namespace, None)
+
+    def close(self):
+        with self._lock:
+            self._data.clear()
+            self._keys.clear()
+
+class SQLiteStateBackend:
+    """Namespaced key-value state shared by every process using the database"""
+
+    shared = True
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            timeout=busy_timeout_ms / 1000
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS server_state (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at TEXT,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM server_state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, key: str, value: Any):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO server_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), datetime.now().isoformat())
+            )
+
+    def put_if_absent(self, namespace: str, key: str, value: Any) -> bool:
+        """Store value unless the key exists; returns True if stored"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO server_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), datetime.now().isoformat())
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM server_state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            )
+            return cursor.rowcount > 0
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM server_state WHERE namespace = ?",
+                (namespace,)
+            ).fetchone()[0]
+
+    def list_page(self,
+                  namespace: str,
+                  limit: int = 100,
+                  cursor: Optional[str] = None) -> Tuple[List[Tuple[str, Any]], Optional[str]]:
+        """Entries ordered by key after the cursor, and the cursor for the next page"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM server_state WHERE namespace = ? AND key > ? ORDER BY key LIMIT ?",
+                (namespace, cursor or "", limit + 1)
+            ).fetchall()
+        page = [(key, json.loads(value)) for key, value in rows[:limit]]
+        return page, (page[-1][0] if len(rows) > limit else None)
+
+    def clear(self, namespace: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM server_state WHERE namespace = ?", (namespace,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_state_backend(kind: str, db_path: str, busy_timeout_ms: int = 5000):
+    """
+    Create a state backend
+
+    Args:
+        kind: "memory" for a single worker, "sqlite" to share state between workers
+        db_path: Database used by the sqlite backend
+    """
+    if kind == "memory":
+        return InProcessStateBackend()
+    if kind == "sqlite":
+        return SQLiteStateBackend(db_path, busy_timeout_ms)
+    raise ValueError(f"Unknown state backend: {kind}")
+
+class GraphRegistry:
+    """
+    Dict-like registry of graphs backed by a state backend
+
+    The backend holds each graph's definition (type, config, creation time);
+    compiled handles are bound on first use in each process, so any worker can
+    serve any graph.
+    """
+
+    NAMESPACE = "graphs"
+
+    # Handle entries that only make sense inside one process
+    LOCAL_FIELDS = ("graph", "checkpointer")
+
+    def __init__(self, backend, bind: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        self.backend = backend
+        self._bind = bind
+        self._handles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, graph_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Graph handle with its compiled graph, or default if unknown"""
+        definition = self.backend.get(self.NAMESPACE, graph_id)
+        if definition is None:
+            # Deleted, possibly by another worker
+            with self._lock:
+                self._handles.pop(graph_id, None)
+            return default
+
+        with self._lock:
+            handle = self._handles.get(graph_id)
+            if handle is None:
+                handle = {**definition, **self._bind(definition)}
+                self._handles[graph_id] = handle
+        return handle
+
+    def __getitem__(self, graph_id: str) -> Dict[str, Any]:
+        handle = self.get(graph_id)
+        if handle is None:
+            raise KeyError(graph_id)
+        return handle
+
+    def __contains__(self, graph_id: str) -> bool:
+        return self.backend.get(self.NAMESPACE, graph_id) is not None
+
+    def _definition(self, handle: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in handle.items() if key not in self.LOCAL_FIELDS}
+
+    def __setitem__(self, graph_id: str, handle: Dict[str, Any]):
+        self.backend.put(self.NAMESPACE, graph_id, self._definition(handle))
+        with self._lock:
+            self._handles[graph_id] = handle
+
+    def add(self, graph_id: str, handle: Dict[str, Any]) -> bool:
+        """Register a new graph; returns False if the id is already taken"""
+        if not self.backend.put_if_absent(self.NAMESPACE, graph_id, self._definition(handle)):
+            return False
+        with self._lock:
+            self._handles[graph_id] = handle
+        return True
+
+    def __delitem__(self, graph_id: str):
+        with self._lock:
+            self._handles.pop(graph_id, None)
+        if not self.backend.delete(self.NAMESPACE, graph_id):
+            raise KeyError(graph_id)
+
+    def __len__(self) -> int:
+        return self.backend.count(self.NAMESPACE)
+
+    def list_page(self,
+                  limit: int = 100,
+                  cursor: Optional[str] = None) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+        """Graph definitions ordered by graph ID"""
+        return self.backend.list_page(self.NAMESPACE, limit=limit, cursor=cursor)
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over every graph definition"""
+        cursor = None
+        while True:
+            page, cursor = self.list_page(limit=500, cursor=cursor)
+            yield from page
+            if cursor is None:
+                return
+
+    def local_handles(self) -> List[Dict[str, Any]]:
+        """Handles bound in this process"""
+        with self._lock:
+            return list(self._handles.values())
+
+    def release_handles(self):
+        """Drop compiled handles, e.g. before the checkpointer pool closes"""
+        with self._lock:
+            self._handles.clear()
+
+class WorkflowIndex:
+    """
+    Maps workflow IDs to the graph and thread currently running them
+
+    A reverse entry per thread lets thread deletion drop its workflow link
+    without scanning the index.
+    """
+
+    NAMESPACE = "workflows"
+    THREAD_NAMESPACE = "workflow_threads"
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """The workflow's graph_id and thread_id (None before its first run)"""
+        return self.backend.get(self.NAMESPACE, workflow_id)
+
+    def link(self, workflow_id: str, graph_id: str, thread_id: Optional[str] = None):
+        """Point a workflow at a graph and, once it runs, the thread running it"""
+        previous = self.get(workflow_id)
+        self.backend.put(self.NAMESPACE, workflow_id, {
+            "graph_id": graph_id,
+            "thread_id": thread_id,
+            "updated_at": datetime.now().isoformat()
+        })
+        if thread_id:
+            self.backend.put(self.THREAD_NAMESPACE, thread_id, workflow_id)
+
+        # Drop the reverse entry of the thread the workflow moved away from
+        previous_thread_id = previous.get("thread_id") if previous else None
+        if (previous_thread_id and previous_thread_id != thread_id
+                and self.backend.get(self.THREAD_NAMESPACE, previous_thread_id) == workflow_id):
+            self.backend.delete(self.THREAD_NAMESPACE, previous_thread_id)
+
+    def unlink_graph(self, workflow_id: str, graph_id: str):
+        """Drop the workflow's entry if it still points at the graph"""
+        entry = self.get(workflow_id)
+        if entry is not None and entry["graph_id"] == graph_id:
+            self.backend.delete(self.NAMESPACE, workflow_id)
+            if entry.get("thread_id"):
+                self.backend.delete(self.THREAD_NAMESPACE, entry["thread_id"])
+
+    def unlink_thread(self, thread_id: str):
+        """Forget the thread; its workflow keeps pointing at the graph"""
+        workflow_id = self.backend.get(self.THREAD_NAMESPACE, thread_id)
+        if workflow_id is None:
+            return
+        self.backend.delete(self.THREAD_NAMESPACE, thread_id)
+        entry = self.get(workflow_id)
+        if entry is not None and entry.get("thread_id") == thread_id:
+            self.link(workflow_id, entry["graph_id"])
+
+    def __len__(self) -> int:
+        return self.backend.count(self.NAMESPACE)
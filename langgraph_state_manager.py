@@ -8,11 +8,21 @@ including state serialization, validation, checkpoint synchronization, and
 PowerShell-Python boundary state management.
 """
 
+import re
+import copy
 import json
+import time
+import zlib
+import queue
+import atexit
 import sqlite3
 import logging
-from datetime import datetime
-from typing import Dict, Any, List, Optional, Union, TypedDict
+import argparse
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Union, TypedDict, Iterator, Iterable, Tuple, Callable
 from pathlib import Path
 from dataclasses import dataclass, asdict
 from enum import Enum
@@ -20,6 +30,16 @@ from enum import Enum
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Optional zstd compression for stored states
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Codecs for stored state payloads; "auto" picks zstd when installed, else zlib
+STATE_CODECS = ("none", "zlib", "zstd")
+
 class StateValidationError(Exception):
     """Raised when state validation fails"""
     pass
@@ -48,14 +68,250 @@ class StateMetadata:
     checksum: str
     powershell_origin: bool = True
 
+def _escape_pointer(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+def _unescape_pointer(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+def version_state_id(graph_id: str, thread_id: str, version: int) -> str:
+    """
+    state_id of a thread version, e.g. graph_thread_v3
+    
+    "~" and "_" inside the ids are escaped (as ~0 and ~1), so the parts never
+    run together and distinct threads cannot share a state_id.
+    """
+    def escape(value: str) -> str:
+        return str(value).replace("~", "~0").replace("_", "~1")
+    return f"{escape(graph_id)}_{escape(thread_id)}_v{version}"
+
+def _same_value(before: Any, after: Any) -> bool:
+    # 1 == True == 1.0 in Python, but they serialise differently, so types are
+    # compared at every level rather than trusting == on containers
+    if type(before) is not type(after):
+        return False
+    if isinstance(before, dict):
+        return (len(before) == len(after)
+                and all(key in after and _same_value(value, after[key]) for key, value in before.items()))
+    if isinstance(before, list):
+        return len(before) == len(after) and all(map(_same_value, before, after))
+    return before == after
+
+def diff_states(old: Dict[str, Any], new: Dict[str, Any], path: str = "") -> List[Dict[str, Any]]:
+    """
+    JSON-patch (RFC 6902) operations turning old into new
+    
+    Only add, remove and replace are produced: nested objects are diffed key
+    by key, lists that only grew become appends and any other changed value
+    is replaced whole.
+    
+    Args:
+        old: Previous state
+        new: Next state
+        path: JSON pointer of the objects being compared
+        
+    Returns:
+        List of patch operations
+    """
+    ops = []
+    for key in old:
+        if key not in new:
+            ops.append({"op": "remove", "path": f"{path}/{_escape_pointer(key)}"})
+    
+    for key, value in new.items():
+        pointer = f"{path}/{_escape_pointer(key)}"
+        if key not in old:
+            ops.append({"op": "add", "path": pointer, "value": value})
+            continue
+        
+        before = old[key]
+        if _same_value(before, value):
+            continue
+        if isinstance(before, dict) and isinstance(value, dict):
+            ops.extend(diff_states(before, value, pointer))
+        elif (isinstance(before, list) and isinstance(value, list)
+                and len(value) > len(before) and _same_value(value[:len(before)], before)):
+            ops.extend({"op": "add", "path": f"{pointer}/-", "value": item} for item in value[len(before):])
+        else:
+            ops.append({"op": "replace", "path": pointer, "value": value})
+    return ops
+
+def apply_state_patch(state: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Apply operations from diff_states to a state, in place
+    
+    Args:
+        state: State to modify
+        ops: Patch operations
+        
+    Returns:
+        The patched state
+    """
+    for op in ops:
+        tokens = [_unescape_pointer(token) for token in op["path"].split("/")[1:]]
+        target = state
+        for token in tokens[:-1]:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        
+        last = tokens[-1]
+        if isinstance(target, list):
+            if op["op"] == "add":
+                if last == "-":
+                    target.append(op["value"])
+                else:
+                    target.insert(int(last), op["value"])
+            elif op["op"] == "replace":
+                target[int(last)] = op["value"]
+            else:
+                del target[int(last)]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return state
+
+def resolve_codec(codec: str) -> str:
+    """Concrete codec for a configured one; raises ValueError if unusable"""
+    if codec == "auto":
+        return "zstd" if ZSTD_AVAILABLE else "zlib"
+    if codec not in STATE_CODECS:
+        raise ValueError(f"Unknown state compression codec: {codec}")
+    if codec == "zstd" and not ZSTD_AVAILABLE:
+        raise ValueError("zstd compression requires the zstandard package")
+    return codec
+
+def encode_state_payload(text: str, 
+                         codec: str, 
+                         min_bytes: int = 1024, 
+                         level: Optional[int] = None) -> Tuple[Union[str, bytes], str]:
+    """
+    Compress a stored JSON payload
+    
+    Args:
+        text: JSON text
+        codec: none, zlib or zstd
+        min_bytes: Payloads smaller than this are stored as plain JSON
+        level: Compression level, or None for the codec's default
+        
+    Returns:
+        Tuple of (payload, format), where format is json when left uncompressed
+    """
+    raw = text.encode("utf-8")
+    if codec == "none" or len(raw) < min_bytes:
+        return text, "json"
+    
+    if codec == "zstd":
+        packed = zstandard.ZstdCompressor(level=3 if level is None else level).compress(raw)
+    else:
+        packed = zlib.compress(raw, 6 if level is None else level)
+    
+    # Incompressible payloads are not worth a decode on every read
+    if len(packed) >= len(raw):
+        return text, "json"
+    return packed, codec
+
+def decode_state_payload(payload: Union[str, bytes], payload_format: Optional[str]) -> str:
+    """JSON text of a payload stored by encode_state_payload"""
+    if payload_format in (None, "json"):
+        return payload
+    if payload_format == "zlib":
+        return zlib.decompress(payload).decode("utf-8")
+    if payload_format == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise StateSerializationError("State is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise StateSerializationError(f"Unknown state payload format: {payload_format}")
+
+# The /Date(ms)/ form Windows PowerShell's ConvertTo-Json writes for DateTime values
+_PS_JSON_DATE = re.compile(r"/Date\((-?\d+)(?:[+-]\d{4})?\)/")
+
+def to_snapshot_time(value: Union[str, int, float, datetime]) -> str:
+    """
+    Normalise a timestamp to the form of stored last_modified values
+    
+    Accepts ISO 8601 strings, PowerShell /Date(ms)/ strings, Unix seconds and
+    datetimes. Aware times are converted to local time, which is what
+    snapshots are stamped with, so the result compares correctly as text.
+    
+    Raises:
+        ValueError: If the value is not a recognised timestamp
+    """
+    if isinstance(value, str):
+        match = _PS_JSON_DATE.fullmatch(value.strip())
+        if match:
+            value = int(match.group(1)) / 1000
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                value = datetime.fromisoformat(value.strip())
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = datetime.fromtimestamp(value, tz=timezone.utc)
+        if not isinstance(value, datetime):
+            raise ValueError(f"Not a timestamp: {value!r}")
+        
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+    except (OverflowError, OSError) as e:
+        # inf, nan and epochs outside the platform's range
+        raise ValueError(f"Timestamp out of range: {value!r}") from e
+    return value.isoformat()
+
+def _items(container: Union[Dict[str, Any], List[Any]]) -> Iterator[Tuple[Any, Any]]:
+    return iter(container.items()) if isinstance(container, dict) else enumerate(container)
+
+def _transform(root: Any, convert: Callable[[Any], Any]) -> Any:
+    """
+    Apply convert to every value that is not a dict or list, without recursion
+    
+    Containers are copied only when something inside them changes, so a tree
+    with nothing to convert is returned as the same object.
+    """
+    if not isinstance(root, (dict, list)):
+        return convert(root)
+    
+    # Frames: [container, item iterator, copy once modified, key in parent]
+    stack = [[root, _items(root), None, None]]
+    while True:
+        frame = stack[-1]
+        for key, value in frame[1]:
+            if isinstance(value, (dict, list)):
+                stack.append([value, _items(value), None, key])
+                break
+            converted = convert(value)
+            if converted is not value:
+                if frame[2] is None:
+                    frame[2] = copy.copy(frame[0])
+                frame[2][key] = converted
+        else:
+            stack.pop()
+            result = frame[0] if frame[2] is None else frame[2]
+            if not stack:
+                return result
+            if result is not frame[0]:
+                parent = stack[-1]
+                if parent[2] is None:
+                    parent[2] = copy.copy(parent[0])
+                parent[2][frame[3]] = result
+
 class PowerShellStateConverter:
-    """Converts between PowerShell and Python state formats"""
+    """
+    Converts between PowerShell and Python state formats
+    
+    Conversion walks the state iteratively and copies only the containers on
+    the path to a converted value, so states with nothing to convert are
+    returned as they are and deep nesting cannot hit the recursion limit.
+    """
     
     @staticmethod
     def from_powershell(ps_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Convert PowerShell state format to Python format
         
+        JSON from PowerShell already holds only Python-compatible values, so
+        the state is returned as it is, strings included.
+        
         Args:
             ps_data: Data from PowerShell (via JSON conversion)
             
@@ -67,33 +323,8 @@ class PowerShellStateConverter:
         if not isinstance(ps_data, dict):
             raise StateSerializationError(f"Expected dict, got {type(ps_data)}")
         
-        converted = {}
-        
-        for key, value in ps_data.items():
-            # Convert PowerShell-specific formats
-            if isinstance(value, dict):
-                # Handle nested dictionaries recursively
-                converted[key] = PowerShellStateConverter.from_powershell(value)
-            elif isinstance(value, list):
-                # Handle arrays
-                converted[key] = [
-                    PowerShellStateConverter.from_powershell(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
-            elif isinstance(value, str):
-                # Handle PowerShell datetime strings
-                if PowerShellStateConverter._is_datetime_string(value):
-                    converted[key] = value  # Keep as ISO string for JSON compatibility
-                else:
-                    converted[key] = value
-            elif value is None:
-                converted[key] = None
-            else:
-                # Handle primitives (int, float, bool)
-                converted[key] = value
-        
-        logger.debug(f"Converted to Python format: {len(converted)} keys")
-        return converted
+        logger.debug(f"Converted to Python format: {len(ps_data)} keys")
+        return ps_data
     
     @staticmethod
     def to_powershell(python_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -111,48 +342,81 @@ class PowerShellStateConverter:
         if not isinstance(python_data, dict):
             raise StateSerializationError(f"Expected dict, got {type(python_data)}")
         
-        converted = {}
-        
-        for key, value in python_data.items():
-            if isinstance(value, dict):
-                # Handle nested dictionaries
-                converted[key] = PowerShellStateConverter.to_powershell(value)
-            elif isinstance(value, list):
-                # Handle arrays
-                converted[key] = [
-                    PowerShellStateConverter.to_powershell(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
-            elif isinstance(value, datetime):
-                # Convert datetime to ISO string
-                converted[key] = value.isoformat()
-            elif value is None:
-                converted[key] = None
-            else:
-                # Handle primitives
-                converted[key] = value
+        converted = _transform(python_data, PowerShellStateConverter._to_powershell_value)
         
         logger.debug(f"Converted to PowerShell format: {len(converted)} keys")
         return converted
     
     @staticmethod
-    def _is_datetime_string(value: str) -> bool:
-        """Check if string looks like a datetime"""
-        if not isinstance(value, str):
-            return False
-        
-        # Check for ISO 8601 format patterns
-        datetime_patterns = [
-            'T',  # ISO 8601 separator
-            'Z',  # UTC indicator
-            '+',  # Timezone offset
-            '-'   # Date separator or timezone offset
-        ]
+    def _to_powershell_value(value: Any) -> Any:
+        if isinstance(value, datetime):
+            # Convert datetime to ISO string
+            return value.isoformat()
+        return value
+
+# Type names usable in schema "types" entries, with how errors describe them
+SCHEMA_TYPES = {
+    "string": ((str,), "a string"),
+    "number": ((int, float), "numeric"),
+    "integer": ((int,), "an integer"),
+    "boolean": ((bool,), "boolean"),
+    "list": ((list,), "a list"),
+    "array": ((list,), "a list"),
+    "dict": ((dict,), "an object"),
+    "object": ((dict,), "an object"),
+    "null": ((type(None),), "null")
+}
+
+class CompiledSchema:
+    """Required-field and field-type checks for one state type, prepared once"""
+    
+    def __init__(self, name: str, schema: Optional[Dict[str, Any]], field_types: Dict[str, Any]):
+        """
+        Args:
+            name: State type the schema is for
+            schema: Schema with "required", "optional" and "types" entries, or
+                None to accept any state
+            field_types: Field types checked whenever the field is present,
+                extended or overridden by the schema's "types"
+            
+        Raises:
+            ValueError: If the schema names an unknown type
+        """
+        self.name = name
+        self.schema = schema
+        self.required: Tuple[str, ...] = ()
+        self.type_checks: List[Tuple[str, Tuple[type, ...], str]] = []
+        if schema is None:
+            return
         
-        return any(pattern in value for pattern in datetime_patterns) and len(value) > 10
+        self.required = tuple(schema.get("required", ()))
+        for field, type_names in {**field_types, **schema.get("types", {})}.items():
+            if isinstance(type_names, str):
+                type_names = [type_names]
+            unknown = [type_name for type_name in type_names if type_name not in SCHEMA_TYPES]
+            if unknown:
+                raise ValueError(f"Unknown type {unknown} for field '{field}' in {name} schema")
+            
+            types = tuple(t for type_name in type_names for t in SCHEMA_TYPES[type_name][0])
+            description = " or ".join(SCHEMA_TYPES[type_name][1] for type_name in type_names)
+            self.type_checks.append((field, types, f"'{field}' field must be {description}"))
+    
+    def errors(self, state_data: Dict[str, Any]) -> List[str]:
+        """Every problem with a state, empty if it is valid"""
+        missing = [field for field in self.required if field not in state_data]
+        errors = [f"Missing required fields: {missing}"] if missing else []
+        for field, types, message in self.type_checks:
+            if field in state_data and not isinstance(state_data[field], types):
+                errors.append(message)
+        return errors
 
 class StateValidator:
-    """Validates state data according to different schemas"""
+    """
+    Validates state data according to different schemas
+    
+    Each state type's schema is compiled once into a CompiledSchema; custom
+    schemas registered or loaded from config replace the built-in ones.
+    """
     
     BASIC_SCHEMA = {
         "required": ["messages", "counter"],
@@ -169,6 +433,80 @@ class StateValidator:
         "optional": ["workflow_state", "coordination_data", "timestamp"]
     }
     
+    # Checked in every schema whenever the field is present
+    FIELD_TYPES = {
+        "messages": ["list"],
+        "counter": ["number"],
+        "approval_needed": ["boolean"],
+        "approved": ["boolean", "null"]
+    }
+    
+    _custom_schemas: Dict[StateType, Dict[str, Any]] = {}
+    _compiled: Dict[StateType, CompiledSchema] = {}
+    
+    @classmethod
+    def _schema_for(cls, state_type: StateType) -> Optional[Dict[str, Any]]:
+        if state_type in cls._custom_schemas:
+            return cls._custom_schemas[state_type]
+        # Complex states have no fixed schema
+        return {
+            StateType.BASIC: cls.BASIC_SCHEMA,
+            StateType.HITL: cls.HITL_SCHEMA,
+            StateType.MULTI_AGENT: cls.MULTI_AGENT_SCHEMA
+        }.get(state_type)
+    
+    @classmethod
+    def compiled(cls, state_type: StateType) -> CompiledSchema:
+        """Compiled checks for a state type, built on first use"""
+        validator = cls._compiled.get(state_type)
+        if validator is None:
+            validator = CompiledSchema(state_type.value, cls._schema_for(state_type), cls.FIELD_TYPES)
+            cls._compiled[state_type] = validator
+        return validator
+    
+    @classmethod
+    def register_schema(cls, state_type: StateType, schema: Optional[Dict[str, Any]]):
+        """
+        Replace a state type's schema
+        
+        Args:
+            state_type: State type the schema applies to
+            schema: Schema with "required", "optional" and "types" entries
+                ("types" maps field names to type names such as "string" or
+                ["boolean", "null"]), or None to restore the built-in schema
+            
+        Raises:
+            ValueError: If the schema names an unknown type
+        """
+        if schema is None:
+            cls._custom_schemas.pop(state_type, None)
+            cls._compiled.pop(state_type, None)
+            return
+        
+        # Compile before storing, so a bad schema leaves the old one in place
+        compiled = CompiledSchema(state_type.value, schema, cls.FIELD_TYPES)
+        cls._custom_schemas[state_type] = schema
+        cls._compiled[state_type] = compiled
+        logger.info(f"Registered custom schema for state type: {state_type.value}")
+    
+    @classmethod
+    def load_schemas(cls, path: Union[str, Path]) -> List[str]:
+        """
+        Register custom schemas from a JSON file mapping state types to schemas
+        
+        Args:
+            path: JSON config file, e.g. {"hitl": {"required": [...], "types": {...}}}
+            
+        Returns:
+            State types whose schema was replaced
+        """
+        with open(path, "r", encoding="utf-8") as config:
+            schemas = json.load(config)
+        
+        for state_type, schema in schemas.items():
+            cls.register_schema(StateType(state_type), schema)
+        return list(schemas)
+    
     @classmethod
     def validate_state(cls, state_data: Dict[str, Any], state_type: StateType) -> bool:
         """
@@ -186,63 +524,340 @@ class StateValidator:
         """
         logger.debug(f"Validating state type: {state_type.value}")
         
-        if state_type == StateType.BASIC:
-            schema = cls.BASIC_SCHEMA
-        elif state_type == StateType.HITL:
-            schema = cls.HITL_SCHEMA
-        elif state_type == StateType.MULTI_AGENT:
-            schema = cls.MULTI_AGENT_SCHEMA
-        else:
-            # Complex states have no fixed schema
-            logger.debug("Complex state type - skipping schema validation")
-            return True
-        
-        # Check required fields
-        missing_required = []
-        for field in schema["required"]:
-            if field not in state_data:
-                missing_required.append(field)
-        
-        if missing_required:
-            raise StateValidationError(f"Missing required fields: {missing_required}")
-        
-        # Validate field types for known fields
-        cls._validate_field_types(state_data)
+        errors = cls.compiled(state_type).errors(state_data)
+        if errors:
+            raise StateValidationError(errors[0])
         
         logger.debug("State validation passed")
         return True
     
     @classmethod
-    def _validate_field_types(cls, state_data: Dict[str, Any]):
-        """Validate basic field type constraints"""
-        
-        # Messages should be a list
-        if "messages" in state_data and not isinstance(state_data["messages"], list):
-            raise StateValidationError("'messages' field must be a list")
-        
-        # Counter should be numeric
-        if "counter" in state_data and not isinstance(state_data["counter"], (int, float)):
-            raise StateValidationError("'counter' field must be numeric")
+    def validate_batch(cls, states: Iterable[Tuple[Any, str]]) -> List[Dict[str, Any]]:
+        """
+        Validate many states, collecting every error of each
         
-        # Approval fields validation
-        if "approval_needed" in state_data and not isinstance(state_data["approval_needed"], bool):
-            raise StateValidationError("'approval_needed' field must be boolean")
+        Args:
+            states: (state data, state type name) pairs
+            
+        Returns:
+            Per-state results with index, state_type, valid and errors
+        """
+        results = []
+        for index, (state_data, state_type) in enumerate(states):
+            try:
+                validator = cls.compiled(StateType(state_type))
+            except ValueError:
+                errors = [f"Invalid state type: {state_type}"]
+            else:
+                if isinstance(state_data, dict):
+                    errors = validator.errors(state_data)
+                else:
+                    errors = [f"Expected dict, got {type(state_data).__name__}"]
+            
+            results.append({
+                "index": index,
+                "state_type": state_type,
+                "valid": not errors,
+                "errors": errors
+            })
+        return results
+
+class StateConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections to the state database
+    
+    Connections are opened on first use, kept for the life of the pool and
+    lent to one thread at a time, so snapshot calls skip connection setup and
+    reuse each connection's prepared statement cache.
+    """
+    
+    def __init__(self, 
+                 db_path: Union[str, Path], 
+                 pool_size: int = 4,
+                 busy_timeout_ms: int = 5000,
+                 cached_statements: int = 128):
+        """
+        Args:
+            db_path: SQLite database file
+            pool_size: Maximum number of open connections
+            busy_timeout_ms: How long a writer waits for the database lock
+            cached_statements: Prepared statements cached per connection
+        """
+        self.db_path = Path(db_path)
+        self.pool_size = max(1, pool_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection tuned for concurrent readers and a single writer"""
+        conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+    
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("State connection pool is closed")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._opened < self.pool_size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        # Every connection is lent out; wait for one to come back
+        return self._idle.get(timeout=self.busy_timeout_ms / 1000 + 30)
+    
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            if not self._closed:
+                self._idle.put(conn)
+                return
+            self._opened -= 1
+        conn.close()
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; any open transaction is rolled back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Pool configuration and state"""
+        return {
+            "db_path": str(self.db_path),
+            "pool_size": self.pool_size,
+            "open_connections": self._opened,
+            "idle_connections": self._idle.qsize(),
+            "cached_statements": self.cached_statements,
+            "closed": self._closed
+        }
+    
+    def close(self):
+        """Close idle connections now and lent ones when they are returned"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._opened -= len(idle)
         
-        if "approved" in state_data and state_data["approved"] is not None:
-            if not isinstance(state_data["approved"], bool):
-                raise StateValidationError("'approved' field must be boolean or null")
+        for conn in idle:
+            conn.close()
+        logger.info(f"State connection pool closed: {self.db_path}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# Triggers keeping state_stats in step with the snapshot and blob tables.
+# Distinct graph and thread counts follow the per-key rows appearing and going.
+_STATS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_snapshot_insert
+    AFTER INSERT ON state_snapshots
+    BEGIN
+        INSERT INTO state_stats (kind, key, value) VALUES ('total', 'snapshots', 1)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + 1;
+        INSERT INTO state_stats (kind, key, value) VALUES ('graph', NEW.graph_id, 1)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + 1;
+        INSERT INTO state_stats (kind, key, value) VALUES ('thread', NEW.thread_id, 1)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + 1;
+        INSERT INTO state_stats (kind, key, value) VALUES ('type', NEW.state_type, 1)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_snapshot_delete
+    AFTER DELETE ON state_snapshots
+    BEGIN
+        UPDATE state_stats SET value = value - 1 WHERE kind = 'total' AND key = 'snapshots';
+        UPDATE state_stats SET value = value - 1 WHERE kind = 'graph' AND key = OLD.graph_id;
+        UPDATE state_stats SET value = value - 1 WHERE kind = 'thread' AND key = OLD.thread_id;
+        UPDATE state_stats SET value = value - 1 WHERE kind = 'type' AND key = OLD.state_type;
+        DELETE FROM state_stats WHERE kind = 'graph' AND key = OLD.graph_id AND value <= 0;
+        DELETE FROM state_stats WHERE kind = 'thread' AND key = OLD.thread_id AND value <= 0;
+        DELETE FROM state_stats WHERE kind = 'type' AND key = OLD.state_type AND value <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_distinct_insert
+    AFTER INSERT ON state_stats WHEN NEW.kind IN ('graph', 'thread')
+    BEGIN
+        INSERT INTO state_stats (kind, key, value) VALUES ('distinct', NEW.kind, 1)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_distinct_delete
+    AFTER DELETE ON state_stats WHEN OLD.kind IN ('graph', 'thread')
+    BEGIN
+        UPDATE state_stats SET value = value - 1 WHERE kind = 'distinct' AND key = OLD.kind;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_blob_insert
+    AFTER INSERT ON state_blobs
+    BEGIN
+        INSERT INTO state_stats (kind, key, value) VALUES ('blobs', 'count', 1)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + 1;
+        INSERT INTO state_stats (kind, key, value) VALUES ('blobs', 'bytes', NEW.size)
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + NEW.size;
+        INSERT INTO state_stats (kind, key, value) VALUES ('blobs', 'stored_bytes', length(NEW.state_data))
+            ON CONFLICT(kind, key) DO UPDATE SET value = value + length(NEW.state_data);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_blob_update
+    AFTER UPDATE OF state_data ON state_blobs
+    BEGIN
+        UPDATE state_stats SET value = value + length(NEW.state_data) - length(OLD.state_data)
+        WHERE kind = 'blobs' AND key = 'stored_bytes';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_state_stats_blob_delete
+    AFTER DELETE ON state_blobs
+    BEGIN
+        UPDATE state_stats SET value = value - 1 WHERE kind = 'blobs' AND key = 'count';
+        UPDATE state_stats SET value = value - OLD.size WHERE kind = 'blobs' AND key = 'bytes';
+        UPDATE state_stats SET value = value - length(OLD.state_data) WHERE kind = 'blobs' AND key = 'stored_bytes';
+    END
+    """
+)
+
+_STATS_TRIGGER_NAMES = (
+    "trg_state_stats_snapshot_insert", "trg_state_stats_snapshot_delete",
+    "trg_state_stats_distinct_insert", "trg_state_stats_distinct_delete",
+    "trg_state_stats_blob_insert", "trg_state_stats_blob_update", "trg_state_stats_blob_delete"
+)
 
 class StateCheckpointManager:
-    """Manages state checkpoints and persistence"""
+    """
+    Manages state checkpoints and persistence
     
-    def __init__(self, db_path: str):
+    Each thread's snapshots are numbered versions. A version is stored as a
+    JSON patch against the one before it, with a full keyframe every
+    keyframe_interval versions, so rebuilding any version reads at most one
+    keyframe and the deltas after it. Keyframes live in state_blobs keyed by
+    the state checksum, so identical states are stored once, and a state equal
+    to its thread's latest version is not written at all. Payloads above
+    compress_min_bytes are compressed; each row's format column records how.
+    With maintain_stats, triggers keep running totals in state_stats so
+    statistics() does not scan the snapshot table. With write_behind,
+    queue_state_version hands versions to a StateWriteQueue that commits them
+    in batches; reads of a thread wait for its queued versions first.
+    """
+    
+    def __init__(self, 
+                 db_path: str, 
+                 pool_size: int = 4, 
+                 busy_timeout_ms: int = 5000,
+                 keyframe_interval: int = 10,
+                 head_cache_size: int = 1024,
+                 compression: str = "auto",
+                 compress_min_bytes: int = 1024,
+                 compression_level: Optional[int] = None,
+                 maintain_stats: bool = True,
+                 write_behind: bool = False,
+                 write_batch_size: int = 256,
+                 write_delay_ms: float = 50,
+                 write_timeout: float = 30):
+        """
+        Args:
+            db_path: SQLite database file
+            pool_size: Pooled connections
+            busy_timeout_ms: How long a writer waits for the database lock
+            keyframe_interval: Versions between full snapshots; 1 disables deltas
+            head_cache_size: Threads whose latest state is kept in memory (LRU) for
+                diffing and latest_snapshot
+            compression: none, zlib, zstd or auto (zstd when installed)
+            compress_min_bytes: Smallest payload that is compressed
+            compression_level: Codec compression level, or None for its default
+            maintain_stats: Keep incrementally maintained totals for statistics()
+            write_behind: Queue versions for a background writer instead of
+                committing each one before returning
+            write_batch_size: Versions the background writer commits together
+            write_delay_ms: Longest a queued version waits for its batch to fill
+            write_timeout: Longest a durable write or a read waits on the queue
+        """
         self.db_path = Path(db_path)
+        self.pool = StateConnectionPool(self.db_path, pool_size, busy_timeout_ms)
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.compression = resolve_codec(compression)
+        self.compress_min_bytes = max(0, compress_min_bytes)
+        self.compression_level = compression_level
+        self.maintain_stats = maintain_stats
+        self.head_cache_size = max(0, head_cache_size)
+        # (graph_id, thread_id) -> (version, keyframe version, state)
+        self._heads: "OrderedDict[Tuple[str, str], Tuple[int, int, Dict[str, Any]]]" = OrderedDict()
+        self._heads_lock = threading.Lock()
+        self._versions_written = 0
+        self._writes_skipped = 0
+        self._blobs_reused = 0
+        self._head_hits = 0
+        self._head_misses = 0
         self._ensure_tables()
+        self.write_queue = StateWriteQueue(
+            self, write_batch_size, write_delay_ms, wait_timeout=write_timeout
+        ) if write_behind else None
+    
+    def close(self):
+        """Write any queued versions, then close the pooled connections"""
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.pool.close()
+    
+    def _settle(self, graph_id: Optional[str], thread_id: Optional[str]):
+        """Wait for the queued versions of the threads a read covers to be committed"""
+        if self.write_queue is None:
+            return
+        if not self.write_queue.wait_for(graph_id, thread_id):
+            raise StateSerializationError(
+                f"Timed out waiting for queued state versions of {graph_id or '*'}/{thread_id or '*'}"
+            )
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _encode(self, text: str) -> Tuple[Union[str, bytes], str]:
+        return encode_state_payload(text, self.compression, self.compress_min_bytes, self.compression_level)
     
     def _ensure_tables(self):
         """Ensure state management tables exist"""
-        conn = sqlite3.connect(self.db_path)
-        try:
+        with self.pool.connection() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS state_snapshots (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -254,10 +869,38 @@ class StateCheckpointManager:
                     state_data TEXT,
                     metadata TEXT,
                     created_at TEXT,
-                    last_modified TEXT
+                    last_modified TEXT,
+                    encoding TEXT NOT NULL DEFAULT 'full',
+                    checksum TEXT,
+                    format TEXT NOT NULL DEFAULT 'json'
+                )
+            """)
+            
+            # Full states by checksum; keyframes with NULL state_data point here
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS state_blobs (
+                    checksum TEXT PRIMARY KEY,
+                    state_data TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at TEXT,
+                    format TEXT NOT NULL DEFAULT 'json'
                 )
             """)
             
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(state_snapshots)")}
+            if "encoding" not in columns:
+                # Snapshots written before delta encoding all hold full states
+                conn.execute("ALTER TABLE state_snapshots ADD COLUMN encoding TEXT NOT NULL DEFAULT 'full'")
+            if "checksum" not in columns:
+                conn.execute("ALTER TABLE state_snapshots ADD COLUMN checksum TEXT")
+                conn.execute("UPDATE state_snapshots SET checksum = json_extract(metadata, '$.checksum')")
+            
+            # Rows written before compression hold plain JSON text
+            for table in ("state_snapshots", "state_blobs"):
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if "format" not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN format TEXT NOT NULL DEFAULT 'json'")
+            
             conn.execute("""
                 CREATE INDEX IF NOT EXISTS idx_state_graph_thread 
                 ON state_snapshots(graph_id, thread_id)
@@ -268,10 +911,126 @@ class StateCheckpointManager:
                 ON state_snapshots(last_modified)
             """)
             
+            # Covers the latest-version and keyframe lookups, so neither reads the table;
+            # supersedes the earlier (graph_id, thread_id, version) index
+            conn.execute("DROP INDEX IF EXISTS idx_state_thread_version")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_state_thread_latest
+                ON state_snapshots(graph_id, thread_id, version, encoding, state_id, last_modified, checksum)
+            """)
+            
+            # Point-in-time lookups: one seek for the last version at or before a time
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_state_thread_time
+                ON state_snapshots(graph_id, thread_id, last_modified, version, state_id)
+            """)
+            
+            # Serve the aggregate statistics queries from indexes
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_state_thread
+                ON state_snapshots(thread_id)
+            """)
+            
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_state_type
+                ON state_snapshots(state_type)
+            """)
+            
             conn.commit()
+            self._renumber_legacy_versions(conn)
+            self._ensure_stats(conn)
             logger.debug("State management tables ready")
-        finally:
-            conn.close()
+    
+    def _renumber_legacy_versions(self, conn: sqlite3.Connection):
+        """
+        Number the snapshots of threads saved before versioning, once per database
+        
+        Earlier releases saved every snapshot as version 1. Each such thread's
+        rows are numbered 1..n by (version, last_modified, id), and the version in
+        their metadata follows; their timestamp-based state_ids are kept, so
+        clients holding them can still load the rows.
+        """
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS state_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TEXT
+            )
+        """)
+        # Under the write lock, so two processes starting together migrate once
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute(
+            "SELECT 1 FROM state_migrations WHERE name = 'renumber_versions'"
+        ).fetchone() is not None:
+            conn.rollback()
+            return
+        
+        renumbered = conn.execute("""
+            WITH numbered AS (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY graph_id, thread_id ORDER BY version, last_modified, id
+                ) AS n
+                FROM state_snapshots
+                WHERE (graph_id, thread_id) IN (
+                    SELECT graph_id, thread_id FROM state_snapshots 
+                    GROUP BY graph_id, thread_id HAVING COUNT(*) > COUNT(DISTINCT version)
+                )
+            )
+            UPDATE state_snapshots 
+            SET version = numbered.n,
+                metadata = CASE WHEN json_valid(metadata) 
+                                THEN json_set(metadata, '$.version', numbered.n) ELSE metadata END
+            FROM numbered
+            WHERE state_snapshots.id = numbered.id AND state_snapshots.version IS NOT numbered.n
+        """).rowcount
+        conn.execute(
+            "INSERT INTO state_migrations (name, applied_at) VALUES ('renumber_versions', ?)",
+            (datetime.now().isoformat(),)
+        )
+        conn.commit()
+        if renumbered:
+            logger.info(f"Renumbered {renumbered} legacy state snapshots into per-thread versions")
+    
+    def _ensure_stats(self, conn: sqlite3.Connection):
+        """Create and backfill the maintained totals, or drop them when disabled"""
+        # Under the write lock, so two processes starting together backfill once
+        conn.execute("BEGIN IMMEDIATE")
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'state_stats'"
+        ).fetchone() is not None
+        
+        if not self.maintain_stats:
+            # Totals nobody maintains would go stale, so remove them
+            for name in _STATS_TRIGGER_NAMES:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            conn.execute("DROP TABLE IF EXISTS state_stats")
+            conn.commit()
+            return
+        
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS state_stats (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+        """)
+        for trigger in _STATS_TRIGGERS:
+            conn.execute(trigger)
+        
+        if not exists:
+            # Per-key rows go in through the triggers' distinct counting
+            conn.execute("""
+                INSERT INTO state_stats (kind, key, value)
+                SELECT 'total', 'snapshots', COUNT(*) FROM state_snapshots
+                UNION ALL SELECT 'graph', graph_id, COUNT(*) FROM state_snapshots GROUP BY graph_id
+                UNION ALL SELECT 'thread', thread_id, COUNT(*) FROM state_snapshots GROUP BY thread_id
+                UNION ALL SELECT 'type', state_type, COUNT(*) FROM state_snapshots GROUP BY state_type
+                UNION ALL SELECT 'blobs', 'count', COUNT(*) FROM state_blobs
+                UNION ALL SELECT 'blobs', 'bytes', COALESCE(SUM(size), 0) FROM state_blobs
+                UNION ALL SELECT 'blobs', 'stored_bytes', COALESCE(SUM(length(state_data)), 0) FROM state_blobs
+            """)
+            logger.info("State statistics table built")
+        conn.commit()
     
     def save_state_snapshot(self, 
                            state_data: Dict[str, Any], 
@@ -288,42 +1047,47 @@ class StateCheckpointManager:
         """
         logger.info(f"Saving state snapshot: {metadata.state_id}")
         
-        conn = sqlite3.connect(self.db_path)
         try:
-            # Serialize state data
+            # Serialize state data, compressed above the size threshold
             state_json = json.dumps(state_data, ensure_ascii=False, indent=None)
+            state_payload, state_format = self._encode(state_json)
             
             # Convert metadata to dict and handle enum serialization
             metadata_dict = asdict(metadata)
             metadata_dict['state_type'] = metadata_dict['state_type'].value  # Convert StateType enum to string
             metadata_json = json.dumps(metadata_dict, ensure_ascii=False)
             
-            conn.execute("""
-                INSERT OR REPLACE INTO state_snapshots 
-                (state_id, graph_id, thread_id, state_type, version, 
-                 state_data, metadata, created_at, last_modified)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                metadata.state_id,
-                metadata.graph_id,
-                metadata.thread_id,
-                metadata.state_type.value,
-                metadata.version,
-                state_json,
-                metadata_json,
-                metadata.created_at,
-                metadata.last_modified
-            ))
+            with self.pool.connection() as conn:
+                # Delete explicitly: REPLACE would skip the statistics delete trigger
+                conn.execute("DELETE FROM state_snapshots WHERE state_id = ?", (metadata.state_id,))
+                conn.execute("""
+                    INSERT INTO state_snapshots 
+                    (state_id, graph_id, thread_id, state_type, version, 
+                     state_data, metadata, created_at, last_modified, encoding, checksum, format)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'full', ?, ?)
+                """, (
+                    metadata.state_id,
+                    metadata.graph_id,
+                    metadata.thread_id,
+                    metadata.state_type.value,
+                    metadata.version,
+                    state_payload,
+                    metadata_json,
+                    metadata.created_at,
+                    metadata.last_modified,
+                    metadata.checksum,
+                    state_format
+                ))
+                conn.commit()
             
-            conn.commit()
+            # The write may have replaced a version the cached head was built from
+            self._forget_head(metadata.graph_id, metadata.thread_id)
             logger.info(f"State snapshot saved successfully: {metadata.state_id}")
             return metadata.state_id
             
         except Exception as e:
             logger.error(f"Failed to save state snapshot: {e}")
             raise
-        finally:
-            conn.close()
     
     def load_state_snapshot(self, state_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -336,17 +1100,26 @@ class StateCheckpointManager:
             State data or None if not found
         """
         logger.debug(f"Loading state snapshot: {state_id}")
+        # No settling: versions only get a state_id once written, so a queued
+        # version cannot be asked for by id
         
-        conn = sqlite3.connect(self.db_path)
         try:
-            cursor = conn.execute("""
-                SELECT state_data, metadata FROM state_snapshots 
-                WHERE state_id = ?
-            """, (state_id,))
+            with self.pool.connection() as conn:
+                row = conn.execute("""
+                    SELECT COALESCE(s.state_data, b.state_data), s.metadata, 
+                           s.graph_id, s.thread_id, s.version, s.encoding,
+                           CASE WHEN s.state_data IS NULL THEN b.format ELSE s.format END
+                    FROM state_snapshots s
+                    LEFT JOIN state_blobs b ON s.state_data IS NULL AND b.checksum = s.checksum
+                    WHERE s.state_id = ?
+                """, (state_id,)).fetchone()
+                
+                if row and row[5] == "delta":
+                    state_data = copy.deepcopy(self._head(conn, row[2], row[3], row[4])[2])
+                elif row:
+                    state_data = json.loads(decode_state_payload(row[0], row[6]))
             
-            row = cursor.fetchone()
             if row:
-                state_data = json.loads(row[0])
                 metadata = json.loads(row[1])
                 logger.debug(f"Loaded state snapshot: {len(state_data)} fields")
                 return {
@@ -360,8 +1133,683 @@ class StateCheckpointManager:
         except Exception as e:
             logger.error(f"Failed to load state snapshot: {e}")
             raise
-        finally:
-            conn.close()
+    
+    def append_state_version(self,
+                             state_data: Dict[str, Any],
+                             graph_id: str,
+                             thread_id: str,
+                             state_type: StateType,
+                             checksum: str,
+                             powershell_origin: bool = True) -> StateMetadata:
+        """
+        Save a state as the next version of its thread
+        
+        A state equal to the thread's latest version is not written; the
+        latest version's metadata is returned instead. Otherwise the version
+        references an existing blob holding the same state, or is stored as a
+        delta against the previous version unless a keyframe is due or the
+        delta would not be smaller than the state. Checksums only find the
+        candidates: a match is confirmed against the stored state.
+        
+        Args:
+            state_data: State dictionary to save
+            graph_id: Graph the thread belongs to
+            thread_id: Thread whose history is extended
+            state_type: Type of the state
+            checksum: Checksum of the state, as from _calculate_checksum
+            powershell_origin: Whether the state came from PowerShell
+            
+        Returns:
+            Metadata of the saved (or unchanged latest) version
+        """
+        try:
+            with self.pool.connection() as conn:
+                latest = self._latest(conn, graph_id, thread_id)
+                if self._matches_latest(conn, {}, graph_id, thread_id, latest, checksum, state_data):
+                    return self._unchanged(conn, latest)
+                
+                # Allocate the version under the write lock, so concurrent writers
+                # in any process get distinct, gapless versions
+                conn.execute("BEGIN IMMEDIATE")
+                metadata, blob_exists, keyframe_version = self._write_version(
+                    conn, {}, state_data, graph_id, thread_id, state_type, checksum, powershell_origin
+                )
+                conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Failed to save state version: {e}")
+            raise
+        
+        if keyframe_version is not None:
+            self._versions_written += 1
+            if blob_exists:
+                self._blobs_reused += 1
+            self._remember_head(graph_id, thread_id, metadata.version, keyframe_version, copy.deepcopy(state_data))
+            logger.info(f"State version saved: {metadata.state_id}")
+        return metadata
+    
+    def queue_state_version(self,
+                            state_data: Dict[str, Any],
+                            graph_id: str,
+                            thread_id: str,
+                            state_type: StateType,
+                            checksum: str,
+                            powershell_origin: bool = True,
+                            durable: bool = False) -> Optional[StateMetadata]:
+        """
+        Save a state as the next version of its thread, through the write-behind
+        queue when it is enabled
+        
+        Args:
+            durable: Wait until the version is committed even in write-behind mode
+            
+        Returns:
+            Metadata of the saved version, or None if it was only queued
+        """
+        if self.write_queue is None:
+            return self.append_state_version(
+                state_data, graph_id, thread_id, state_type, checksum, powershell_origin
+            )
+        return self.write_queue.submit(
+            state_data, graph_id, thread_id, state_type, checksum, powershell_origin, durable
+        )
+    
+    def append_state_versions(self,
+                              versions: List[Tuple[Dict[str, Any], str, str, StateType, str, bool]],
+                              copy_states: bool = True) -> List[Union[StateMetadata, Exception]]:
+        """
+        Save many states as versions of their threads in one transaction
+        
+        Each state is written as by append_state_version, in order, so several
+        versions of one thread can share a batch. A state that fails is rolled
+        back on its own and reported in place of its metadata.
+        
+        Args:
+            versions: (state_data, graph_id, thread_id, state_type, checksum,
+                powershell_origin) tuples
+            copy_states: Whether to copy the states before caching them; False
+                when the caller hands them over
+            
+        Returns:
+            Metadata or the exception raised, per state
+        """
+        results: List[Union[StateMetadata, Exception]] = []
+        # (graph_id, thread_id) -> head written earlier in this batch
+        heads: Dict[Tuple[str, str], Tuple[int, int, Dict[str, Any]]] = {}
+        written, reused = 0, 0
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for state_data, graph_id, thread_id, state_type, checksum, powershell_origin in versions:
+                    conn.execute("SAVEPOINT state_version")
+                    try:
+                        metadata, blob_exists, keyframe_version = self._write_version(
+                            conn, heads, state_data, graph_id, thread_id, state_type, checksum, powershell_origin
+                        )
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO state_version")
+                        conn.execute("RELEASE state_version")
+                        logger.error(f"Failed to save state version for {graph_id}/{thread_id}: {e}")
+                        results.append(e)
+                        continue
+                    
+                    conn.execute("RELEASE state_version")
+                    results.append(metadata)
+                    if keyframe_version is not None:
+                        heads[(graph_id, thread_id)] = (metadata.version, keyframe_version, state_data)
+                        written += 1
+                        reused += blob_exists
+                conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Failed to save batch of {len(versions)} state versions: {e}")
+            return [e] * len(versions)
+        
+        self._versions_written += written
+        self._blobs_reused += reused
+        for (graph_id, thread_id), (version, keyframe_version, state) in heads.items():
+            self._remember_head(
+                graph_id, thread_id, version, keyframe_version, copy.deepcopy(state) if copy_states else state
+            )
+        logger.info(f"Saved batch of {written} state versions ({len(versions) - written} unchanged or failed)")
+        return results
+    
+    def _write_version(self,
+                       conn: sqlite3.Connection,
+                       heads: Dict[Tuple[str, str], Tuple[int, int, Dict[str, Any]]],
+                       state_data: Dict[str, Any],
+                       graph_id: str,
+                       thread_id: str,
+                       state_type: StateType,
+                       checksum: str,
+                       powershell_origin: bool) -> Tuple[StateMetadata, bool, Optional[int]]:
+        """
+        Write the next version of a thread inside the caller's write transaction
+        
+        Returns:
+            Tuple of (metadata, whether an existing blob was reused, keyframe
+            version, or None if the state was unchanged and nothing was written)
+        """
+        latest = self._latest(conn, graph_id, thread_id)
+        if self._matches_latest(conn, heads, graph_id, thread_id, latest, checksum, state_data):
+            return self._unchanged(conn, latest), False, None
+        version = latest[0] + 1 if latest is not None else 1
+        
+        # Checksums are truncated, so a blob is only reused if it holds this state;
+        # a state whose checksum is taken by another is stored inline instead
+        blob = conn.execute(
+            "SELECT state_data, format FROM state_blobs WHERE checksum = ?", (checksum,)
+        ).fetchone()
+        blob_exists = blob is not None and _same_value(json.loads(decode_state_payload(*blob)), state_data)
+        blob_collision = blob is not None and not blob_exists
+        if blob_collision:
+            logger.warning(f"Checksum {checksum} collides with a different stored state; storing inline")
+        
+        encoding, payload, payload_format, keyframe_version = "full", None, "json", version
+        state_json = None
+        if not blob_exists and latest is not None and self.keyframe_interval > 1:
+            head = heads.get((graph_id, thread_id))
+            if head is None or head[0] != latest[0]:
+                head = self._head(conn, graph_id, thread_id, latest[0])
+            if head is not None and version - head[1] < self.keyframe_interval:
+                state_json = json.dumps(state_data, ensure_ascii=False)
+                delta_json = json.dumps(diff_states(head[2], state_data), ensure_ascii=False)
+                if len(delta_json) < len(state_json):
+                    encoding, keyframe_version = "delta", head[1]
+                    payload, payload_format = self._encode(delta_json)
+        
+        now = datetime.now().isoformat()
+        if encoding == "full" and blob_collision:
+            payload, payload_format = self._encode(state_json or json.dumps(state_data, ensure_ascii=False))
+        elif encoding == "full" and not blob_exists:
+            state_json = state_json or json.dumps(state_data, ensure_ascii=False)
+            blob_payload, blob_format = self._encode(state_json)
+            conn.execute("""
+                INSERT INTO state_blobs (checksum, state_data, size, created_at, format)
+                VALUES (?, ?, ?, ?, ?)
+            """, (checksum, blob_payload, len(state_json), now, blob_format))
+        
+        metadata = StateMetadata(
+            state_id=version_state_id(graph_id, thread_id, version),
+            graph_id=graph_id,
+            thread_id=thread_id,
+            state_type=state_type,
+            version=version,
+            created_at=now,
+            last_modified=now,
+            checksum=checksum,
+            powershell_origin=powershell_origin
+        )
+        metadata_dict = asdict(metadata)
+        metadata_dict['state_type'] = state_type.value
+        
+        conn.execute("""
+            INSERT INTO state_snapshots 
+            (state_id, graph_id, thread_id, state_type, version, 
+             state_data, metadata, created_at, last_modified, encoding, checksum, format)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            metadata.state_id,
+            graph_id,
+            thread_id,
+            state_type.value,
+            version,
+            payload,
+            json.dumps(metadata_dict, ensure_ascii=False),
+            now,
+            now,
+            encoding,
+            checksum,
+            payload_format
+        ))
+        logger.debug(f"State version written: {metadata.state_id} ({encoding})")
+        return metadata, blob_exists, keyframe_version
+    
+    @staticmethod
+    def _latest(conn: sqlite3.Connection, graph_id: str, thread_id: str) -> Optional[Tuple[int, str, str, str]]:
+        """(version, checksum, state_id, last_modified) of a thread's latest version, from the index alone"""
+        return conn.execute("""
+            SELECT version, checksum, state_id, last_modified FROM state_snapshots 
+            WHERE graph_id = ? AND thread_id = ?
+            ORDER BY version DESC LIMIT 1
+        """, (graph_id, thread_id)).fetchone()
+    
+    def _matches_latest(self,
+                        conn: sqlite3.Connection,
+                        heads: Dict[Tuple[str, str], Tuple[int, int, Dict[str, Any]]],
+                        graph_id: str,
+                        thread_id: str,
+                        latest: Optional[Tuple[int, str, str, str]],
+                        checksum: str,
+                        state_data: Dict[str, Any]) -> bool:
+        """Whether a state equals its thread's latest version; a checksum match is confirmed on the state"""
+        if latest is None or latest[1] != checksum:
+            return False
+        head = heads.get((graph_id, thread_id))
+        if head is None or head[0] != latest[0]:
+            head = self._head(conn, graph_id, thread_id, latest[0])
+        return head is not None and _same_value(head[2], state_data)
+    
+    def _unchanged(self, conn: sqlite3.Connection, latest: Tuple[int, str, str, str]) -> StateMetadata:
+        self._writes_skipped += 1
+        metadata = json.loads(conn.execute(
+            "SELECT metadata FROM state_snapshots WHERE state_id = ?", (latest[2],)
+        ).fetchone()[0])
+        metadata['state_type'] = StateType(metadata['state_type'])
+        logger.debug(f"State unchanged since {metadata['state_id']}, not saved")
+        return StateMetadata(**metadata)
+    
+    def load_state_version(self, 
+                           graph_id: str, 
+                           thread_id: str, 
+                           version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Load one version of a thread's state
+        
+        Args:
+            graph_id: Graph the thread belongs to
+            thread_id: Thread identifier
+            version: Version to rebuild, or None for the latest
+            
+        Returns:
+            State data and metadata, or None if the version does not exist
+        """
+        self._settle(graph_id, thread_id)
+        try:
+            with self.pool.connection() as conn:
+                if version is None:
+                    row = conn.execute("""
+                        SELECT version, metadata FROM state_snapshots 
+                        WHERE graph_id = ? AND thread_id = ?
+                        ORDER BY version DESC LIMIT 1
+                    """, (graph_id, thread_id)).fetchone()
+                else:
+                    row = conn.execute("""
+                        SELECT version, metadata FROM state_snapshots 
+                        WHERE graph_id = ? AND thread_id = ? AND version = ?
+                        ORDER BY state_id DESC LIMIT 1
+                    """, (graph_id, thread_id, version)).fetchone()
+                if row is None:
+                    return None
+                
+                head = self._head(conn, graph_id, thread_id, row[0])
+            
+            return {
+                "state": copy.deepcopy(head[2]),
+                "metadata": json.loads(row[1])
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to load state version: {e}")
+            raise
+    
+    def latest_snapshot(self, graph_id: str, thread_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest version of a thread
+        
+        One seek on the covering index finds the latest version; its state
+        comes from the head cache unless another writer has moved the thread
+        on, in which case it is rebuilt and cached.
+        
+        Args:
+            graph_id: Graph the thread belongs to
+            thread_id: Thread identifier
+            
+        Returns:
+            state_id, version, last_modified and state, or None if the thread has no snapshots
+        """
+        self._settle(graph_id, thread_id)
+        with self.pool.connection() as conn:
+            latest = self._latest(conn, graph_id, thread_id)
+            if latest is None:
+                return None
+            head = self._head(conn, graph_id, thread_id, latest[0])
+        
+        if head is None:
+            # Deleted between the two reads
+            return None
+        self._remember_head(graph_id, thread_id, *head)
+        return {
+            "state_id": latest[2],
+            "version": latest[0],
+            "last_modified": latest[3],
+            "state": copy.deepcopy(head[2])
+        }
+    
+    def state_at(self, 
+                 graph_id: str, 
+                 thread_id: str, 
+                 timestamp: Union[str, int, float, datetime]) -> Optional[Dict[str, Any]]:
+        """
+        A thread's state as of a point in time
+        
+        One seek on idx_state_thread_time finds the last snapshot modified at
+        or before the timestamp. A full snapshot is read from that row itself;
+        a delta is rebuilt from the nearest keyframe.
+        
+        Args:
+            graph_id: Graph the thread belongs to
+            thread_id: Thread identifier
+            timestamp: Point in time, in any form to_snapshot_time accepts
+            
+        Returns:
+            state_id, version, last_modified and state, or None if the thread
+            had no version yet
+        """
+        as_of = to_snapshot_time(timestamp)
+        self._settle(graph_id, thread_id)
+        with self.pool.connection() as conn:
+            row = conn.execute("""
+                SELECT version, state_id, last_modified, encoding FROM state_snapshots 
+                WHERE graph_id = ? AND thread_id = ? AND last_modified <= ?
+                ORDER BY last_modified DESC, version DESC LIMIT 1
+            """, (graph_id, thread_id, as_of)).fetchone()
+            if row is None:
+                return None
+            
+            if row[3] == "full":
+                # By state_id, in case other rows of the thread share its version
+                full = conn.execute("""
+                    SELECT COALESCE(s.state_data, b.state_data),
+                           CASE WHEN s.state_data IS NULL THEN b.format ELSE s.format END
+                    FROM state_snapshots s
+                    LEFT JOIN state_blobs b ON s.state_data IS NULL AND b.checksum = s.checksum
+                    WHERE s.state_id = ?
+                """, (row[1],)).fetchone()
+                state = json.loads(decode_state_payload(*full)) if full else None
+            else:
+                head = self._head(conn, graph_id, thread_id, row[0])
+                state = copy.deepcopy(head[2]) if head else None
+        
+        if state is None:
+            # Deleted between the two reads
+            return None
+        return {
+            "state_id": row[1],
+            "version": row[0],
+            "last_modified": row[2],
+            "state": state
+        }
+    
+    def iter_state_history(self, 
+                           graph_id: str, 
+                           thread_id: str,
+                           since: Optional[Union[str, int, float, datetime]] = None,
+                           until: Optional[Union[str, int, float, datetime]] = None,
+                           page_size: int = 256) -> Iterator[Dict[str, Any]]:
+        """
+        Each version of a thread modified within a time range, oldest first
+        
+        States are rebuilt incrementally from the keyframe before the range,
+        applying each delta once, and rows are read in pages so no connection
+        is held while the caller consumes them.
+        
+        Args:
+            graph_id: Graph the thread belongs to
+            thread_id: Thread identifier
+            since: Earliest last_modified included, or None for the first version
+            until: Latest last_modified included, or None for the latest version
+            page_size: Rows read per query
+            
+        Yields:
+            state_id, version, last_modified and state of each version
+        """
+        since_key = to_snapshot_time(since) if since is not None else ""
+        until_key = to_snapshot_time(until) if until is not None else "\uffff"
+        
+        self._settle(graph_id, thread_id)
+        with self.pool.connection() as conn:
+            first, last = conn.execute("""
+                SELECT MIN(version), MAX(version) FROM state_snapshots 
+                WHERE graph_id = ? AND thread_id = ? AND last_modified >= ? AND last_modified <= ?
+            """, (graph_id, thread_id, since_key, until_key)).fetchone()
+            if first is None:
+                return
+            keyframe = conn.execute("""
+                SELECT version FROM state_snapshots 
+                WHERE graph_id = ? AND thread_id = ? AND version <= ? AND encoding = 'full'
+                ORDER BY version DESC LIMIT 1
+            """, (graph_id, thread_id, first)).fetchone()
+        
+        state = None
+        cursor = (keyframe[0] if keyframe else 0, "")
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute("""
+                    SELECT s.version, s.state_id, s.last_modified, s.encoding, 
+                           COALESCE(s.state_data, b.state_data),
+                           CASE WHEN s.state_data IS NULL THEN b.format ELSE s.format END
+                    FROM state_snapshots s
+                    LEFT JOIN state_blobs b ON s.state_data IS NULL AND b.checksum = s.checksum
+                    WHERE s.graph_id = ? AND s.thread_id = ? AND (s.version, s.state_id) > (?, ?) 
+                          AND s.version <= ?
+                    ORDER BY s.version, s.state_id
+                    LIMIT ?
+                """, (graph_id, thread_id, *cursor, last, max(1, page_size))).fetchall()
+            if not rows:
+                return
+            
+            for version, state_id, last_modified, encoding, data, payload_format in rows:
+                data = decode_state_payload(data, payload_format)
+                if encoding == "full":
+                    state = json.loads(data)
+                elif state is None:
+                    raise StateSerializationError(
+                        f"No keyframe before version {version} of {graph_id}/{thread_id}"
+                    )
+                else:
+                    apply_state_patch(state, json.loads(data))
+                
+                if version >= first and since_key <= last_modified <= until_key:
+                    yield {
+                        "state_id": state_id,
+                        "version": version,
+                        "last_modified": last_modified,
+                        "state": copy.deepcopy(state)
+                    }
+            cursor = rows[-1][:2]
+    
+    def _head(self, 
+              conn: sqlite3.Connection, 
+              graph_id: str, 
+              thread_id: str, 
+              version: int) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        """Cached or rebuilt (version, keyframe version, state); callers must not modify the state"""
+        key = (graph_id, thread_id)
+        with self._heads_lock:
+            head = self._heads.get(key)
+            if head is not None and head[0] == version:
+                self._heads.move_to_end(key)
+                self._head_hits += 1
+                return head
+            self._head_misses += 1
+        
+        return self._rebuild(conn, graph_id, thread_id, version)
+    
+    def _rebuild(self, 
+                 conn: sqlite3.Connection, 
+                 graph_id: str, 
+                 thread_id: str, 
+                 version: int) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+        """Rebuild a version from its nearest keyframe and the deltas after it"""
+        rows = conn.execute("""
+            SELECT s.version, s.encoding, COALESCE(s.state_data, b.state_data),
+                   CASE WHEN s.state_data IS NULL THEN b.format ELSE s.format END
+            FROM state_snapshots s
+            LEFT JOIN state_blobs b ON s.state_data IS NULL AND b.checksum = s.checksum
+            WHERE s.graph_id = ? AND s.thread_id = ? AND s.version <= ? AND s.version >= COALESCE((
+                SELECT version FROM state_snapshots 
+                WHERE graph_id = ? AND thread_id = ? AND version <= ? AND encoding = 'full'
+                ORDER BY version DESC LIMIT 1
+            ), 0)
+            ORDER BY s.version, s.state_id
+        """, (graph_id, thread_id, version, graph_id, thread_id, version)).fetchall()
+        
+        if not rows or rows[-1][0] != version:
+            return None
+        
+        state, keyframe_version = None, None
+        for row_version, encoding, data, payload_format in rows:
+            data = decode_state_payload(data, payload_format)
+            if encoding == "full":
+                state, keyframe_version = json.loads(data), row_version
+            elif state is None:
+                raise StateSerializationError(
+                    f"No keyframe before version {row_version} of {graph_id}/{thread_id}"
+                )
+            else:
+                apply_state_patch(state, json.loads(data))
+        
+        return version, keyframe_version, state
+    
+    def _remember_head(self, 
+                       graph_id: str, 
+                       thread_id: str, 
+                       version: int, 
+                       keyframe_version: int, 
+                       state: Dict[str, Any]):
+        if self.head_cache_size == 0:
+            return
+        key = (graph_id, thread_id)
+        with self._heads_lock:
+            current = self._heads.get(key)
+            if current is not None and current[0] > version:
+                return
+            self._heads[key] = (version, keyframe_version, state)
+            self._heads.move_to_end(key)
+            while len(self._heads) > self.head_cache_size:
+                self._heads.popitem(last=False)
+    
+    def _forget_head(self, graph_id: str, thread_id: str):
+        with self._heads_lock:
+            self._heads.pop((graph_id, thread_id), None)
+    
+    def compress_stored(self, batch_size: int = 500, vacuum: bool = False) -> Dict[str, Any]:
+        """
+        Compress plain JSON payloads written before compression was enabled
+        
+        Rows are rewritten in short batches so writers are not blocked for long.
+        
+        Args:
+            batch_size: Rows rewritten per transaction
+            vacuum: Run VACUUM afterwards to return the freed pages to the filesystem
+            
+        Returns:
+            Rows examined and compressed, and bytes saved, per table
+        """
+        if self.compression == "none":
+            raise ValueError("Compression is disabled for this store")
+        
+        report = {"compression": self.compression}
+        with self.pool.connection() as conn:
+            for table in ("state_snapshots", "state_blobs"):
+                examined = compressed = bytes_saved = 0
+                last_rowid = 0
+                while True:
+                    rows = conn.execute(f"""
+                        SELECT rowid, state_data FROM {table}
+                        WHERE rowid > ? AND format = 'json' AND state_data IS NOT NULL
+                          AND length(state_data) >= ?
+                        ORDER BY rowid LIMIT ?
+                    """, (last_rowid, self.compress_min_bytes, batch_size)).fetchall()
+                    if not rows:
+                        break
+                    
+                    with conn:
+                        for rowid, data in rows:
+                            payload, payload_format = self._encode(data)
+                            if payload_format == "json":
+                                continue
+                            conn.execute(
+                                f"UPDATE {table} SET state_data = ?, format = ? WHERE rowid = ?",
+                                (payload, payload_format, rowid)
+                            )
+                            compressed += 1
+                            bytes_saved += len(data.encode("utf-8")) - len(payload)
+                    
+                    examined += len(rows)
+                    last_rowid = rows[-1][0]
+                
+                report[table] = {"examined": examined, "compressed": compressed, "bytes_saved": bytes_saved}
+            
+            if vacuum:
+                conn.execute("VACUUM")
+        
+        logger.info(f"Compressed stored states: {report}")
+        return report
+    
+    def statistics(self) -> Dict[str, Any]:
+        """
+        Snapshot counts by graph, thread and type, computed in SQL
+        
+        Read from the maintained state_stats totals when enabled, otherwise
+        aggregated over the snapshot table's indexes.
+        
+        Returns:
+            Totals, distinct graph and thread counts, counts per state type,
+            latest modification time and blob store size
+        """
+        with self.pool.connection() as conn:
+            last_activity = conn.execute("SELECT MAX(last_modified) FROM state_snapshots").fetchone()[0]
+            
+            if self.maintain_stats:
+                totals: Dict[str, Dict[str, int]] = {}
+                for kind, key, value in conn.execute("""
+                    SELECT kind, key, value FROM state_stats 
+                    WHERE kind IN ('total', 'distinct', 'type', 'blobs')
+                """):
+                    totals.setdefault(kind, {})[key] = value
+                total = totals.get("total", {}).get("snapshots", 0)
+                distinct = totals.get("distinct", {})
+                unique_graphs, unique_threads = distinct.get("graph", 0), distinct.get("thread", 0)
+                state_types = totals.get("type", {})
+                blobs = totals.get("blobs", {})
+            else:
+                total, unique_graphs, unique_threads = conn.execute("""
+                    SELECT COUNT(*), COUNT(DISTINCT graph_id), COUNT(DISTINCT thread_id) 
+                    FROM state_snapshots
+                """).fetchone()
+                state_types = dict(conn.execute(
+                    "SELECT state_type, COUNT(*) FROM state_snapshots GROUP BY state_type"
+                ).fetchall())
+                count, size, stored = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(state_data)), 0) FROM state_blobs"
+                ).fetchone()
+                blobs = {"count": count, "bytes": size, "stored_bytes": stored}
+        
+        return {
+            "total_snapshots": total,
+            "unique_graphs": unique_graphs,
+            "unique_threads": unique_threads,
+            "state_types": state_types,
+            "last_activity": last_activity,
+            "blobs": {
+                "count": blobs.get("count", 0),
+                "bytes": blobs.get("bytes", 0),
+                "stored_bytes": blobs.get("stored_bytes", 0)
+            },
+            "maintained": self.maintain_stats
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        """Write counters, blob store size and pool state"""
+        blobs = self.statistics()["blobs"]
+        return {
+            "versions_written": self._versions_written,
+            "writes_skipped": self._writes_skipped,
+            "blobs_reused": self._blobs_reused,
+            "blobs": blobs["count"],
+            "blob_bytes": blobs["bytes"],
+            "blob_stored_bytes": blobs["stored_bytes"],
+            "keyframe_interval": self.keyframe_interval,
+            "compression": self.compression,
+            "compress_min_bytes": self.compress_min_bytes,
+            "cached_heads": len(self._heads),
+            "head_cache_hits": self._head_hits,
+            "head_cache_misses": self._head_misses,
+            "write_queue": self.write_queue.stats() if self.write_queue is not None else None,
+            "pool": self.pool.stats()
+        }
     
     def list_snapshots(self, 
                       graph_id: Optional[str] = None, 
@@ -377,10 +1825,10 @@ class StateCheckpointManager:
             List of snapshot metadata
         """
         logger.debug(f"Listing snapshots - graph: {graph_id}, thread: {thread_id}")
+        self._settle(graph_id, thread_id)
         
-        conn = sqlite3.connect(self.db_path)
         try:
-            query = "SELECT state_id, graph_id, thread_id, state_type, version, created_at, last_modified FROM state_snapshots"
+            query = "SELECT state_id, graph_id, thread_id, state_type, version, created_at, last_modified, encoding FROM state_snapshots"
             params = []
             
             conditions = []
@@ -396,10 +1844,11 @@ class StateCheckpointManager:
             
             query += " ORDER BY last_modified DESC"
             
-            cursor = conn.execute(query, params)
-            snapshots = []
+            with self.pool.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
             
-            for row in cursor.fetchall():
+            snapshots = []
+            for row in rows:
                 snapshots.append({
                     "state_id": row[0],
                     "graph_id": row[1],
@@ -407,7 +1856,8 @@ class StateCheckpointManager:
                     "state_type": row[3],
                     "version": row[4],
                     "created_at": row[5],
-                    "last_modified": row[6]
+                    "last_modified": row[6],
+                    "encoding": row[7]
                 })
             
             logger.debug(f"Found {len(snapshots)} snapshots")
@@ -416,24 +1866,283 @@ class StateCheckpointManager:
         except Exception as e:
             logger.error(f"Failed to list snapshots: {e}")
             raise
-        finally:
-            conn.close()
+
+@dataclass
+class _QueuedVersion:
+    """A state version waiting for the write-behind writer"""
+    ticket: int
+    queued_at: float
+    state_data: Dict[str, Any]
+    graph_id: str
+    thread_id: str
+    state_type: StateType
+    checksum: str
+    powershell_origin: bool
+
+class StateWriteQueue:
+    """
+    Write-behind queue for state versions
+    
+    Versions are queued and written by a background thread in batches, one
+    transaction per batch, once max_batch versions are waiting or the oldest
+    has waited max_delay_ms. Each submit gets a ticket; tickets are written in
+    order, so a thread's versions keep their order. A durable submit, flush()
+    and wait_for() wait until everything queued before them is committed, for
+    at most wait_timeout seconds; close() drains the queue, and runs at
+    interpreter exit if the owner never called it.
+    """
+    
+    def __init__(self, 
+                 checkpoint_manager: "StateCheckpointManager",
+                 max_batch: int = 256,
+                 max_delay_ms: float = 50,
+                 max_pending: int = 10000,
+                 wait_timeout: float = 30):
+        """
+        Args:
+            checkpoint_manager: Store the batches are written to
+            max_batch: Versions written per transaction
+            max_delay_ms: Longest a queued version waits for its batch to fill
+            max_pending: Queued versions beyond which submit blocks
+            wait_timeout: Default longest wait for queue space or a commit
+        """
+        self.checkpoint_manager = checkpoint_manager
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay_ms) / 1000
+        self.max_pending = max(self.max_batch, max_pending)
+        self.wait_timeout = wait_timeout
+        self._pending: "deque[_QueuedVersion]" = deque()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._processed = 0
+        self._flush_to = 0
+        self._closing = False
+        # (graph_id, thread_id) -> last ticket queued for the thread
+        self._thread_tickets: Dict[Tuple[str, str], int] = {}
+        # ticket -> result, for durable submits waiting on their write
+        self._awaited: Dict[int, Any] = {}
+        self._batches = 0
+        self._written = 0
+        self._failed = 0
+        self._thread = threading.Thread(target=self._run, name="state-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, 
+               state_data: Dict[str, Any],
+               graph_id: str,
+               thread_id: str,
+               state_type: StateType,
+               checksum: str,
+               powershell_origin: bool = True,
+               durable: bool = False,
+               timeout: Optional[float] = None) -> Optional[StateMetadata]:
+        """
+        Queue a state as the next version of its thread
+        
+        The state is copied, so the caller may keep modifying its own.
+        
+        Args:
+            durable: Wait until the version (and everything queued before it)
+                is committed
+            timeout: Longest to wait for queue space and for a durable write,
+                or None for wait_timeout
+            
+        Returns:
+            Metadata of the saved version for durable submits, else None
+            
+        Raises:
+            StateSerializationError: If the queue is closed or stays full, or a
+                durable write failed or timed out
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        state_data = copy.deepcopy(state_data)
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._pending) < self.max_pending or self._closing, timeout):
+                raise StateSerializationError(f"State write queue is full ({self.max_pending} pending)")
+            if self._closing:
+                raise StateSerializationError("State write queue is closed")
+            
+            self._submitted += 1
+            ticket = self._submitted
+            self._pending.append(_QueuedVersion(
+                ticket, time.monotonic(), state_data, graph_id, thread_id, state_type, checksum, powershell_origin
+            ))
+            self._thread_tickets[(graph_id, thread_id)] = ticket
+            if not durable:
+                if len(self._pending) >= self.max_batch:
+                    self._cond.notify_all()
+                return None
+            
+            self._awaited[ticket] = None
+            self._flush_to = max(self._flush_to, ticket)
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: self._processed >= ticket, timeout):
+                self._awaited.pop(ticket, None)
+                raise StateSerializationError(f"Durable state write timed out for {graph_id}/{thread_id}")
+            result = self._awaited.pop(ticket)
+        
+        if isinstance(result, Exception):
+            raise StateSerializationError(f"Durable state write failed: {result}")
+        return result
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is committed; False on timeout"""
+        return self.wait_for(timeout=timeout)
+    
+    def wait_for(self, 
+                 graph_id: Optional[str] = None, 
+                 thread_id: Optional[str] = None, 
+                 timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the queued versions of the matching threads are committed,
+        so reads see them; None matches any graph or thread
+        
+        Returns:
+            False if they were not committed within timeout (default wait_timeout)
+        """
+        with self._cond:
+            if graph_id is not None and thread_id is not None:
+                target = self._thread_tickets.get((graph_id, thread_id), 0)
+            elif graph_id is not None or thread_id is not None:
+                target = max((ticket for (graph, thread), ticket in self._thread_tickets.items() 
+                              if graph_id in (None, graph) and thread_id in (None, thread)), default=0)
+            else:
+                target = self._submitted
+            if self._processed >= target:
+                return True
+            
+            self._flush_to = max(self._flush_to, target)
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: self._processed >= target, self.wait_timeout if timeout is None else timeout
+            )
+    
+    def close(self, timeout: Optional[float] = None):
+        """Write everything still queued and stop the writer"""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+        logger.info(f"State write queue closed after {self._written} versions in {self._batches} batches")
+    
+    def _next_batch(self) -> List[_QueuedVersion]:
+        """Block until a batch is due, then take it; empty once closed and drained"""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._closing:
+                        return []
+                    self._cond.wait()
+                    continue
+                
+                due = self._pending[0].queued_at + self.max_delay - time.monotonic()
+                if (due <= 0 
+                        or len(self._pending) >= self.max_batch 
+                        or self._flush_to >= self._pending[0].ticket 
+                        or self._closing):
+                    break
+                self._cond.wait(due)
+            
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            # Room for submitters blocked on a full queue
+            self._cond.notify_all()
+            return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            
+            results = self.checkpoint_manager.append_state_versions([
+                (item.state_data, item.graph_id, item.thread_id, item.state_type, item.checksum, 
+                 item.powershell_origin)
+                for item in batch
+            ], copy_states=False)
+            
+            failed = sum(1 for result in results if isinstance(result, Exception))
+            with self._cond:
+                for item, result in zip(batch, results):
+                    if item.ticket in self._awaited:
+                        self._awaited[item.ticket] = result
+                    key = (item.graph_id, item.thread_id)
+                    if self._thread_tickets.get(key) == item.ticket:
+                        del self._thread_tickets[key]
+                self._processed = batch[-1].ticket
+                self._batches += 1
+                self._written += len(batch) - failed
+                self._failed += failed
+                self._cond.notify_all()
+            
+            if failed:
+                logger.error(f"Write-behind batch lost {failed} of {len(batch)} state versions")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, thresholds and write counters"""
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "submitted": self._submitted,
+                "batches": self._batches,
+                "written": self._written,
+                "failed": self._failed,
+                "max_batch": self.max_batch,
+                "max_delay_ms": self.max_delay * 1000,
+                "closed": self._closing
+            }
 
 class LangGraphStateManager:
     """Main state management interface for LangGraph-PowerShell bridge"""
     
-    def __init__(self, db_path: str = "langgraph_bridge.db"):
+    def __init__(self, 
+                 db_path: str = "langgraph_bridge.db", 
+                 pool_size: int = 4,
+                 keyframe_interval: int = 10,
+                 compression: str = "auto",
+                 compress_min_bytes: int = 1024,
+                 maintain_stats: bool = True,
+                 write_behind: bool = False,
+                 write_batch_size: int = 256,
+                 write_delay_ms: float = 50,
+                 write_timeout: float = 30):
         self.converter = PowerShellStateConverter()
         self.validator = StateValidator()
-        self.checkpoint_manager = StateCheckpointManager(db_path)
+        self.checkpoint_manager = StateCheckpointManager(
+            db_path, 
+            pool_size, 
+            keyframe_interval=keyframe_interval,
+            compression=compression,
+            compress_min_bytes=compress_min_bytes,
+            maintain_stats=maintain_stats,
+            write_behind=write_behind,
+            write_batch_size=write_batch_size,
+            write_delay_ms=write_delay_ms,
+            write_timeout=write_timeout
+        )
         
         logger.info("LangGraph State Manager initialized")
     
+    def close(self):
+        """Write queued versions and release the snapshot store's connections"""
+        self.checkpoint_manager.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     def process_powershell_state(self, 
                                 ps_state: Dict[str, Any], 
                                 state_type: StateType,
                                 graph_id: str,
-                                thread_id: Optional[str] = None) -> Dict[str, Any]:
+                                thread_id: Optional[str] = None,
+                                durable: bool = False) -> Dict[str, Any]:
         """
         Process state data from PowerShell
         
@@ -442,10 +2151,33 @@ class LangGraphStateManager:
             state_type: Type of state processing
             graph_id: Graph ID for context
             thread_id: Thread ID for context
+            durable: Commit the version before returning even in write-behind mode
             
         Returns:
             Processed and validated state
         """
+        return self.record_powershell_state(ps_state, state_type, graph_id, thread_id, durable)[0]
+    
+    def record_powershell_state(self, 
+                                ps_state: Dict[str, Any], 
+                                state_type: StateType,
+                                graph_id: str,
+                                thread_id: Optional[str] = None,
+                                durable: bool = False) -> Tuple[Dict[str, Any], Optional[StateMetadata]]:
+        """
+        Process state data from PowerShell and report the version it became
+        
+        Args:
+            ps_state: State data from PowerShell
+            state_type: Type of state processing
+            graph_id: Graph ID for context
+            thread_id: Thread ID for context
+            durable: Commit the version before returning even in write-behind mode
+            
+        Returns:
+            Tuple of (processed state, metadata of the saved version); the
+            metadata is None without a thread_id or while the version is queued
+        """
         logger.info(f"Processing PowerShell state: {state_type.value}")
         
         try:
@@ -455,24 +2187,20 @@ class LangGraphStateManager:
             # Validate state
             self.validator.validate_state(python_state, state_type)
             
-            # Create snapshot if thread_id provided
+            # Record the next version of the thread if thread_id provided
+            metadata = None
             if thread_id:
-                metadata = StateMetadata(
-                    state_id=f"{graph_id}_{thread_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                    graph_id=graph_id,
-                    thread_id=thread_id,
-                    state_type=state_type,
-                    version=1,
-                    created_at=datetime.now().isoformat(),
-                    last_modified=datetime.now().isoformat(),
-                    checksum=self._calculate_checksum(python_state),
-                    powershell_origin=True
+                metadata = self.checkpoint_manager.queue_state_version(
+                    python_state,
+                    graph_id,
+                    thread_id,
+                    state_type,
+                    self._calculate_checksum(python_state),
+                    durable=durable
                 )
-                
-                self.checkpoint_manager.save_state_snapshot(python_state, metadata)
             
             logger.info("PowerShell state processed successfully")
-            return python_state
+            return python_state, metadata
             
         except Exception as e:
             logger.error(f"Failed to process PowerShell state: {e}")
@@ -528,29 +2256,24 @@ class LangGraphStateManager:
         logger.info(f"Synchronizing checkpoint: {graph_id}/{thread_id}")
         
         try:
-            # Get latest snapshots for this thread
-            snapshots = self.checkpoint_manager.list_snapshots(graph_id, thread_id)
+            # Get the latest snapshot for this thread (cached between saves)
+            latest_snapshot = self.checkpoint_manager.latest_snapshot(graph_id, thread_id)
             
-            if snapshots:
-                latest_snapshot = snapshots[0]  # Most recent
+            if latest_snapshot:
                 logger.debug(f"Found latest snapshot: {latest_snapshot['state_id']}")
                 
-                # Load the snapshot data
-                snapshot_data = self.checkpoint_manager.load_state_snapshot(latest_snapshot['state_id'])
+                # Merge with current state (current takes precedence)
+                merged_state = {**latest_snapshot['state'], **current_state}
                 
-                if snapshot_data:
-                    # Merge with current state (current takes precedence)
-                    merged_state = {**snapshot_data['state'], **current_state}
-                    
-                    # Add checkpoint metadata
-                    merged_state["__checkpoint_info"] = {
-                        "last_snapshot_id": latest_snapshot['state_id'],
-                        "last_snapshot_time": latest_snapshot['last_modified'],
-                        "synchronized_at": datetime.now().isoformat()
-                    }
-                    
-                    logger.info("State synchronized with checkpoint")
-                    return merged_state
+                # Add checkpoint metadata
+                merged_state["__checkpoint_info"] = {
+                    "last_snapshot_id": latest_snapshot['state_id'],
+                    "last_snapshot_time": latest_snapshot['last_modified'],
+                    "synchronized_at": datetime.now().isoformat()
+                }
+                
+                logger.info("State synchronized with checkpoint")
+                return merged_state
             
             # No checkpoint found, return current state
             current_state["__checkpoint_info"] = {
@@ -579,25 +2302,8 @@ class LangGraphStateManager:
     def get_state_statistics(self) -> Dict[str, Any]:
         """Get statistics about managed states"""
         try:
-            snapshots = self.checkpoint_manager.list_snapshots()
-            
-            stats = {
-                "total_snapshots": len(snapshots),
-                "unique_graphs": len(set(s["graph_id"] for s in snapshots)),
-                "unique_threads": len(set(s["thread_id"] for s in snapshots)),
-                "state_types": {},
-                "last_activity": None
-            }
-            
-            # Count by state type
-            for snapshot in snapshots:
-                state_type = snapshot["state_type"]
-                stats["state_types"][state_type] = stats["state_types"].get(state_type, 0) + 1
-            
-            # Get last activity
-            if snapshots:
-                stats["last_activity"] = snapshots[0]["last_modified"]
-            
+            stats = self.checkpoint_manager.statistics()
+            stats["storage"] = self.checkpoint_manager.stats()
             return stats
             
         except Exception as e:
@@ -605,16 +2311,58 @@ class LangGraphStateManager:
             return {"error": str(e)}
 
 # Main interface functions for REST API integration
-def create_state_manager(db_path: str = "langgraph_bridge.db") -> LangGraphStateManager:
+def create_state_manager(db_path: str = "langgraph_bridge.db", 
+                         pool_size: int = 4, 
+                         keyframe_interval: int = 10,
+                         compression: str = "auto",
+                         compress_min_bytes: int = 1024,
+                         maintain_stats: bool = True,
+                         write_behind: bool = False,
+                         write_batch_size: int = 256,
+                         write_delay_ms: float = 50,
+                         write_timeout: float = 30) -> LangGraphStateManager:
     """Create a state manager instance"""
-    return LangGraphStateManager(db_path)
+    return LangGraphStateManager(
+        db_path, pool_size, keyframe_interval, compression, compress_min_bytes, maintain_stats,
+        write_behind, write_batch_size, write_delay_ms, write_timeout
+    )
 
 def validate_powershell_state(state_data: Dict[str, Any], state_type: str) -> bool:
     """Validate PowerShell state data"""
     try:
-        validator = StateValidator()
         state_type_enum = StateType(state_type)
-        return validator.validate_state(state_data, state_type_enum)
+        return StateValidator.validate_state(state_data, state_type_enum)
     except Exception as e:
         logger.error(f"State validation failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def validate_state_batch(states: Iterable[Tuple[Any, str]]) -> List[Dict[str, Any]]:
+    """Validate many PowerShell states, with every error of each"""
+    return StateValidator.validate_batch(states)
+
+def load_state_schemas(path: Union[str, Path]) -> List[str]:
+    """Register custom state schemas from a JSON config file"""
+    return StateValidator.load_schemas(path)
+
+def main(argv: Optional[List[str]] = None):
+    """Maintenance commands for a state database"""
+    parser = argparse.ArgumentParser(description="LangGraph state store maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    compress = commands.add_parser("compress", help="Compress snapshots stored as plain JSON")
+    compress.add_argument("--db", default="langgraph_bridge.db", help="State database path")
+    compress.add_argument("--codec", default="auto", choices=("auto",) + STATE_CODECS[1:])
+    compress.add_argument("--min-bytes", type=int, default=1024, help="Smallest payload to compress")
+    compress.add_argument("--batch-size", type=int, default=500, help="Rows rewritten per transaction")
+    compress.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    
+    if args.command == "compress":
+        with StateCheckpointManager(args.db, compression=args.codec, compress_min_bytes=args.min_bytes) as store:
+            report = store.compress_stored(args.batch_size, args.vacuum)
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Bounded Thread Registry for the LangGraph REST Server
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+
+Keeps recently used thread records in a bounded LRU/TTL cache and writes every
+record through to SQLite; run results live only on disk and are loaded on demand.
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class ThreadRegistry:
+    """Dict-like registry of thread status records"""
+
+    def __init__(self,
+                 db_path: str,
+                 max_entries: int = 1000,
+                 ttl_seconds: float = 3600,
+                 encode: Callable[[Any], str] = None,
+                 busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._encode = encode or (lambda value: json.dumps(value, default=str))
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            timeout=busy_timeout_ms / 1000
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_tables()
+
+    def _ensure_tables(self):
+        """Ensure the thread record table exists"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS thread_records (
+                    thread_id TEXT PRIMARY KEY,
+                    graph_id TEXT,
+                    status TEXT,
+                    last_update TEXT,
+                    info TEXT NOT NULL,
+                    result TEXT
+                )
+            """)
+
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_thread_records_graph
+                ON thread_records(graph_id)
+            """)
+
+            # Retention scans finished threads by age
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_thread_records_status_update
+                ON thread_records(status, last_update)
+            """)
+        logger.debug("Thread registry tables ready")
+
+    # Cache management
+
+    def _cache_put(self, thread_id: str, info: Dict[str, Any]):
+        if self.max_entries == 0:
+            return
+        self._cache[thread_id] = (time.monotonic(), info)
+        self._cache.move_to_end(thread_id)
+        self._evict()
+
+    def _cache_get(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(thread_id)
+        if entry is None:
+            return None
+        cached_at, info = entry
+        if time.monotonic() - cached_at > self.ttl_seconds:
+            del self._cache[thread_id]
+            self._evictions += 1
+            return None
+        self._cache.move_to_end(thread_id)
+        return info
+
+    def _evict(self):
+        """Drop expired entries from the cold end and trim to capacity"""
+        now = time.monotonic()
+        while self._cache:
+            thread_id, (cached_at, _) = next(iter(self._cache.items()))
+            if len(self._cache) <= self.max_entries and now - cached_at <= self.ttl_seconds:
+                break
+            del self._cache[thread_id]
+            self._evictions += 1
+
+    def _load(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT info FROM thread_records WHERE thread_id = ?",
+            (thread_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Dict-style access
+
+    def __setitem__(self, thread_id: str, info: Dict[str, Any]):
+        info = dict(info)
+        result = info.pop('result', None)
+        info['has_result'] = 'result' in info or result is not None
+
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO thread_records
+                (thread_id, graph_id, status, last_update, info, result)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                thread_id,
+                info.get('graph_id'),
+                info.get('status'),
+                info.get('last_update'),
+                self._encode(info),
+                self._encode(result) if result is not None else None
+            ))
+            self._cache_put(thread_id, info)
+
+    def claim(self, thread_id: str, info: Dict[str, Any], stale_before: Optional[str] = None) -> bool:
+        """
+        Write a running record unless another process is already running the thread
+
+        The check and the write are one statement, so two workers sharing the
+        database cannot both claim a thread.
+
+        Args:
+            thread_id: Thread to claim
+            info: Record to write, with status 'running'
+            stale_before: ISO time before which a 'running' record is taken over,
+                as its worker is assumed to have died
+
+        Returns:
+            True if the record was written
+        """
+        info = dict(info)
+        info['has_result'] = False
+
+        with self._lock, self._conn:
+            cursor = self._conn.execute("""
+                INSERT INTO thread_records
+                (thread_id, graph_id, status, last_update, info, result)
+                VALUES (?, ?, ?, ?, ?, NULL)
+                ON CONFLICT(thread_id) DO UPDATE SET
+                    graph_id = excluded.graph_id,
+                    status = excluded.status,
+                    last_update = excluded.last_update,
+                    info = excluded.info,
+                    result = NULL
+                WHERE thread_records.status IS NOT 'running' OR thread_records.last_update < ?
+            """, (
+                thread_id,
+                info.get('graph_id'),
+                info.get('status'),
+                info.get('last_update'),
+                self._encode(info),
+                stale_before or ""
+            ))
+            claimed = cursor.rowcount == 1
+            if claimed:
+                self._cache_put(thread_id, info)
+            else:
+                # The cached record may predate the other worker's claim
+                self._cache.pop(thread_id, None)
+        return claimed
+
+    def __getitem__(self, thread_id: str) -> Dict[str, Any]:
+        info = self.get(thread_id)
+        if info is None:
+            raise KeyError(thread_id)
+        return info
+
+    def get(self, thread_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Thread record without its result, or default if unknown"""
+        with self._lock:
+            info = self._cache_get(thread_id)
+            if info is not None:
+                self._hits += 1
+                return info
+
+            self._misses += 1
+            info = self._load(thread_id)
+            if info is None:
+                return default
+            self._cache_put(thread_id, info)
+            return info
+
+    def __contains__(self, thread_id: str) -> bool:
+        return self.get(thread_id) is not None
+
+    def __delitem__(self, thread_id: str):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM thread_records WHERE thread_id = ?",
+                (thread_id,)
+            )
+            self._cache.pop(thread_id, None)
+            if cursor.rowcount == 0:
+                raise KeyError(thread_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM thread_records").fetchone()[0]
+
+    def get_result(self, thread_id: str) -> Any:
+        """Load a thread's run result from disk"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM thread_records WHERE thread_id = ?",
+                (thread_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def list_page(self,
+                  limit: int = 100,
+                  cursor: Optional[str] = None,
+                  graph_id: Optional[str] = None) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+        """
+        Page through thread records ordered by thread ID
+
+        Args:
+            limit: Maximum records to return
+            cursor: Cursor returned by the previous page
+            graph_id: Only return threads of this graph
+
+        Returns:
+            Tuple of (records keyed by thread ID, cursor for the next page or None)
+        """
+        conditions = ["thread_id > ?"]
+        params: List[Any] = [cursor or ""]
+        if graph_id:
+            conditions.append("graph_id = ?")
+            params.append(graph_id)
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT thread_id, info FROM thread_records WHERE {' AND '.join(conditions)} "
+                f"ORDER BY thread_id LIMIT ?",
+                params
+            ).fetchall()
+
+        page = rows[:limit]
+        next_cursor = page[-1][0] if len(rows) > limit else None
+        return {thread_id: json.loads(info) for thread_id, info in page}, next_cursor
+
+    def finished_before(self,
+                        cutoff: str,
+                        statuses: Iterable[str],
+                        limit: int = 10000) -> List[str]:
+        """IDs of threads in one of the given statuses last updated before the ISO cutoff"""
+        statuses = list(statuses)
+        placeholders = ", ".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT thread_id FROM thread_records WHERE status IN ({placeholders}) "
+                f"AND last_update < ? LIMIT ?",
+                statuses + [cutoff, limit]
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_many(self, thread_ids: Iterable[str]) -> int:
+        """Remove several thread records; returns how many existed"""
+        thread_ids = list(thread_ids)
+        deleted = 0
+        with self._lock:
+            for start in range(0, len(thread_ids), 500):
+                chunk = thread_ids[start:start + 500]
+                with self._conn:
+                    deleted += self._conn.execute(
+                        f"DELETE FROM thread_records WHERE thread_id IN ({', '.join('?' for _ in chunk)})",
+                        chunk
+                    ).rowcount
+                for thread_id in chunk:
+                    self._cache.pop(thread_id, None)
+        return deleted
+
+    def clear(self):
+        """Remove every thread record"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM thread_records")
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit rates"""
+        with self._lock:
+            return {
+                "cached": len(self._cache),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions
+            }
+
+    def close(self):
+        """Close the registry connection"""
+        with self._lock:
+            self._cache.clear()
+            self._conn.close()
+        logger.info(f"Thread registry closed: {self.db_path}")
@@ -0,0 +1,1012 @@
+#!/usr/bin/env python3
+"""
+LangGraph REST server tests for the PowerShell bridge
+Phase 4: Multi-Agent Orchestration - Hours 5-8: PowerShell-LangGraph Bridge
+"""
+
+import asyncio
+import json
+import time
+import sqlite3
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import langgraph_rest_server as server
+from langgraph_checkpoint_pool import CheckpointerPool, CheckpointCompactor
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Server client backed by a throwaway database"""
+    monkeypatch.setattr(server, "DB_PATH", str(tmp_path / "langgraph_bridge.db"))
+
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+def create_graph(client, graph_id, graph_type="basic"):
+    response = client.post("/graphs", json={"graph_id": graph_id, "graph_type": graph_type})
+    assert response.status_code == 200
+    return response.json()
+
+
+def execute_graph(client, graph_id, **body):
+    body.setdefault("graph_id", graph_id)
+    response = client.post(f"/graphs/{graph_id}/execute", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_execute_basic_graph(client):
+    """Basic graphs run to completion on the execution pool"""
+    create_graph(client, "basic-graph")
+    result = execute_graph(client, "basic-graph", initial_state={"counter": 2})
+
+    assert result["status"] == "completed"
+    assert result["result"]["chatbot"]["counter"] == 3
+
+    executor = client.get("/metrics/executor").json()["executor"]
+    assert executor["completed"] >= 1
+    assert executor["queue_depth"] == 0
+
+
+def test_hitl_interrupt_and_resume(client):
+    """HITL graphs pause for approval and resume with the supplied value"""
+    create_graph(client, "hitl-graph", "hitl")
+    result = execute_graph(client, "hitl-graph", initial_state={"counter": 1})
+
+    assert result["status"] == "interrupted"
+    assert result["next_nodes"] == ["approval"]
+
+    response = client.post("/graphs/hitl-graph/resume", json={
+        "graph_id": "hitl-graph",
+        "thread_id": result["thread_id"],
+        "resume_value": {"approved": True}
+    })
+    assert response.status_code == 200
+    resumed = response.json()
+    assert resumed["status"] == "completed"
+    assert resumed["result"]["result"] == "Action completed successfully"
+
+
+def test_execution_pool_reports_queue_depth():
+    """Work beyond the pool size is queued and counted"""
+    pool = server.GraphExecutionPool(max_workers=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run(time.sleep, 0.2))
+        second = asyncio.ensure_future(pool.run(time.sleep, 0.01))
+        await asyncio.sleep(0.05)
+        busy = pool.stats()
+        await asyncio.gather(first, second)
+        return busy
+
+    try:
+        busy = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert busy["running"] == 1
+    assert busy["queue_depth"] == 1
+    assert pool.stats()["completed"] == 2
+
+
+def parse_sse(body):
+    """Split a Server-Sent Events body into (event, data) pairs"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_pushes_chunks_and_interrupts(client):
+    """The stream endpoint emits each update and the interrupt payload"""
+    create_graph(client, "stream-graph", "hitl")
+    response = client.post("/graphs/stream-graph/stream", json={
+        "graph_id": "stream-graph",
+        "thread_id": "stream-thread",
+        "initial_state": {"counter": 4}
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "start"
+    assert "chunk" in names
+    assert "interrupt" in names
+    assert events[-1][0] == "end"
+    assert events[-1][1]["status"] == "interrupted"
+    assert client.get("/threads/stream-thread").json()["info"]["status"] == "interrupted"
+
+
+def test_stream_rejects_unknown_mode(client):
+    create_graph(client, "mode-graph")
+    response = client.post("/graphs/mode-graph/stream", json={
+        "graph_id": "mode-graph",
+        "stream_mode": "everything"
+    })
+    assert response.status_code == 400
+
+
+def test_graphs_share_checkpointer_pool(client):
+    """Graphs reuse the pooled WAL connections instead of opening their own"""
+    for index in range(server.CHECKPOINTER_POOL_SIZE * 3):
+        create_graph(client, f"pooled-{index}")
+
+    savers = {id(info['checkpointer']) for info in server.get_graph_registry().local_handles()}
+    assert len(savers) == server.CHECKPOINTER_POOL_SIZE
+
+    pool = server.server_state['checkpointer_pool']
+    saver = pool.acquire()
+    with saver.cursor(transaction=False) as cursor:
+        assert cursor.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    health = client.get("/health").json()
+    assert health["status"] == "healthy"
+    assert health["checkpointer_pool"]["pool_size"] == server.CHECKPOINTER_POOL_SIZE
+
+
+def test_health_does_not_wait_for_checkpoint_writers(client):
+    """The health ping uses its own connection, not the savers graph runs hold"""
+    pool = server.server_state['checkpointer_pool']
+    savers = [pool.acquire() for _ in range(server.CHECKPOINTER_POOL_SIZE)]
+    for saver in savers:
+        saver.lock.acquire()
+    try:
+        started = time.monotonic()
+        assert client.get("/health").json()["status"] == "healthy"
+        assert time.monotonic() - started < 1
+    finally:
+        for saver in savers:
+            saver.lock.release()
+
+    pool.close()
+    assert not pool.ping()
+
+
+def test_graph_types_compile_once(client):
+    """Graphs of one type share a compiled template per checkpointer"""
+    for index in range(server.CHECKPOINTER_POOL_SIZE * 2):
+        create_graph(client, f"template-{index}", "hitl")
+
+    compiled = {id(info['graph']) for info in server.get_graph_registry().local_handles()}
+    assert len(compiled) == server.CHECKPOINTER_POOL_SIZE
+
+    response = client.post("/graphs", json={"graph_id": "unknown", "graph_type": "missing"})
+    assert response.status_code == 400
+
+
+def test_register_graph_type(client):
+    """Graph types registered at startup can be created through the API"""
+    server.register_graph_type("custom_basic", server.create_basic_graph, replace=True)
+
+    assert "custom_basic" in client.get("/graphs/types").json()["graph_types"]
+    create_graph(client, "custom-graph", "custom_basic")
+    assert execute_graph(client, "custom-graph")["status"] == "completed"
+
+    with pytest.raises(ValueError):
+        server.register_graph_type("custom_basic", server.create_basic_graph)
+
+
+def test_execute_batch_reports_each_thread(client):
+    """A batch returns completed and interrupted status per thread"""
+    create_graph(client, "batch-basic")
+    create_graph(client, "batch-hitl", "hitl")
+
+    response = client.post("/graphs/batch-basic/execute-batch", json={
+        "graph_id": "batch-basic",
+        "threads": [{"thread_id": f"batch-{index}", "initial_state": {"counter": index}} for index in range(6)],
+        "max_concurrency": 2
+    })
+    assert response.status_code == 200
+    batch = response.json()
+    assert batch["summary"]["completed"] == 6
+    assert batch["max_concurrency"] == 2
+    assert [item["result"]["chatbot"]["counter"] for item in batch["results"]] == [1, 2, 3, 4, 5, 6]
+
+    response = client.post("/graphs/batch-hitl/execute-batch", json={
+        "graph_id": "batch-hitl",
+        "threads": [{}, {}],
+        "stream": True
+    })
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert {line["status"] for line in lines} == {"interrupted"}
+
+
+def test_execute_batch_rejects_duplicate_threads(client):
+    create_graph(client, "batch-dupes")
+    response = client.post("/graphs/batch-dupes/execute-batch", json={
+        "graph_id": "batch-dupes",
+        "threads": [{"thread_id": "same"}, {"thread_id": "same"}]
+    })
+    assert response.status_code == 400
+
+
+def create_approval(client, workflow_id="wf-1", urgency_level="medium", **fields):
+    body = {
+        "workflow_id": workflow_id,
+        "title": f"Approve {workflow_id}",
+        "description": "Documentation update",
+        "urgency_level": urgency_level,
+        **fields
+    }
+    response = client.post("/approval/request", json=body)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_pending_approvals_paginate_and_filter(client):
+    """Pending approvals are filtered by index and paged by cursor"""
+    created = [create_approval(client, f"wf-{index % 2}", "high" if index < 2 else "low") for index in range(5)]
+
+    response = client.post(f"/approval/{created[0]['approval_id']}/respond", json={
+        "approval_id": created[0]["approval_id"],
+        "approved": True,
+        "approved_by": "reviewer",
+        "timestamp": "2025-01-01T00:00:00"
+    })
+    assert response.status_code == 200
+
+    first_page = client.get("/approval/pending", params={"limit": 2}).json()
+    assert first_page["count"] == 2
+    assert first_page["next_cursor"]
+    second_page = client.get("/approval/pending", params={"limit": 2, "cursor": first_page["next_cursor"]}).json()
+    assert second_page["next_cursor"] is None
+
+    pending_ids = [item["approval_id"] for item in first_page["pending_approvals"] + second_page["pending_approvals"]]
+    assert pending_ids == [item["approval_id"] for item in created[1:]]
+
+    high = client.get("/approval/pending", params={"urgency_level": "high"}).json()
+    assert [item["approval_id"] for item in high["pending_approvals"]] == [created[1]["approval_id"]]
+
+    workflow = client.get("/approval/pending", params={"workflow_id": "wf-0"}).json()
+    assert workflow["count"] == 2
+
+    for cursor in ("abc", "-1", str(2 ** 64)):
+        assert client.get("/approval/pending", params={"cursor": cursor}).status_code == 400
+
+
+def test_approval_store_io_runs_off_the_event_loop(client):
+    """A request waiting on the approval store does not hold up other requests"""
+    import threading
+
+    store = server.get_approval_store()
+    store._lock.acquire()
+    try:
+        waiting = threading.Thread(target=lambda: client.get("/approval/pending"))
+        waiting.start()
+        time.sleep(0.1)
+        probe = threading.Thread(target=lambda: client.get("/graphs/types"))
+        probe.start()
+        probe.join(timeout=2)
+        assert not probe.is_alive()
+        assert waiting.is_alive()
+    finally:
+        store._lock.release()
+    waiting.join(timeout=5)
+
+
+def test_approvals_survive_restart(client):
+    """Approvals are persisted rather than held in memory"""
+    approval = create_approval(client)
+
+    with TestClient(server.app) as restarted:
+        response = restarted.get(f"/approval/{approval['approval_id']}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+
+        assert restarted.get("/approval/missing").status_code == 404
+
+
+def test_approval_deadlines_escalate_then_expire(client):
+    """The scheduler escalates by urgency policy and expires after the last level"""
+    approval = create_approval(client, urgency_level="medium")
+    approval_id = approval["approval_id"]
+    assert approval["approval_data"]["expires_at"]
+
+    scheduler = server.server_state['approval_scheduler']
+    store = server.server_state['approval_store']
+
+    assert scheduler.process_due(now=time.time()) == 0
+    assert scheduler.process_due(now=time.time() + 3601) == 1
+    escalated = store.get(approval_id)
+    assert escalated["status"] == "pending"
+    assert escalated["escalation_level"] == 1
+
+    assert scheduler.process_due(now=time.time() + 2 * 3601) == 1
+    assert client.get(f"/approval/{approval_id}").json()["status"] == "expired"
+    assert scheduler.stats()["scheduled"] == 0
+
+
+def test_approval_deadline_auto_approves_and_skips_answered(client):
+    """Metadata can shorten the deadline and auto-approve; answered approvals are skipped"""
+    auto = create_approval(client, urgency_level="low", metadata={"auto_timeout": 5, "on_timeout": "auto_approve"})
+    answered = create_approval(client, urgency_level="low", metadata={"auto_timeout": 5})
+    client.post(f"/approval/{answered['approval_id']}/respond", json={
+        "approval_id": answered["approval_id"],
+        "approved": False,
+        "approved_by": "reviewer",
+        "timestamp": "2025-01-01T00:00:00"
+    })
+
+    scheduler = server.server_state['approval_scheduler']
+    assert scheduler.process_due(now=time.time() + 10) == 1
+
+    status = client.get(f"/approval/{auto['approval_id']}").json()
+    assert status["status"] == "approved"
+    assert status["approved_by"] == "system:timeout"
+    assert client.get(f"/approval/{answered['approval_id']}").json()["status"] == "rejected"
+
+
+def test_late_approval_responses_are_rejected(client):
+    """A response after the deadline fired, or a second response, does not override the decision"""
+    approval = create_approval(client, urgency_level="low", metadata={"auto_timeout": 5, "on_timeout": "auto_reject"})
+    approval_id = approval["approval_id"]
+    assert server.server_state['approval_scheduler'].process_due(now=time.time() + 10) == 1
+
+    late = {"approval_id": approval_id, "approved": True, "approved_by": "reviewer", "timestamp": "2025-01-01T00:00:00"}
+    response = client.post(f"/approval/{approval_id}/respond", json=late)
+    assert response.status_code == 409
+    status = client.get(f"/approval/{approval_id}").json()
+    assert status["status"] == "rejected"
+    assert status["approved_by"] == "system:timeout"
+
+    assert client.post(f"/approval/{approval_id}/escalate").status_code == 409
+    assert client.get(f"/approval/{approval_id}").json()["escalation_level"] == 0
+
+    pending = create_approval(client)["approval_id"]
+    assert client.post(f"/approval/{pending}/escalate").json()["escalation_level"] == 1
+    assert client.get(f"/approval/{pending}").json()["escalation_level"] == 1
+
+    answered = create_approval(client)["approval_id"]
+    first = {**late, "approval_id": answered}
+    assert client.post(f"/approval/{answered}/respond", json=first).status_code == 200
+    second = {**first, "approved": False}
+    assert client.post(f"/approval/{answered}/respond", json=second).status_code == 409
+    assert client.get(f"/approval/{answered}").json()["status"] == "approved"
+
+
+def test_approval_rejects_invalid_auto_timeout(client):
+    """A deadline override that cannot be scheduled is rejected up front"""
+    for auto_timeout in ("soon", 0, -5, 1.5, True, 10 ** 12, [60]):
+        response = client.post("/approval/request", json={
+            "workflow_id": "wf-bad-timeout",
+            "title": "Approve",
+            "description": "Bad deadline",
+            "metadata": {"auto_timeout": auto_timeout}
+        })
+        assert response.status_code == 400, auto_timeout
+    assert client.get("/approval/pending").json()["count"] == 0
+
+    accepted = create_approval(client, metadata={"auto_timeout": "120"})
+    assert accepted["approval_data"]["expires_at"]
+
+
+def wait_for_resume(client, approval_id, timeout=5.0):
+    """Poll an approval until the resume worker has recorded an outcome"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/approval/{approval_id}").json()
+        if status["resume_status"] not in (None, "queued"):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"Approval {approval_id} was not resumed")
+
+
+def test_approval_response_resumes_thread(client):
+    """Approval decisions resume the linked LangGraph thread through the worker"""
+    create_graph(client, "approval-graph", "hitl")
+    approved_thread = execute_graph(client, "approval-graph")["thread_id"]
+    rejected_thread = execute_graph(client, "approval-graph")["thread_id"]
+
+    decisions = {}
+    for thread_id, approved in ((approved_thread, True), (rejected_thread, False)):
+        approval = create_approval(client, graph_id="approval-graph", thread_id=thread_id)
+        response = client.post(f"/approval/{approval['approval_id']}/respond", json={
+            "approval_id": approval["approval_id"],
+            "approved": approved,
+            "approved_by": "reviewer",
+            "timestamp": "2025-01-01T00:00:00"
+        }).json()
+        assert response["resume"] == "queued"
+        decisions[thread_id] = approval["approval_id"]
+
+    approved_status = wait_for_resume(client, decisions[approved_thread])
+    assert approved_status["resume_status"] == "completed"
+    assert approved_status["resume_result"]["result"] == "Action completed successfully"
+
+    rejected_status = wait_for_resume(client, decisions[rejected_thread])
+    assert rejected_status["resume_status"] == "completed"
+    assert rejected_status["resume_result"]["approved"] is False
+
+    thread = client.get(f"/threads/{approved_thread}").json()
+    assert thread["info"]["status"] == "completed"
+
+
+def test_approval_without_thread_is_not_resumed(client):
+    approval = create_approval(client)
+    response = client.post(f"/approval/{approval['approval_id']}/respond", json={
+        "approval_id": approval["approval_id"],
+        "approved": True,
+        "approved_by": "reviewer",
+        "timestamp": "2025-01-01T00:00:00"
+    }).json()
+    assert response["resume"] == "not_applicable"
+
+
+def test_threads_paginate_and_load_results_lazily(client):
+    """Thread listings are paged and results come from disk on demand"""
+    create_graph(client, "listed-graph")
+    for index in range(5):
+        execute_graph(client, "listed-graph", thread_id=f"listed-{index}", initial_state={"counter": index})
+
+    first = client.get("/threads", params={"limit": 3}).json()
+    assert list(first["threads"]) == ["listed-0", "listed-1", "listed-2"]
+    assert first["total"] == 5
+    assert "result" not in first["threads"]["listed-0"]
+    second = client.get("/threads", params={"limit": 3, "cursor": first["next_cursor"]}).json()
+    assert list(second["threads"]) == ["listed-3", "listed-4"]
+    assert second["next_cursor"] is None
+
+    thread = client.get("/threads/listed-4").json()
+    assert thread["info"]["result"]["chatbot"]["counter"] == 5
+
+    graphs = client.get("/graphs", params={"limit": 1}).json()
+    assert graphs["count"] == 1 and graphs["next_cursor"] is None
+
+
+def test_workflow_index_relink_drops_old_thread_entry():
+    from langgraph_server_state import InProcessStateBackend, WorkflowIndex
+
+    backend = InProcessStateBackend()
+    index = WorkflowIndex(backend)
+    index.link("wf", "g", "thread-1")
+    index.link("wf", "g", "thread-2")
+    assert backend.get(WorkflowIndex.THREAD_NAMESPACE, "thread-1") is None
+    assert backend.count(WorkflowIndex.THREAD_NAMESPACE) == 1
+
+    # Forgetting the old thread leaves the workflow on its current one
+    index.unlink_thread("thread-1")
+    assert index.get("wf")["thread_id"] == "thread-2"
+
+    # Unlinking the current thread keeps the graph and clears its reverse entry
+    index.link("wf", "g")
+    assert index.get("wf")["thread_id"] is None
+    assert backend.count(WorkflowIndex.THREAD_NAMESPACE) == 0
+
+
+def test_thread_registry_evicts_and_reloads(tmp_path):
+    """Evicted records are still served from disk"""
+    from langgraph_thread_registry import ThreadRegistry
+
+    registry = ThreadRegistry(str(tmp_path / "threads.db"), max_entries=2, ttl_seconds=60)
+    try:
+        for index in range(4):
+            registry[f"thread-{index}"] = {"graph_id": "g", "status": "completed", "result": {"n": index}}
+
+        assert registry.stats()["cached"] == 2
+        assert registry.stats()["evictions"] == 2
+        assert registry["thread-0"]["status"] == "completed"
+        assert registry.get_result("thread-0") == {"n": 0}
+        assert len(registry) == 4
+
+        del registry["thread-1"]
+        assert "thread-1" not in registry
+    finally:
+        registry.close()
+
+
+def test_thread_registry_io_runs_off_the_event_loop(client):
+    """A request waiting on the thread registry does not hold up other requests"""
+    import threading
+
+    registry = server.get_thread_registry()
+    registry._lock.acquire()
+    try:
+        waiting = threading.Thread(target=lambda: client.get("/threads"))
+        waiting.start()
+        time.sleep(0.1)
+        probe = threading.Thread(target=lambda: client.get("/graphs/types"))
+        probe.start()
+        probe.join(timeout=2)
+        assert not probe.is_alive()
+        assert waiting.is_alive()
+    finally:
+        registry._lock.release()
+    waiting.join(timeout=5)
+
+
+def test_thread_claims_are_exclusive_between_workers(tmp_path):
+    """Only one registry sharing the database can claim a thread for a run"""
+    from langgraph_thread_registry import ThreadRegistry
+
+    db_path = str(tmp_path / "threads.db")
+    first, second = ThreadRegistry(db_path), ThreadRegistry(db_path)
+    running = {"graph_id": "g", "status": "running", "last_update": "2025-01-01T00:00:10"}
+    try:
+        second["shared-thread"] = {"graph_id": "g", "status": "completed", "last_update": "2025-01-01T00:00:00"}
+        assert first.claim("shared-thread", running)
+        assert not second.claim("shared-thread", running)
+        assert second["shared-thread"]["status"] == "running"
+
+        # A running record older than the cutoff belongs to a dead worker
+        assert second.claim("shared-thread", running, stale_before="2025-01-01T00:01:00")
+
+        first["shared-thread"] = {"graph_id": "g", "status": "completed", "last_update": "2025-01-01T00:02:00"}
+        assert second.claim("shared-thread", running)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_shared_backend_rejects_runs_claimed_by_another_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "DB_PATH", str(tmp_path / "langgraph_bridge.db"))
+    monkeypatch.setattr(server, "STATE_BACKEND", "sqlite")
+
+    with TestClient(server.app) as shared_client:
+        create_graph(shared_client, "claimed-graph")
+        # Another worker is running the thread
+        server.get_thread_registry()["claimed-thread"] = {
+            "graph_id": "claimed-graph",
+            "status": "running",
+            "last_update": datetime.now().isoformat()
+        }
+        response = shared_client.post("/graphs/claimed-graph/execute", json={
+            "graph_id": "claimed-graph", "thread_id": "claimed-thread"
+        })
+        assert response.status_code == 409
+        assert server.get_run_tracker().get("claimed-thread") is None
+
+        assert execute_graph(shared_client, "claimed-graph", thread_id="free-thread")["status"] == "completed"
+
+
+def test_graph_registry_shared_between_workers(tmp_path):
+    from langgraph_server_state import GraphRegistry, SQLiteStateBackend
+
+    db_path = str(tmp_path / "state.db")
+    bound = []
+
+    def bind(definition):
+        bound.append(definition['type'])
+        return {'graph': object(), 'checkpointer': None}
+
+    first = GraphRegistry(SQLiteStateBackend(db_path), bind)
+    second = GraphRegistry(SQLiteStateBackend(db_path), bind)
+
+    assert first.add("g1", {'type': "basic", 'config': {}, 'graph': object(), 'checkpointer': None})
+    assert not second.add("g1", {'type': "hitl", 'config': {}})
+
+    # The second worker binds its own handle from the shared definition
+    assert "g1" in second
+    assert second["g1"]['type'] == "basic"
+    assert bound == ["basic"]
+    assert [graph_id for graph_id, _ in second.items()] == ["g1"]
+
+    del second["g1"]
+    assert "g1" not in first
+    assert first.get("g1") is None
+    assert len(first) == 0
+
+    first.backend.close()
+    second.backend.close()
+
+
+def create_slow_graph():
+    """Graph whose nodes each take a while, for budget and cancellation tests"""
+    def slow_node(state):
+        time.sleep(0.1)
+        return {"counter": state.get("counter", 0) + 1}
+
+    workflow = server.StateGraph(server.GraphState)
+    previous = server.START
+    for index in range(20):
+        workflow.add_node(f"step_{index}", slow_node)
+        workflow.add_edge(previous, f"step_{index}")
+        previous = f"step_{index}"
+    workflow.add_edge(previous, server.END)
+    return workflow
+
+
+@pytest.fixture
+def slow_client(client):
+    server.register_graph_type("slow", create_slow_graph, replace=True)
+    create_graph(client, "slow-graph", "slow")
+    return client
+
+
+def test_execute_times_out_at_budget(slow_client):
+    started = time.monotonic()
+    result = execute_graph(slow_client, "slow-graph", thread_id="slow-thread", timeout_seconds=0.3)
+    assert result["status"] == "timed_out"
+    assert time.monotonic() - started < 1.5
+
+    info = slow_client.get("/threads/slow-thread").json()["info"]
+    assert info["status"] == "timed_out"
+    assert info["reason"] == "timed_out"
+
+
+def test_graph_type_budget_applies(slow_client):
+    server.register_graph_type("slow", create_slow_graph, replace=True, timeout_seconds=0.2)
+    assert server.graph_templates.budget_for("slow") == 0.2
+    result = execute_graph(slow_client, "slow-graph", thread_id="budget-thread")
+    assert result["status"] == "timed_out"
+    assert result["timeout_seconds"] == 0.2
+
+
+def test_cancel_running_thread(slow_client):
+    import threading
+
+    outcome = {}
+    runner = threading.Thread(target=lambda: outcome.update(
+        execute_graph(slow_client, "slow-graph", thread_id="cancel-thread")
+    ))
+    runner.start()
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        response = slow_client.get("/threads/cancel-thread")
+        if response.status_code == 200 and response.json()["info"]["status"] == "running":
+            break
+        time.sleep(0.02)
+
+    response = slow_client.delete("/threads/cancel-thread/run")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelling"
+    runner.join(timeout=5)
+
+    assert outcome["status"] == "cancelled"
+    assert slow_client.get("/threads/cancel-thread").json()["info"]["status"] == "cancelled"
+    assert slow_client.delete("/threads/cancel-thread/run").status_code == 409
+    assert slow_client.delete("/threads/unknown-thread/run").status_code == 404
+
+
+def test_stream_stops_at_budget(slow_client):
+    response = slow_client.post("/graphs/slow-graph/stream", json={
+        "graph_id": "slow-graph",
+        "thread_id": "slow-stream",
+        "timeout_seconds": 0.3
+    })
+    events = parse_sse(response.text)
+    assert events[-1][0] == "end"
+    assert events[-1][1]["status"] == "timed_out"
+    assert 0 < events[-1][1]["chunks"] < 20
+    assert slow_client.get("/threads/slow-stream").json()["info"]["status"] == "timed_out"
+
+
+def test_idempotency_key_replays_execute(client):
+    create_graph(client, "idem-graph")
+    headers = {"Idempotency-Key": "execute-once"}
+    body = {"graph_id": "idem-graph", "initial_state": {"counter": 1}}
+
+    first = client.post("/graphs/idem-graph/execute", json=body, headers=headers)
+    second = client.post("/graphs/idem-graph/execute", json=body, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert len(client.get("/threads").json()["threads"]) == 1
+
+    conflict = client.post("/graphs/idem-graph/execute", json={**body, "initial_state": {"counter": 2}}, headers=headers)
+    assert conflict.status_code == 422
+
+
+def test_idempotency_key_replays_resume(client):
+    create_graph(client, "idem-hitl", "hitl")
+    thread_id = execute_graph(client, "idem-hitl", initial_state={"counter": 1})["thread_id"]
+    body = {"graph_id": "idem-hitl", "thread_id": thread_id, "resume_value": {"approved": True}}
+    headers = {"Idempotency-Key": "resume-once"}
+
+    first = client.post("/graphs/idem-hitl/resume", json=body, headers=headers)
+    assert first.json()["status"] == "completed"
+
+    # Without the key the thread is no longer interrupted; with it the retry is replayed
+    assert client.post("/graphs/idem-hitl/resume", json=body).status_code == 400
+    retry = client.post("/graphs/idem-hitl/resume", json=body, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+
+
+def test_idempotency_key_attaches_to_in_flight_run(slow_client):
+    from concurrent.futures import ThreadPoolExecutor
+
+    body = {"graph_id": "slow-graph", "initial_state": {}}
+    headers = {"Idempotency-Key": "single-flight"}
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        responses = list(pool.map(
+            lambda _: slow_client.post("/graphs/slow-graph/execute", json=body, headers=headers),
+            range(3)
+        ))
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["thread_id"] for response in responses}) == 1
+    stats = slow_client.get("/metrics/executor").json()["idempotency"]
+    assert stats["executed"] == 1
+    assert stats["attached"] == 2
+
+
+def test_in_process_backend_pages_in_key_order():
+    from langgraph_server_state import InProcessStateBackend
+
+    backend = InProcessStateBackend()
+    for key in ("d", "b", "e", "a", "c"):
+        backend.put("ns", key, key.upper())
+    backend.put("ns", "b", "B2")
+    assert backend.delete("ns", "c") and not backend.delete("ns", "c")
+
+    page, cursor = backend.list_page("ns", limit=2)
+    assert page == [("a", "A"), ("b", "B2")] and cursor == "b"
+    page, cursor = backend.list_page("ns", limit=2, cursor=cursor)
+    assert page == [("d", "D"), ("e", "E")] and cursor is None
+    assert backend.list_page("ns", cursor="bb")[0] == [("d", "D"), ("e", "E")]
+
+
+def test_idempotency_purge_touches_only_expired_keys():
+    from langgraph_idempotency import IdempotencyCache
+    from langgraph_server_state import InProcessStateBackend
+
+    backend = InProcessStateBackend()
+    cache = IdempotencyCache(backend, ttl_seconds=0.01, purge_interval=0)
+
+    async def respond():
+        return {"ok": True}
+
+    asyncio.run(cache.run("short", "fingerprint", respond))
+    cache.ttl_seconds = 3600
+    asyncio.run(cache.run("long", "fingerprint", respond))
+    # Left behind by another worker; only a sweep sees it
+    backend.put(IdempotencyCache.NAMESPACE, "orphan", {"state": "pending", "fingerprint": "x", "expires_at": 0})
+
+    time.sleep(0.02)
+    assert cache.purge_expired() == 1
+    assert backend.get(IdempotencyCache.NAMESPACE, "short") is None
+    assert backend.get(IdempotencyCache.NAMESPACE, "long") is not None
+    assert cache.stats()["tracked_expiries"] == 3
+    assert cache.sweep_expired() == 1
+
+
+def checkpoint_count(thread_id):
+    saver = server.get_checkpointer_pool().acquire()
+    with saver.cursor(transaction=False) as cursor:
+        cursor.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (thread_id,))
+        return cursor.fetchone()[0]
+
+
+def test_compaction_keeps_last_checkpoints(slow_client):
+    result = execute_graph(slow_client, "slow-graph", thread_id="history-thread")
+    assert result["status"] == "completed"
+    before = checkpoint_count("history-thread")
+    assert before > 3
+
+    response = slow_client.post("/maintenance/compact", json={"keep_last": 3, "max_age_seconds": 0})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["checkpoints_deleted"] == before - 3
+    assert report["bytes_reclaimed"] >= 0
+    assert report["vacuum"] == "incremental"
+    assert checkpoint_count("history-thread") == 3
+
+    # The latest state survives compaction
+    state = slow_client.get("/threads/history-thread").json()["info"]
+    assert state["status"] == "completed"
+
+
+def test_compaction_purges_expired_finished_threads(client):
+    create_graph(client, "retention-graph")
+    execute_graph(client, "retention-graph", thread_id="old-thread")
+    create_graph(client, "retention-hitl", "hitl")
+    execute_graph(client, "retention-hitl", thread_id="paused-thread", initial_state={"counter": 1})
+
+    time.sleep(0.05)
+    report = client.post("/maintenance/compact", json={"max_age_seconds": 0.01}).json()
+    assert report["threads_purged"] == 1
+    assert report["thread_records_deleted"] == 1
+    assert checkpoint_count("old-thread") == 0
+    assert client.get("/threads/old-thread").status_code == 404
+
+    # Interrupted threads are not finished, so they are kept
+    assert checkpoint_count("paused-thread") > 0
+    assert client.get("/maintenance/compact").json()["runs"] == 1
+
+
+def test_compaction_converts_older_database_only_on_request(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(str(db_path))
+    legacy.execute("CREATE TABLE legacy (id INTEGER)")
+    legacy.close()
+
+    pool = CheckpointerPool(str(db_path), pool_size=1)
+    compactor = CheckpointCompactor(pool)
+    try:
+        assert compactor.compact()["vacuum"] == "unavailable"
+        assert compactor.compact(convert_auto_vacuum=True)["vacuum"] == "full"
+        assert compactor.compact()["vacuum"] == "incremental"
+    finally:
+        pool.close()
+
+
+def respond(client, approval_id, approved):
+    return client.post(f"/approval/{approval_id}/respond", json={
+        "approval_id": approval_id,
+        "approved": approved,
+        "approved_by": "reviewer",
+        "timestamp": "2025-01-01T00:00:00"
+    }).json()
+
+
+def interrupt_workflow(client, workflow_id):
+    response = client.post(f"/workflow/{workflow_id}/interrupt", json={
+        "workflow_id": workflow_id,
+        "title": f"Review {workflow_id}",
+        "description": "Pause for review"
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_workflow_interrupt_pauses_running_thread(slow_client):
+    import threading
+
+    response = slow_client.post("/graphs", json={"graph_id": "wf-graph", "graph_type": "slow", "workflow_id": "wf-pause"})
+    assert response.json()["workflow_id"] == "wf-pause"
+
+    outcome = {}
+    runner = threading.Thread(target=lambda: outcome.update(
+        execute_graph(slow_client, "wf-graph", thread_id="wf-thread")
+    ))
+    runner.start()
+    deadline = time.monotonic() + 5
+    while slow_client.get("/threads/wf-thread").json().get("info", {}).get("status") != "running":
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+    interrupted = interrupt_workflow(slow_client, "wf-pause")
+    assert interrupted["graph_id"] == "wf-graph"
+    assert interrupted["thread_id"] == "wf-thread"
+    assert interrupted["thread_status"] == "pausing"
+    runner.join(timeout=5)
+
+    assert outcome["status"] == "interrupted"
+    assert outcome["approval_id"] == interrupted["approval_id"]
+    info = slow_client.get("/threads/wf-thread").json()["info"]
+    assert info["status"] == "interrupted"
+    assert info["snapshot"]["next"]
+
+    respond(slow_client, interrupted["approval_id"], True)
+    status = wait_for_resume(slow_client, interrupted["approval_id"])
+    assert status["resume_status"] == "completed"
+    assert status["resume_result"]["counter"] == 20
+
+
+def test_workflow_interrupt_rejection_cancels_paused_thread(slow_client):
+    import threading
+
+    slow_client.post("/graphs", json={"graph_id": "wf-reject", "graph_type": "slow", "workflow_id": "wf-no"})
+    runner = threading.Thread(target=lambda: execute_graph(slow_client, "wf-reject", thread_id="wf-no-thread"))
+    runner.start()
+    deadline = time.monotonic() + 5
+    while slow_client.get("/threads/wf-no-thread").json().get("info", {}).get("status") != "running":
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+    approval_id = interrupt_workflow(slow_client, "wf-no")["approval_id"]
+    runner.join(timeout=5)
+    respond(slow_client, approval_id, False)
+    assert wait_for_resume(slow_client, approval_id)["resume_status"] == "cancelled"
+    assert slow_client.get("/threads/wf-no-thread").json()["info"]["status"] == "cancelled"
+
+
+def test_workflow_index_follows_graph_lifecycle(client):
+    client.post("/graphs", json={"graph_id": "wf-hitl", "graph_type": "hitl", "workflow_id": "wf-life"})
+    interrupted = interrupt_workflow(client, "wf-life")
+    assert interrupted["graph_id"] == "wf-hitl"
+    assert interrupted["thread_status"] is None
+
+    thread_id = execute_graph(client, "wf-hitl", initial_state={"counter": 1})["thread_id"]
+    interrupted = interrupt_workflow(client, "wf-life")
+    assert interrupted["thread_id"] == thread_id
+    assert interrupted["thread_status"] == "interrupted"
+
+    client.delete(f"/threads/{thread_id}")
+    assert server.get_workflow_index().get("wf-life")["thread_id"] is None
+
+    client.delete("/graphs/wf-hitl")
+    assert server.get_workflow_index().get("wf-life") is None
+    assert interrupt_workflow(client, "wf-life")["status"] == "created"
+
+
+def test_large_responses_are_gzipped(client):
+    for index in range(40):
+        client.post("/graphs", json={"graph_id": f"encoded-graph-{index:02d}", "graph_type": "basic"})
+
+    response = client.get("/graphs", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()["graphs"]) == 40
+
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    plain = client.get("/graphs", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json()["graphs"] == response.json()["graphs"]
+
+
+def test_msgpack_negotiated_by_accept_header(client):
+    ormsgpack = pytest.importorskip("ormsgpack")
+
+    create_graph(client, "packed-graph")
+    response = client.get("/graphs/packed-graph", headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert ormsgpack.unpackb(response.content)["graph_id"] == "packed-graph"
+
+    plain = client.get("/graphs/packed-graph")
+    assert plain.headers["content-type"] == "application/json"
+    # Uncompressed responses still vary by Accept, or a cache could serve msgpack to JSON clients
+    assert response.headers["vary"] == plain.headers["vary"] == "Accept"
+
+    for index in range(40):
+        create_graph(client, f"packed-graph-{index:02d}")
+    compressed = client.get("/graphs", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["vary"] == "Accept, Accept-Encoding"
+
+
+def process_state(client, graph_id, thread_id, state, state_type="basic"):
+    response = client.post("/state/process", json={
+        "state_data": state, "state_type": state_type, "graph_id": graph_id, "thread_id": thread_id
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_state_versions_are_served_by_number(client):
+    for counter in range(1, 4):
+        processed = process_state(client, "versioned", "thread-1", {"messages": ["hi"] * counter, "counter": counter})
+        assert (processed["version"], processed["durable"]) == (counter, True)
+
+    latest = client.get("/state/versions/versioned/thread-1").json()
+    assert latest["version"] == 3
+    assert latest["state_data"]["counter"] == 3
+
+    second = client.get("/state/versions/versioned/thread-1", params={"version": 2}).json()
+    assert second["state_data"] == {"messages": ["hi", "hi"], "counter": 2}
+    assert client.get("/state/versions/versioned/thread-1", params={"version": 9}).status_code == 404
+
+
+def test_state_validate_batch_reports_per_item_errors(client):
+    response = client.post("/state/validate-batch", json={"states": [
+        {"state_data": {"messages": [], "counter": 1}, "state_type": "basic"},
+        {"state_data": {"messages": [], "counter": "1"}, "state_type": "basic"},
+        {"state_data": {"messages": []}, "state_type": "nope"}
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["valid"], body["invalid"]) == (3, 1, 2)
+    assert body["results"][1]["errors"] == ["'counter' field must be numeric"]
+    assert body["results"][2]["errors"] == ["Invalid state type: nope"]
+
+
+def test_state_at_and_history_endpoints(client):
+    for counter in range(1, 4):
+        process_state(client, "timeline", "thread-1", {"messages": ["hi"] * counter, "counter": counter})
+
+    at = client.get("/state/at", params={"graph_id": "timeline", "thread_id": "thread-1", "ts": time.time()})
+    assert at.status_code == 200
+    assert at.json()["version"] == 3 and at.json()["state_data"]["counter"] == 3
+
+    early = {"graph_id": "timeline", "thread_id": "thread-1", "ts": "2000-01-01T00:00:00"}
+    assert client.get("/state/at", params=early).status_code == 404
+    assert client.get("/state/at", params={**early, "ts": "soon"}).status_code == 400
+    assert client.get("/state/at", params={**early, "ts": "inf"}).status_code == 400
+    assert client.get("/state/at", params={**early, "ts": "1e20"}).status_code == 400
+
+    response = client.get("/state/history", params={"graph_id": "timeline", "thread_id": "thread-1"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["version"] for line in lines] == [1, 2, 3]
+    assert lines[1]["state"] == {"messages": ["hi", "hi"], "counter": 2}
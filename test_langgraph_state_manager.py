@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+LangGraph state manager tests for the PowerShell bridge
+Phase 4: Multi-Agent Orchestration - Hour 6: State Management Interface
+"""
+
+import json
+import threading
+
+import pytest
+
+from langgraph_state_manager import (
+    LangGraphStateManager, StateConnectionPool, StateType, StateValidator,
+    StateValidationError, validate_powershell_state, to_snapshot_time
+)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """State manager backed by a throwaway database"""
+    with LangGraphStateManager(str(tmp_path / "state.db")) as state_manager:
+        yield state_manager
+
+
+def basic_state(counter=0, **extra):
+    return {"messages": [], "counter": counter, **extra}
+
+
+def test_connection_pool_reuses_connections(tmp_path):
+    """Connections are opened once, in WAL mode, and handed back out"""
+    with StateConnectionPool(tmp_path / "pool.db", pool_size=2) as pool:
+        with pool.connection() as conn:
+            first = conn
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        with pool.connection() as conn:
+            assert conn is first
+
+        assert pool.stats()["open_connections"] == 1
+
+    assert pool.stats()["closed"]
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            pass
+
+
+def test_connection_pool_is_bounded_across_threads(tmp_path):
+    """Concurrent borrowers share at most pool_size connections"""
+    pool = StateConnectionPool(tmp_path / "pool.db", pool_size=2)
+    barrier = threading.Barrier(4)
+    seen = set()
+
+    def borrow():
+        barrier.wait()
+        for _ in range(20):
+            with pool.connection() as conn:
+                seen.add(id(conn))
+                conn.execute("SELECT 1").fetchone()
+
+    workers = [threading.Thread(target=borrow) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(seen) <= 2
+    pool.close()
+    assert pool.stats()["open_connections"] == 0
+
+
+def test_snapshots_round_trip(manager):
+    """Processed states are saved, listed and loaded through the pool"""
+    manager.process_powershell_state(basic_state(1), StateType.BASIC, "graph-a", "thread-a")
+
+    snapshots = manager.checkpoint_manager.list_snapshots("graph-a", "thread-a")
+    assert len(snapshots) == 1
+
+    loaded = manager.checkpoint_manager.load_state_snapshot(snapshots[0]["state_id"])
+    assert loaded["state"] == basic_state(1)
+    assert loaded["metadata"]["graph_id"] == "graph-a"
+
+
+def test_diff_and_patch_round_trip():
+    """Deltas cover added, removed, replaced, nested and appended values"""
+    from langgraph_state_manager import apply_state_patch, diff_states
+
+    old = {"counter": 1, "messages": ["a"], "nested": {"x": 1, "y": 2}, "a/b": 0, "flag": 1}
+    new = {"counter": 2, "messages": ["a", "b", "c"], "nested": {"x": 1, "z": 3}, "a/b": 1, "flag": True}
+
+    ops = diff_states(old, new)
+    assert {"op": "add", "path": "/messages/-", "value": "b"} in ops
+    assert apply_state_patch(json.loads(json.dumps(old)), ops) == new
+    assert type(apply_state_patch(json.loads(json.dumps(old)), ops)["flag"]) is bool
+
+
+def test_diff_detects_nested_type_changes():
+    """Equal-comparing bool, int and float values still count as changes when nested"""
+    from langgraph_state_manager import apply_state_patch, diff_states
+
+    old = {"a": {"x": 1}, "l": [1, 2], "m": [[0]], "grow": [1]}
+    new = {"a": {"x": True}, "l": [1.0, 2], "m": [[False]], "grow": [True, 2]}
+
+    ops = diff_states(old, new)
+    assert {"op": "add", "path": "/grow/-", "value": 2} not in ops
+    rebuilt = apply_state_patch(json.loads(json.dumps(old)), ops)
+    assert json.dumps(rebuilt, sort_keys=True) == json.dumps(new, sort_keys=True)
+
+
+def test_versions_store_deltas_between_keyframes(tmp_path):
+    """Each save is the thread's next version; only keyframes hold the full state"""
+    with LangGraphStateManager(str(tmp_path / "state.db"), keyframe_interval=3) as state_manager:
+        def chatty_state(version):
+            # Messages only grow; a field comes and goes
+            messages = [f"message {index} " * 20 for index in range(version)]
+            return {"messages": messages, "counter": version, **({"result": "odd"} if version % 2 else {})}
+
+        for version in range(1, 8):
+            state_manager.process_powershell_state(chatty_state(version), StateType.BASIC, "graph-v", "thread-v")
+
+        store = state_manager.checkpoint_manager
+        snapshots = sorted(store.list_snapshots("graph-v", "thread-v"), key=lambda s: s["version"])
+        assert [s["version"] for s in snapshots] == list(range(1, 8))
+        assert [s["encoding"] for s in snapshots] == ["full", "delta", "delta", "full", "delta", "delta", "full"]
+        assert snapshots[4]["state_id"] == "graph-v_thread-v_v5"
+
+        # Rebuild every version without the in-memory head
+        store._heads.clear()
+        for version in range(1, 8):
+            loaded = store.load_state_version("graph-v", "thread-v", version)
+            assert loaded["state"] == chatty_state(version)
+            assert loaded["metadata"]["version"] == version
+
+        assert store.load_state_snapshot("graph-v_thread-v_v6")["state"]["counter"] == 6
+        assert store.load_state_version("graph-v", "thread-v")["state"]["counter"] == 7
+        assert store.load_state_version("graph-v", "thread-v", 8) is None
+
+
+def test_unchanged_states_are_not_written(manager):
+    """Resubmitting the latest state is a lookup, not a new version"""
+    store = manager.checkpoint_manager
+    for _ in range(3):
+        manager.process_powershell_state(basic_state(1), StateType.BASIC, "graph-d", "thread-d")
+
+    snapshots = store.list_snapshots("graph-d", "thread-d")
+    assert [s["version"] for s in snapshots] == [1]
+    assert store.stats()["writes_skipped"] == 2
+    assert store.stats()["blobs"] == 1
+
+
+def test_identical_states_share_one_blob(manager):
+    """Keyframes with the same checksum reference a single stored blob"""
+    store = manager.checkpoint_manager
+    for thread_id in ("thread-1", "thread-2", "thread-3"):
+        manager.process_powershell_state(basic_state(5), StateType.BASIC, "graph-s", thread_id)
+
+    # Returning to an earlier state reuses its blob as a keyframe
+    manager.process_powershell_state(basic_state(6), StateType.BASIC, "graph-s", "thread-1")
+    manager.process_powershell_state(basic_state(5), StateType.BASIC, "graph-s", "thread-1")
+
+    stats = store.stats()
+    assert stats["blobs"] == 2
+    assert stats["blobs_reused"] == 3
+
+    store._heads.clear()
+    assert store.load_state_snapshot("graph-s_thread-3_v1")["state"] == basic_state(5)
+    assert store.load_state_version("graph-s", "thread-1", 3)["state"] == basic_state(5)
+    assert store.load_state_version("graph-s", "thread-1", 2)["state"] == basic_state(6)
+
+
+def test_checksum_collisions_do_not_alias_states(manager, monkeypatch):
+    """A checksum shared by different states neither skips a write nor reuses the wrong blob"""
+    store = manager.checkpoint_manager
+    monkeypatch.setattr(LangGraphStateManager, "_calculate_checksum", lambda self, state: "0" * 16)
+
+    manager.process_powershell_state(basic_state(1), StateType.BASIC, "graph-c", "thread-1")
+    manager.process_powershell_state(basic_state(2), StateType.BASIC, "graph-c", "thread-1")
+    manager.process_powershell_state(basic_state(3), StateType.BASIC, "graph-c", "thread-2")
+
+    assert [s["version"] for s in store.list_snapshots("graph-c", "thread-1")] == [2, 1]
+    assert store.stats()["writes_skipped"] == 0
+    assert store.stats()["blobs_reused"] == 0
+
+    store._heads.clear()
+    assert store.load_state_version("graph-c", "thread-1", 1)["state"] == basic_state(1)
+    assert store.load_state_version("graph-c", "thread-1", 2)["state"] == basic_state(2)
+    assert store.load_state_version("graph-c", "thread-2")["state"] == basic_state(3)
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_large_states_are_compressed(tmp_path, codec):
+    """Payloads over the threshold are stored compressed and decoded on load"""
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+
+    with LangGraphStateManager(str(tmp_path / "state.db"), compression=codec, compress_min_bytes=256) as state_manager:
+        store = state_manager.checkpoint_manager
+        big = basic_state(1, messages=["a fairly repetitive message"] * 50)
+        state_manager.process_powershell_state(big, StateType.BASIC, "graph-c", "thread-c")
+        state_manager.process_powershell_state(basic_state(2), StateType.BASIC, "graph-c", "thread-c")
+
+        with store.pool.connection() as conn:
+            formats = dict(conn.execute("SELECT checksum, format FROM state_blobs").fetchall())
+        assert sorted(formats.values()) == ["json", codec]
+
+        store._heads.clear()
+        assert store.load_state_version("graph-c", "thread-c", 1)["state"] == big
+        assert store.load_state_snapshot("graph-c_thread-c_v2")["state"] == basic_state(2)
+        assert store.stats()["blob_stored_bytes"] < store.stats()["blob_bytes"]
+
+
+def test_compress_command_migrates_plain_rows(tmp_path):
+    """The compress command rewrites rows stored before compression was enabled"""
+    from langgraph_state_manager import main
+
+    db_path = str(tmp_path / "state.db")
+    big = basic_state(1, messages=["uncompressed history"] * 100)
+    with LangGraphStateManager(db_path, compression="none") as state_manager:
+        state_manager.process_powershell_state(big, StateType.BASIC, "graph-m", "thread-m")
+
+    main(["compress", "--db", db_path, "--codec", "zlib", "--min-bytes", "100"])
+
+    with LangGraphStateManager(db_path, compression="none") as state_manager:
+        store = state_manager.checkpoint_manager
+        with store.pool.connection() as conn:
+            assert conn.execute("SELECT format FROM state_blobs").fetchone()[0] == "zlib"
+        assert store.load_state_snapshot("graph-m_thread-m_v1")["state"] == big
+
+
+def test_state_ids_do_not_collide_across_threads(manager):
+    manager.process_powershell_state(basic_state(1), StateType.BASIC, "g_a", "b")
+    manager.process_powershell_state(basic_state(2), StateType.BASIC, "g", "a_b")
+
+    ids = {snapshot["state_id"] for snapshot in manager.checkpoint_manager.list_snapshots()}
+    assert ids == {"g~1a_b_v1", "g_a~1b_v1"}
+
+
+def test_legacy_snapshots_are_renumbered(tmp_path):
+    """Snapshots from before versioning, all saved as version 1, become versions 1..n"""
+    import sqlite3
+
+    db_path = str(tmp_path / "state.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE state_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, state_id TEXT UNIQUE, graph_id TEXT, thread_id TEXT,
+            state_type TEXT, version INTEGER, state_data TEXT, metadata TEXT, created_at TEXT, last_modified TEXT
+        )
+    """)
+    for counter, stamp in ((2, "2025-01-01T10:00:02"), (1, "2025-01-01T10:00:01"), (3, "2025-01-01T10:00:03")):
+        conn.execute(
+            "INSERT INTO state_snapshots (state_id, graph_id, thread_id, state_type, version, state_data, "
+            "metadata, created_at, last_modified) VALUES (?, 'g', 't', 'basic', 1, ?, ?, ?, ?)",
+            (f"g_t_{counter}", json.dumps(basic_state(counter)), json.dumps({"version": 1}), stamp, stamp)
+        )
+    conn.commit()
+    conn.close()
+
+    with LangGraphStateManager(db_path) as state_manager:
+        store = state_manager.checkpoint_manager
+        assert store.load_state_version("g", "t", 2)["state"] == basic_state(2)
+        assert store.load_state_version("g", "t", 3)["metadata"]["version"] == 3
+        state_manager.process_powershell_state(basic_state(4), StateType.BASIC, "g", "t")
+        assert store.latest_snapshot("g", "t")["version"] == 4
+
+    # Versions written since are not renumbered again
+    with LangGraphStateManager(db_path) as state_manager:
+        assert state_manager.checkpoint_manager.load_state_version("g", "t", 4)["state"] == basic_state(4)
+
+
+def populate(state_manager):
+    for graph_index in range(3):
+        for thread_index in range(2):
+            for counter in range(3):
+                state_manager.process_powershell_state(
+                    basic_state(counter, approval_needed=False, messages=["m"] * counter),
+                    StateType.HITL if graph_index == 2 else StateType.BASIC,
+                    f"graph-{graph_index}",
+                    f"thread-{thread_index}"
+                )
+
+
+def test_statistics_table_matches_aggregates(tmp_path):
+    """Maintained totals agree with the SQL aggregates through inserts, replaces and deletes"""
+    from langgraph_state_manager import StateCheckpointManager, StateMetadata
+
+    db_path = str(tmp_path / "state.db")
+    with LangGraphStateManager(db_path) as state_manager:
+        populate(state_manager)
+        store = state_manager.checkpoint_manager
+
+        # Replacing a snapshot must not count it twice
+        metadata = StateMetadata("manual", "graph-9", "thread-9", StateType.COMPLEX, 1, "t", "t", "c")
+        store.save_state_snapshot({"a": 1}, metadata)
+        store.save_state_snapshot({"a": 2}, metadata)
+        with store.pool.connection() as conn:
+            with conn:
+                conn.execute("DELETE FROM state_snapshots WHERE graph_id = 'graph-0'")
+
+        maintained = store.statistics()
+
+    with StateCheckpointManager(db_path, maintain_stats=False) as store:
+        aggregated = store.statistics()
+
+    assert maintained["maintained"] and not aggregated["maintained"]
+    for key in ("total_snapshots", "unique_graphs", "unique_threads", "state_types", "last_activity", "blobs"):
+        assert maintained[key] == aggregated[key], key
+    assert maintained["total_snapshots"] == 13
+    assert maintained["unique_graphs"] == 3
+    assert maintained["unique_threads"] == 3
+    assert maintained["state_types"] == {"basic": 6, "hitl": 6, "complex": 1}
+
+
+def test_statistics_table_is_backfilled(tmp_path):
+    """Turning the totals on for an existing database builds them from the rows"""
+    db_path = str(tmp_path / "state.db")
+    with LangGraphStateManager(db_path, maintain_stats=False) as state_manager:
+        populate(state_manager)
+        expected = state_manager.get_state_statistics()
+
+    with LangGraphStateManager(db_path) as state_manager:
+        stats = state_manager.get_state_statistics()
+
+    assert stats["maintained"]
+    assert stats["total_snapshots"] == expected["total_snapshots"] == 18
+    assert stats["unique_graphs"] == expected["unique_graphs"] == 3
+    assert stats["state_types"] == expected["state_types"]
+    assert stats["blobs"] == expected["blobs"]
+
+
+def test_synchronize_serves_latest_from_cache(manager):
+    """The latest snapshot is found with one index seek and its state comes from the cache"""
+    store = manager.checkpoint_manager
+    for counter in range(1, 4):
+        manager.process_powershell_state(basic_state(counter), StateType.BASIC, "graph-l", "thread-l")
+
+    with store.pool.connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT version, checksum, state_id, last_modified FROM state_snapshots "
+            "WHERE graph_id = ? AND thread_id = ? ORDER BY version DESC LIMIT 1", ("graph-l", "thread-l")
+        ).fetchall()
+    assert "COVERING INDEX idx_state_thread_latest" in plan[0][-1]
+
+    hits = store.stats()["head_cache_hits"]
+    synced = manager.synchronize_checkpoint("graph-l", "thread-l", {"user_input": "tick"})
+    assert synced["counter"] == 3 and synced["user_input"] == "tick"
+    assert synced["__checkpoint_info"]["last_snapshot_id"] == "graph-l_thread-l_v3"
+    assert store.stats()["head_cache_hits"] == hits + 1
+
+    # Another writer moving the thread on is picked up, then cached
+    store._heads.clear()
+    synced = manager.synchronize_checkpoint("graph-l", "thread-l", {})
+    assert synced["counter"] == 3
+    misses = store.stats()["head_cache_misses"]
+    manager.synchronize_checkpoint("graph-l", "thread-l", {})
+    assert store.stats()["head_cache_misses"] == misses
+
+    # Merging must not leak into the cached state
+    synced["messages"].append("mutated")
+    assert manager.synchronize_checkpoint("graph-l", "thread-l", {})["messages"] == []
+
+
+def test_converter_returns_untouched_input():
+    """States with nothing to convert come back as the same objects"""
+    from langgraph_state_manager import PowerShellStateConverter
+
+    state = {"messages": [{"role": "user", "content": f"hello {index}"} for index in range(1000)],
+             "counter": 1, "timestamp": "2025-08-27T10:00:00Z", "nested": {"list": [[1, 2], [3]]}}
+
+    assert PowerShellStateConverter.from_powershell(state) is state
+    assert PowerShellStateConverter.to_powershell(state) is state
+
+
+def test_converter_copies_only_changed_paths():
+    """Converted values are replaced in copies of their containers; the input is left alone"""
+    from datetime import datetime, timezone
+
+    from langgraph_state_manager import PowerShellStateConverter
+
+    stamp = datetime(2025, 8, 27, 10, 0, tzinfo=timezone.utc)
+    untouched = {"a": [1, 2, 3]}
+    state = {"events": [{"at": stamp}, untouched], "other": untouched, "top": stamp}
+
+    converted = PowerShellStateConverter.to_powershell(state)
+    assert converted["top"] == converted["events"][0]["at"] == "2025-08-27T10:00:00+00:00"
+    assert converted["events"][1] is untouched and converted["other"] is untouched
+    assert state["top"] is stamp and state["events"][0]["at"] is stamp
+
+    # PowerShell values, /Date(ms)/ strings included, are stored as sent
+    ps_state = {"created": "/Date(1756288800000)/", "items": ["plain"]}
+    assert PowerShellStateConverter.from_powershell(ps_state) == {"created": "/Date(1756288800000)/", "items": ["plain"]}
+
+
+def test_converter_handles_deep_nesting():
+    """Nesting deeper than the recursion limit converts without RecursionError"""
+    import sys
+    from datetime import datetime
+
+    from langgraph_state_manager import PowerShellStateConverter
+
+    depth = sys.getrecursionlimit() + 500
+    state = leaf = {}
+    for _ in range(depth):
+        leaf["child"] = {}
+        leaf = leaf["child"]
+    leaf["at"] = datetime(2025, 1, 1)
+
+    converted = PowerShellStateConverter.to_powershell(state)
+    node = converted
+    for _ in range(depth):
+        node = node["child"]
+    assert node["at"] == "2025-01-01T00:00:00"
+    assert PowerShellStateConverter.from_powershell(converted) is converted
+
+
+def test_validator_reports_every_error():
+    results = StateValidator.validate_batch([
+        (basic_state(), "basic"),
+        ({"messages": "hi", "counter": "one"}, "basic"),
+        ({"messages": [], "counter": 1, "approved": "yes"}, "hitl"),
+        ({"anything": True}, "complex"),
+        ({}, "unknown")
+    ])
+    assert [result["valid"] for result in results] == [True, False, False, True, False]
+    assert results[1]["errors"] == ["'messages' field must be a list", "'counter' field must be numeric"]
+    assert results[2]["errors"] == [
+        "Missing required fields: ['approval_needed']", "'approved' field must be boolean or null"
+    ]
+    assert results[4]["errors"] == ["Invalid state type: unknown"]
+
+    with pytest.raises(StateValidationError, match="must be numeric"):
+        StateValidator.validate_state({"messages": [], "counter": "one"}, StateType.BASIC)
+    assert StateValidator.compiled(StateType.BASIC) is StateValidator.compiled(StateType.BASIC)
+
+
+def test_custom_schemas_replace_builtin(tmp_path):
+    config = tmp_path / "schemas.json"
+    config.write_text(json.dumps({
+        "basic": {"required": ["messages", "counter", "owner"], "types": {"owner": "string"}}
+    }))
+    try:
+        assert StateValidator.load_schemas(config) == ["basic"]
+        assert not validate_powershell_state(basic_state(), "basic")
+        assert not validate_powershell_state(basic_state(owner=7), "basic")
+        assert validate_powershell_state(basic_state(owner="ops"), "basic")
+
+        with pytest.raises(ValueError):
+            StateValidator.register_schema(StateType.BASIC, {"types": {"owner": "text"}})
+        assert validate_powershell_state(basic_state(owner="ops"), "basic")
+    finally:
+        StateValidator.register_schema(StateType.BASIC, None)
+    assert validate_powershell_state(basic_state(), "basic")
+
+
+def test_write_behind_batches_versions(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    state_manager = LangGraphStateManager(db_path, write_behind=True, write_batch_size=50, write_delay_ms=10000)
+    for counter in range(1, 31):
+        state_manager.process_powershell_state(basic_state(counter), StateType.BASIC, "g", f"t{counter % 3}")
+    state_manager.process_powershell_state(basic_state(30), StateType.BASIC, "g", "t0")
+    queue_stats = state_manager.checkpoint_manager.write_queue.stats()
+    assert queue_stats["pending"] == 31 and queue_stats["batches"] == 0
+
+    # Reading a thread waits for its queued versions, in one batch
+    latest = state_manager.checkpoint_manager.latest_snapshot("g", "t1")
+    assert latest["version"] == 10 and latest["state"]["counter"] == 28
+    queue_stats = state_manager.checkpoint_manager.write_queue.stats()
+    assert (queue_stats["batches"], queue_stats["written"], queue_stats["pending"]) == (1, 31, 0)
+    assert state_manager.checkpoint_manager.load_state_version("g", "t0")["metadata"]["version"] == 10
+
+    state_manager.process_powershell_state(basic_state(99), StateType.BASIC, "g", "t2")
+    state_manager.close()
+
+    with LangGraphStateManager(db_path) as reopened:
+        assert reopened.checkpoint_manager.latest_snapshot("g", "t2")["state"]["counter"] == 99
+
+
+def test_durable_writes_skip_the_delay(tmp_path):
+    with LangGraphStateManager(str(tmp_path / "state.db"), write_behind=True, write_delay_ms=60000) as state_manager:
+        checkpoint_manager = state_manager.checkpoint_manager
+        checkpoint_manager.queue_state_version(basic_state(1), "g", "t", StateType.BASIC, "c1")
+        metadata = checkpoint_manager.queue_state_version(basic_state(2), "g", "t", StateType.BASIC, "c2", durable=True)
+        assert metadata.version == 2
+        assert checkpoint_manager.write_queue.stats()["pending"] == 0
+
+        # A failing state is rolled back alone
+        results = checkpoint_manager.append_state_versions([
+            (basic_state(3), "g", "t", StateType.BASIC, "c3", True),
+            ({"bad": object()}, "g", "t", StateType.BASIC, "c4", True),
+            (basic_state(5), "g", "t", StateType.BASIC, "c5", True)
+        ])
+        assert [getattr(result, "version", None) for result in results] == [3, None, 4]
+        assert isinstance(results[1], TypeError)
+
+        state, metadata = state_manager.record_powershell_state(basic_state(6), StateType.BASIC, "g", "t", durable=True)
+        assert (metadata.version, metadata.state_id) == (5, "g_t_v5")
+        assert state_manager.record_powershell_state(basic_state(7), StateType.BASIC, "g", "t")[1] is None
+
+
+def test_write_behind_waits_are_bounded(tmp_path):
+    from langgraph_state_manager import StateSerializationError, StateWriteQueue
+
+    with LangGraphStateManager(str(tmp_path / "state.db")) as state_manager:
+        store = state_manager.checkpoint_manager
+        store.write_queue = StateWriteQueue(store, max_batch=1, max_delay_ms=60000, max_pending=1, wait_timeout=0.05)
+        # Hold the writer off the database so nothing drains
+        with store.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            store.queue_state_version(basic_state(1), "g", "a", StateType.BASIC, "c1")
+            while store.write_queue.stats()["pending"]:
+                threading.Event().wait(0.001)
+            store.queue_state_version(basic_state(2), "h", "b", StateType.BASIC, "c2")
+            with pytest.raises(StateSerializationError, match="full"):
+                store.queue_state_version(basic_state(3), "g", "a", StateType.BASIC, "c3")
+
+            # Only the threads a read covers are waited for
+            assert store.write_queue.wait_for("other", "thread")
+            assert not store.write_queue.wait_for("g")
+            with pytest.raises(StateSerializationError, match="Timed out"):
+                store.latest_snapshot("h", "b")
+            conn.rollback()
+
+        assert store.write_queue.flush(timeout=10)
+        assert store.latest_snapshot("h", "b")["state"] == basic_state(2)
+        store.write_queue.close()
+
+
+def test_state_as_of_timestamp(tmp_path):
+    import time
+    from datetime import datetime
+
+    with LangGraphStateManager(str(tmp_path / "state.db"), keyframe_interval=3) as state_manager:
+        store = state_manager.checkpoint_manager
+        before = datetime.now()
+        times = []
+        for counter in range(1, 8):
+            time.sleep(0.002)
+            state_manager.process_powershell_state(
+                basic_state(counter, messages=["m"] * counter), StateType.BASIC, "g", "t"
+            )
+            times.append(datetime.now())
+
+        assert store.state_at("g", "t", before) is None
+        assert store.state_at("g", "t", times[4])["state"] == basic_state(5, messages=["m"] * 5)
+        assert store.state_at("g", "t", times[4].timestamp())["version"] == 5
+        assert store.state_at("g", "t", times[-1].isoformat())["version"] == 7
+
+        with store.pool.connection() as conn:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT version, state_id, last_modified FROM state_snapshots "
+                "WHERE graph_id = ? AND thread_id = ? AND last_modified <= ? "
+                "ORDER BY last_modified DESC, version DESC LIMIT 1", ("g", "t", times[4].isoformat())
+            ).fetchall()
+        assert "COVERING INDEX idx_state_thread_time" in plan[0][-1]
+
+        history = list(store.iter_state_history("g", "t", since=times[1], until=times[5], page_size=2))
+        assert [entry["version"] for entry in history] == [3, 4, 5, 6]
+        assert [entry["state"]["counter"] for entry in history] == [3, 4, 5, 6]
+        assert len(list(store.iter_state_history("g", "t"))) == 7
+
+        with pytest.raises(ValueError):
+            to_snapshot_time("yesterday")
+        for out_of_range in ("inf", "nan", 1e20):
+            with pytest.raises(ValueError):
+                to_snapshot_time(out_of_range)
+        assert to_snapshot_time("/Date(0)/") == to_snapshot_time(0)
+
+
+def test_state_at_reads_the_matched_row(manager):
+    """Snapshots sharing a version are told apart by the row the timestamp matched"""
+    from langgraph_state_manager import StateMetadata
+
+    store = manager.checkpoint_manager
+    for counter, stamp in ((1, "2025-01-01T10:00:01"), (2, "2025-01-01T10:00:02")):
+        store.save_state_snapshot(basic_state(counter), StateMetadata(
+            f"dup-{counter}", "g", "t", StateType.BASIC, 1, stamp, stamp, f"c{counter}"
+        ))
+
+    assert store.state_at("g", "t", "2025-01-01T10:00:01.5")["state"] == basic_state(1)
+    assert store.state_at("g", "t", "2025-01-01T10:00:02")["state"] == basic_state(2)